@@ -0,0 +1,85 @@
+"""
+Crawl a throttling stub (benchmarks/throttling_stub.py) with ListingCrawler at fixed
+concurrencies and under an AIMDController, and compare wall time, 429s received,
+retries and pages given up on.
+
+    python -m benchmarks.aimd_simulation --rate-limit 20 --listings 4 --pages 50
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.throttling_stub import start_stub
+from src.utils.crawl_engine import AIMDController, ListingCrawler
+from src.utils.http_session import new_session
+
+
+class ListSpool:
+    """In-memory stand-in for RowSpool."""
+
+    def __init__(self):
+        self.rows_spooled = 0
+
+    def append(self, rows, key=None, **columns):
+        self.rows_spooled += len(rows)
+
+
+async def crawl(base_url: str, listings: int, concurrency: int, controller=None) -> dict:
+    spool = ListSpool()
+    statuses = {}
+    async with new_session(max_clients=concurrency, controller=controller) as session:
+
+        async def fetch_page(url):
+            try:
+                response = await session.get(url)
+            except Exception:
+                return None, None
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code != 200:
+                return None, None
+            body = response.json()
+            return body["rows"], body["pages"]
+
+        workers = controller.max_concurrency if controller is not None else concurrency
+        crawler = ListingCrawler(fetch_page, spool, concurrency=workers)
+        for i in range(listings):
+            crawler.add_listing(f"{base_url}/listing-{i}")
+        start = time.perf_counter()
+        await crawler.run()
+        elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed, "rows": spool.rows_spooled, "throttled": statuses.get(429, 0),
+        "retries": crawler.retries, "failed_pages": len(crawler.failed_pages),
+        "final_limit": controller.limit if controller is not None else concurrency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed vs AIMD concurrency against a throttling stub.")
+    parser.add_argument("--rate-limit", type=float, default=20, help="Stub's requests per second before 429s.")
+    parser.add_argument("--capacity", type=int, default=8, help="Stub's requests in flight before latency grows.")
+    parser.add_argument("--base-latency", type=float, default=0.2, help="Stub's seconds per response when not overloaded.")
+    parser.add_argument("--listings", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=50, help="Pages per listing.")
+    parser.add_argument("--fixed", type=int, nargs="+", default=[2, 5, 16], help="Fixed concurrencies to compare.")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="AIMD upper bound.")
+    args = parser.parse_args()
+
+    server = start_stub(rate_limit=args.rate_limit, capacity=args.capacity, base_latency=args.base_latency, pages=args.pages)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    runs = [(f"fixed {n}", n, None) for n in args.fixed]
+    runs.append(("aimd", 5, lambda: AIMDController(initial=5, max_concurrency=args.max_concurrency)))
+
+    print(f"{'run':<10} {'seconds':>8} {'rows':>7} {'429s':>6} {'retries':>8} {'failed':>7} {'limit':>6}")
+    for label, concurrency, make_controller in runs:
+        time.sleep(1)  # let the stub's rate window drain between runs
+        result = asyncio.run(crawl(base_url, args.listings, concurrency, make_controller() if make_controller else None))
+        print(
+            f"{label:<10} {result['seconds']:>8.2f} {result['rows']:>7} {result['throttled']:>6} "
+            f"{result['retries']:>8} {result['failed_pages']:>7} {result['final_limit']:>6.1f}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Bronze upload cost: the DataFrame path (load_table_from_dataframe) vs. the Arrow/Parquet
+loader (load_arrow_to_bigquery), offline.
+
+FileLoadClient stands in for bigquery.Client: both load methods write what the real
+client would send to a directory instead of BigQuery, so the numbers are serialization
+time and bytes uploaded -- the network and the load job itself are not modelled.
+
+    python -m benchmarks.bigquery_load --pages 200
+    python -m benchmarks.bigquery_load --pages 500 --chunk-rows 2000 --workers 4
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.api_core.exceptions import NotFound
+
+from benchmarks.synthetic_pages import listing_page
+from src._web2br import j_real_estate
+from src.utils.gcp_conn import LOAD_CHUNK_ROWS, LOAD_WORKERS, load_arrow_to_bigquery
+from src.utils.row_spool import RowSpool
+
+TABLE_ID = "local.re_bronze.real_estate"
+
+
+class FileLoadJob:
+
+    def __init__(self, output_rows: int):
+        self.output_rows = output_rows
+
+    def result(self):
+        return self
+
+
+class FileLoadClient:
+    """The bigquery.Client methods the uploaders use, writing the load payload to `target_dir`."""
+
+    def __init__(self, target_dir):
+        self.target_dir = Path(target_dir)
+        self.target_dir.mkdir(parents=True, exist_ok=True)
+        self.jobs = 0
+        self.tables = {}
+
+    def get_table(self, table_id):
+        if table_id not in self.tables:
+            raise NotFound(f"Table {table_id} not found")
+        return self.tables[table_id]
+
+    def create_table(self, table, exists_ok=False):
+        self.tables.setdefault(str(table.reference), table)
+        return self.tables[str(table.reference)]
+
+    def _next_path(self) -> Path:
+        self.jobs += 1
+        return self.target_dir / f"load-{self.jobs:05d}.parquet"
+
+    def delete_table(self, table, not_found_ok=False):
+        self.tables.pop(str(table), None)
+
+    def copy_table(self, sources, destination, job_config=None):
+        return FileLoadJob(0)
+
+    def load_table_from_dataframe(self, df, table_id, job_config=None):
+        # What the client does before sending: pandas -> Arrow, then Parquet (snappy).
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), self._next_path(), compression="snappy")
+        return FileLoadJob(len(df))
+
+    def load_table_from_file(self, file_obj, table_id, job_config=None):
+        path = self._next_path()
+        with open(path, "wb") as f:
+            shutil.copyfileobj(file_obj, f)
+        return FileLoadJob(pq.ParquetFile(path).metadata.num_rows)
+
+    def bytes_uploaded(self) -> int:
+        return sum(path.stat().st_size for path in self.target_dir.glob("load-*.parquet"))
+
+
+def spool_pages(spool_dir, pages: int) -> RowSpool:
+    """Spool `pages` synthetic listing pages the way a scrape does, scraped_at included."""
+    spool = RowSpool(spool_dir)
+    scraped_at = pd.Timestamp.now("UTC")
+    for page_num in range(1, pages + 1):
+        records, _ = j_real_estate.parse_page(listing_page(page_num, pages), "utf-8", "lxml")
+        spool.append(records, scraped_at=scraped_at, date_scraped=scraped_at.date())
+    spool.flush()
+    return spool
+
+
+def run_dataframe_path(spool: RowSpool, target_dir) -> dict:
+    client = FileLoadClient(target_dir)
+    start = time.perf_counter()
+    df = spool.to_dataframe()
+    job = client.load_table_from_dataframe(df, TABLE_ID)
+    seconds = time.perf_counter() - start
+    return {"path": "dataframe", "seconds": seconds, "rows": job.output_rows, "jobs": client.jobs, "bytes": client.bytes_uploaded()}
+
+
+def run_arrow_path(spool: RowSpool, target_dir, chunk_rows: int, workers: int) -> dict:
+    client = FileLoadClient(target_dir)
+    start = time.perf_counter()
+    rows = load_arrow_to_bigquery(client, spool.part_paths(), TABLE_ID, chunk_rows=chunk_rows, max_workers=workers)
+    seconds = time.perf_counter() - start
+    return {"path": "arrow", "seconds": seconds, "rows": rows, "jobs": client.jobs, "bytes": client.bytes_uploaded()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline bronze upload cost: DataFrame vs. Arrow/Parquet loader.")
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic listing pages (20 rows each).")
+    parser.add_argument("--chunk-rows", type=int, default=LOAD_CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = spool_pages(Path(tmp) / "spool", args.pages)
+        results = [
+            run_dataframe_path(spool, Path(tmp) / "dataframe"),
+            run_arrow_path(spool, Path(tmp) / "arrow", args.chunk_rows, args.workers),
+        ]
+
+    print(f"{'path':<10} {'seconds':>8} {'rows':>8} {'jobs':>5} {'MB sent':>8} {'rows/s':>9}")
+    for r in results:
+        print(
+            f"{r['path']:<10} {r['seconds']:>8.3f} {r['rows']:>8} {r['jobs']:>5} {r['bytes'] / 1e6:>8.2f} "
+            f"{r['rows'] / r['seconds'] if r['seconds'] else 0:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
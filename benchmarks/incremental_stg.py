@@ -0,0 +1,165 @@
+"""
+Local DuckDB check of the incremental stg_real_estate logic, and what it saves in
+bytes scanned.
+
+Simulates weeks of bronze appends as a date_scraped-partitioned Parquet dataset (one
+directory per day, like BigQuery's day partitions): each weekly run re-lists most
+known listings -- some re-priced -- adds new ones, and now and then a second run lands
+on the same day, after that day's silver build (a pipeline re-run). After every run the
+silver table is built two ways with the model's dedup (latest scraped_at per
+product_id, link as the tie-break):
+
+    full         dedup over all of bronze (the old `materialized: table` model)
+    incremental  dedup over the partitions from max(date_scraped) in silver minus the
+                 lookback on, merged into silver by product_id (the new model)
+
+and the two must be identical. Bytes scanned are the Parquet files DuckDB actually
+read for each, after partition pruning -- proportional to what BigQuery bills.
+
+    python -m benchmarks.incremental_stg --weeks 26 --listings 20000
+"""
+import argparse
+import random
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+COLUMNS = "product_id, link, price, cityCode, scraped_at, date_scraped"
+# The model's dedup, on a relation `src`.
+DEDUP_SQL = f"""
+    select {COLUMNS} from (
+        select *, row_number() over (
+            partition by product_id order by scraped_at desc nulls last, link asc
+        ) as rn
+        from src
+        where product_id is not null
+    )
+    where rn = 1
+"""
+
+
+def write_partition(bronze_dir: Path, day: date, rows: list[dict], run: int):
+    partition = bronze_dir / f"date_scraped={day.isoformat()}"
+    partition.mkdir(parents=True, exist_ok=True)
+    pq.write_table(pa.Table.from_pylist(rows), partition / f"run-{run:04d}.parquet", compression="zstd")
+
+
+def simulate_week(rng: random.Random, day: date, prices: dict, next_id: int, listings: int, run: int) -> tuple[list[dict], int]:
+    """One scrape run's rows: ~70% of known listings (5% re-priced), plus new ones."""
+    scraped_at = datetime.combine(day, time(9, run % 60), tzinfo=timezone.utc)
+    listed = [pid for pid in prices if rng.random() < 0.7]
+    for pid in listed:
+        if rng.random() < 0.05:
+            prices[pid] = round(prices[pid] * rng.uniform(0.9, 1.1), 2)
+    for _ in range(listings // 20):
+        prices[str(next_id)] = round(rng.uniform(1, 20), 2)
+        listed.append(str(next_id))
+        next_id += 1
+    rows = [{
+        "product_id": pid, "link": f"/ban-can-ho-chung-cu-pr{pid}", "price": f"{prices[pid]} tỷ",
+        "cityCode": "SG" if int(pid) % 3 else "HN", "scraped_at": scraped_at,
+        "description": "Mô tả căn hộ " * 20,  # bronze rows are wide; silver reads all of it
+    } for pid in listed]
+    return rows, next_id
+
+
+def scan(con, bronze_dir: Path, where: str = "") -> tuple[str, int]:
+    """Register `src` as bronze filtered by `where`; return the relation and the bytes of the files it reads."""
+    con.execute(f"""
+        create or replace temp view src as
+        select * from read_parquet('{bronze_dir}/*/*.parquet', hive_partitioning = true, filename = true) {where}
+    """)
+    files = [name for (name,) in con.execute("select distinct filename from src").fetchall()]
+    return "src", sum(Path(name).stat().st_size for name in files)
+
+
+def run_weeks(bronze_dir: Path, weeks: int, listings: int, lookback_days: int = 1, seed: int = 0,
+              second_run_rate: float = 0.3):
+    """
+    Simulate `weeks` weekly runs into bronze_dir, building silver both ways after each
+    run; yields one dict per run with the row counts, bytes scanned by each build and
+    `mismatched`, the rows that differ between the two (0 when the model is right).
+    tests/test_incremental_stg.py runs a small version of this.
+    """
+    rng = random.Random(seed)
+    con = duckdb.connect()
+    prices = {str(pid): round(rng.uniform(1, 20), 2) for pid in range(listings)}
+    next_id, run = listings, 0
+    day = date(2026, 1, 5)
+    for week in range(1, weeks + 1):
+        for _ in range(2 if rng.random() < second_run_rate else 1):  # sometimes a second run the same day
+            rows, next_id = simulate_week(rng, day, prices, next_id, listings, run)
+            write_partition(bronze_dir, day, rows, run)
+            run += 1
+            yield {"week": week, **build_silver(con, bronze_dir, first=run == 1, lookback_days=lookback_days)}
+        day += timedelta(days=7)
+    con.close()
+
+
+def build_silver(con, bronze_dir: Path, first: bool, lookback_days: int) -> dict:
+    """Rebuild silver in full and update it incrementally; row counts, bytes scanned by each and rows that differ."""
+    _, full_bytes = scan(con, bronze_dir)
+    rebuilt = con.execute(DEDUP_SQL).to_arrow_table()
+
+    if first:
+        _, incremental_bytes = scan(con, bronze_dir)
+        con.execute(f"create table silver as {DEDUP_SQL}")
+    else:
+        (max_date,) = con.execute("select max(date_scraped) from silver").fetchone()
+        cutoff = max_date - timedelta(days=lookback_days)
+        _, incremental_bytes = scan(con, bronze_dir, f"where date_scraped >= date '{cutoff}'")
+        con.execute(f"create or replace temp table new_rows as {DEDUP_SQL}")
+        con.execute("""
+            merge into silver using new_rows on silver.product_id = new_rows.product_id
+            when matched then update
+            when not matched then insert
+        """)
+
+    mismatched = con.execute(f"""
+        select count(*) from (
+            (select {COLUMNS} from silver except select {COLUMNS} from rebuilt)
+            union all
+            (select {COLUMNS} from rebuilt except select {COLUMNS} from silver)
+        )
+    """).fetchone()[0]
+    (bronze_rows,) = con.execute(f"select count(*) from read_parquet('{bronze_dir}/*/*.parquet')").fetchone()
+    return {
+        "bronze_rows": bronze_rows, "silver_rows": rebuilt.num_rows,
+        "full_bytes": full_bytes, "incremental_bytes": incremental_bytes, "mismatched": mismatched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DuckDB check of the incremental stg dedup/merge, with bytes scanned.")
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--listings", type=int, default=5000, help="Listings in the first week.")
+    parser.add_argument("--lookback-days", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        total_full = total_incremental = 0
+        print(f"{'week':>4} {'bronze rows':>12} {'silver rows':>12} {'full MB':>9} {'incr MB':>9} {'saved':>7}  check")
+        for result in run_weeks(Path(tmp) / "bronze", args.weeks, args.listings, args.lookback_days, args.seed):
+            week, full_bytes, incremental_bytes, mismatched = (
+                result["week"], result["full_bytes"], result["incremental_bytes"], result["mismatched"],
+            )
+            total_full += full_bytes
+            total_incremental += incremental_bytes
+            print(
+                f"{week:>4} {result['bronze_rows']:>12} {result['silver_rows']:>12} {full_bytes / 1e6:>9.2f} {incremental_bytes / 1e6:>9.2f} "
+                f"{1 - incremental_bytes / full_bytes:>7.0%}  {'ok' if mismatched == 0 else f'{mismatched} rows differ'}"
+            )
+            if mismatched:
+                raise SystemExit(f"Incremental silver differs from a full rebuild after week {week}")
+
+    print(f"Total scanned: full {total_full / 1e6:.1f} MB, incremental {total_incremental / 1e6:.1f} MB "
+          f"({1 - total_incremental / total_full:.0%} less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+End-to-end scraper throughput, offline and repeatable.
+
+Replays a page archive -- synthetic pages (benchmarks/synthetic_pages.py) by default,
+or one recorded with a scraper's --archive -- through the real fetch -> parse -> spool
+path of j_real_estate: ReplaySession (with simulated latency/jitter/errors), AIMD
+controller, ListingCrawler, parse executor, RowSpool. No politeness budget is applied,
+so the numbers are what the pipeline itself can sustain.
+
+    python -m benchmarks.replay_throughput --pages 200 --latency-ms 150 --jitter-ms 50
+    python -m benchmarks.replay_throughput --archive data/archive/real_estate --url https://batdongsan.com.vn/...
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic_pages import build_archive
+from src._web2br import j_real_estate
+from src.utils.crawl_engine import ListingCrawler
+from src.utils.parse_executor import PARSE_EXECUTORS, parse_executor
+from src.utils.replay_session import ReplaySession
+from src.utils.row_spool import RowSpool
+
+SYNTHETIC_URL = "https://batdongsan.com.vn/ban-can-ho-chung-cu-tp-ho-chi-minh"
+
+
+async def crawl(archive_dir, url, spool, executor, backend, latency_ms, jitter_ms, error_rate) -> dict:
+    controller = j_real_estate.new_controller()
+    session = ReplaySession(
+        archive_dir, latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate,
+        controller=controller, max_clients=controller.max_concurrency,
+    )
+    async with session:
+        crawler = ListingCrawler(
+            lambda page_url: j_real_estate.fetch_and_parse(page_url, session, executor, backend),
+            spool, concurrency=j_real_estate.ADAPTIVE_MAX_CONCURRENCY, retry_backoff=0.1,
+        )
+        crawler.add_listing(url)
+        start = time.perf_counter()
+        await crawler.run()
+        seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds, "pages": session.replay_stats["replayed"], "rows": spool.rows_spooled,
+        "pages_per_second": session.replay_stats["replayed"] / seconds if seconds else 0.0,
+        "rows_per_second": spool.rows_spooled / seconds if seconds else 0.0,
+        "injected_errors": session.replay_stats["injected_errors"], "failed_pages": len(crawler.failed_pages),
+    }
+
+
+def run_benchmark(archive_dir, url, executor_kind: str, backend: str, latency_ms: float = 0, jitter_ms: float = 0,
+                  error_rate: float = 0) -> dict:
+    with tempfile.TemporaryDirectory() as spool_dir, parse_executor(executor_kind) as executor:
+        spool = RowSpool(spool_dir)
+        result = asyncio.run(crawl(archive_dir, url, spool, executor, backend, latency_ms, jitter_ms, error_rate))
+        spool.flush()
+    return {"executor": executor_kind, "backend": backend, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end throughput of the listing scraper.")
+    parser.add_argument("--archive", default=None, help="Recorded page archive to replay. Default: synthetic pages.")
+    parser.add_argument("--url", default=SYNTHETIC_URL, help="Listing URL to crawl from the archive.")
+    parser.add_argument("--pages", type=int, default=100, help="Synthetic pages to generate.")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--executors", nargs="+", choices=PARSE_EXECUTORS, default=["inline", "process"])
+    parser.add_argument("--backends", nargs="+", choices=["bs4", "lxml"], default=["bs4", "lxml"])
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive_dir = args.archive
+        if archive_dir is None:
+            archive_dir = Path(tmp) / "archive"
+            build_archive(archive_dir, args.url, args.pages)
+        results = [
+            run_benchmark(archive_dir, args.url, executor, backend, args.latency_ms, args.jitter_ms, args.error_rate)
+            for executor in args.executors for backend in args.backends
+        ]
+
+    print(f"{'executor':<9} {'backend':<7} {'seconds':>8} {'pages':>6} {'rows':>7} {'pages/s':>8} {'rows/s':>8} {'failed':>7}")
+    for r in results:
+        print(
+            f"{r['executor']:<9} {r['backend']:<7} {r['seconds']:>8.2f} {r['pages']:>6} {r['rows']:>7} "
+            f"{r['pages_per_second']:>8.1f} {r['rows_per_second']:>8.0f} {r['failed_pages']:>7}"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
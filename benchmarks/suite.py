@@ -0,0 +1,271 @@
+"""
+Benchmark suite for the scraping pipeline, with regression tracking across commits.
+
+Every benchmark runs offline on synthetic listing pages (benchmarks/synthetic_pages.py)
+and a local stub server: page parsing per HTML backend (one core, and N cores through
+the scrapers' own parse_executor/run_parse path), tracking-data extraction, the
+listing/tracking merge, DataFrame assembly through the RowSpool, the Parquet serialization a BigQuery load does (DataFrame path and the Arrow
+loader, into a local stand-in -- benchmarks/bigquery_load.py), and full crawls -- replayed
+and over HTTP against benchmarks/throttling_stub.py.
+
+    python -m benchmarks.suite run --output benchmarks/results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.suite compare benchmarks/results/base.json benchmarks/results/new.json --threshold 0.10
+
+`run` times each benchmark `--repeat` times and records the best and median wall time
+and items/sec, plus the commit and machine. `compare` reports each benchmark's change
+in median time and exits non-zero when any got slower by more than --threshold.
+Before timing, `run` checks the lxml backend still yields the same rows as bs4.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from benchmarks.bigquery_load import FileLoadClient, spool_pages
+from benchmarks.replay_throughput import run_benchmark as run_replay_crawl
+from benchmarks.synthetic_pages import build_archive, listing_page
+from benchmarks.throttling_stub import start_stub
+from src._web2br import j_real_estate
+from src.utils.crawl_engine import ListingCrawler
+from src.utils.gcp_conn import load_arrow_to_bigquery
+from src.utils.html_backend import parse_html
+from src.utils.http_session import new_session
+from src.utils.parse_executor import parse_executor, run_parse
+from src.utils.row_spool import RowSpool
+from src.utils.tracking_data import iter_tracking_records
+
+PAGES = 40
+CRAWL_PAGES = 60
+CRAWL_URL = "https://batdongsan.com.vn/ban-can-ho-chung-cu-tp-ho-chi-minh"
+BENCHMARKS = {}
+PARSE_POOLS = ExitStack()
+
+
+def benchmark(name: str, unit: str = "pages"):
+    """Register `fn(corpus) -> (timed zero-argument callable, items per call)` as a benchmark."""
+    def register(fn):
+        BENCHMARKS[name] = (fn, unit)
+        return fn
+    return register
+
+
+def corpus(pages: int = PAGES) -> list[bytes]:
+    return [listing_page(page_num, pages) for page_num in range(1, pages + 1)]
+
+
+@benchmark("parse_page.bs4")
+def bench_parse_bs4(pages):
+    return lambda: [j_real_estate.parse_page(page, "utf-8", "bs4") for page in pages], len(pages)
+
+
+@benchmark("parse_page.lxml")
+def bench_parse_lxml(pages):
+    return lambda: [j_real_estate.parse_page(page, "utf-8", "lxml") for page in pages], len(pages)
+
+
+def parse_on_pool(pages, backend: str):
+    """Every page through run_parse on the scrapers' process pool, all in flight at once like a crawl."""
+    # Started once, like a scraper's parse pool; shut down at exit.
+    executor = PARSE_POOLS.enter_context(parse_executor("process"))
+
+    async def parse_all():
+        return await asyncio.gather(*(run_parse(executor, j_real_estate.parse_page, page, "utf-8", backend) for page in pages))
+
+    return lambda: asyncio.run(parse_all()), len(pages)
+
+
+@benchmark("parse_page.bs4.process_pool")
+def bench_parse_bs4_pool(pages):
+    return parse_on_pool(pages, "bs4")
+
+
+@benchmark("parse_page.lxml.process_pool")
+def bench_parse_lxml_pool(pages):
+    return parse_on_pool(pages, "lxml")
+
+
+@benchmark("tracking_data.extract")
+def bench_tracking(pages):
+    return lambda: [list(iter_tracking_records(page)) for page in pages], len(pages)
+
+
+@benchmark("merge_listing_with_tracking_data")
+def bench_merge(pages):
+    parsed = [
+        (j_real_estate.lxml_to_df(parse_html(page, "utf-8", "lxml")).to_dict("records"), list(iter_tracking_records(page)))
+        for page in pages
+    ]
+    return lambda: [j_real_estate.merge_listing_with_tracking_data(rows, tracking) for rows, tracking in parsed], len(pages)
+
+
+@benchmark("dataframe.assemble", unit="rows")
+def bench_assemble(pages):
+    records = [j_real_estate.parse_page(page, "utf-8", "lxml")[0] for page in pages]
+
+    def run():
+        with tempfile.TemporaryDirectory() as spool_dir:
+            spool = RowSpool(spool_dir)
+            for page_records in records:
+                spool.append(page_records)
+            spool.to_dataframe()
+    return run, sum(len(page_records) for page_records in records)
+
+
+@benchmark("bigquery_load.serialize", unit="rows")
+def bench_serialize(pages):
+    df = pd.DataFrame([record for page in pages for record in j_real_estate.parse_page(page, "utf-8", "lxml")[0]])
+    df["scraped_at"] = pd.Timestamp.now("UTC")
+
+    def run():
+        # What load_table_from_dataframe does before sending: Arrow conversion + Parquet.
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), io.BytesIO())
+    return run, len(df)
+
+
+@benchmark("bigquery_load.arrow", unit="rows")
+def bench_load_arrow(pages):
+    spool = spool_pages(tempfile.mkdtemp(), len(pages))
+    target = tempfile.mkdtemp()
+    # Parquet (zstd) via load_arrow_to_bigquery into a local stand-in, from the spool parts.
+    return lambda: load_arrow_to_bigquery(FileLoadClient(target), spool.part_paths(), "local.re_bronze.real_estate"), spool.rows_spooled
+
+
+@benchmark("crawl.replay")
+def bench_crawl_replay(pages):
+    archive_dir = Path(tempfile.mkdtemp()) / "archive"
+    build_archive(archive_dir, CRAWL_URL, CRAWL_PAGES)
+    return lambda: run_replay_crawl(archive_dir, CRAWL_URL, "inline", "lxml", latency_ms=20, jitter_ms=10), CRAWL_PAGES
+
+
+@benchmark("crawl.stub_http")
+def bench_crawl_http(pages):
+    server = start_stub(rate_limit=1000, capacity=64, base_latency=0.02, pages=CRAWL_PAGES,
+                        render=lambda page_num, total: listing_page(page_num, total))
+    url = f"http://127.0.0.1:{server.server_port}/ban-can-ho-chung-cu-tp-ho-chi-minh"
+
+    async def crawl():
+        with tempfile.TemporaryDirectory() as spool_dir:
+            controller = j_real_estate.new_controller()
+            async with new_session(controller=controller) as session:
+                crawler = ListingCrawler(
+                    lambda page_url: j_real_estate.fetch_and_parse(page_url, session, None, "lxml"),
+                    RowSpool(spool_dir), concurrency=j_real_estate.ADAPTIVE_MAX_CONCURRENCY,
+                )
+                crawler.add_listing(url)
+                await crawler.run()
+    return lambda: asyncio.run(crawl()), CRAWL_PAGES
+
+
+def check_backends_agree(pages):
+    """lxml must keep producing bs4's rows; timing a wrong fast path is pointless."""
+    for page in pages[:5]:
+        bs4_rows, bs4_count = j_real_estate.parse_page(page, "utf-8", "bs4")
+        lxml_rows, lxml_count = j_real_estate.parse_page(page, "utf-8", "lxml")
+        if bs4_rows != lxml_rows or bs4_count != lxml_count:
+            raise AssertionError("lxml and bs4 parser backends disagree on a synthetic page")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(names: list[str], repeat: int) -> dict:
+    pages = corpus()
+    check_backends_agree(pages)
+    results = {}
+    for name in names:
+        fn, unit = BENCHMARKS[name]
+        timed, items = fn(pages)
+        timed()  # warm-up: imports, pools, caches
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            timed()
+            times.append(time.perf_counter() - start)
+        median = statistics.median(times)
+        results[name] = {
+            "min_seconds": min(times), "median_seconds": median, "repeat": repeat,
+            "items": items, "unit": unit, "items_per_second": items / median if median else 0.0,
+        }
+        print(f"{name:<36} {median * 1000:>10.1f} ms  {results[name]['items_per_second']:>10.1f} {unit}/s", flush=True)
+    return {
+        "commit": git_commit(), "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+        "benchmarks": results,
+    }
+
+
+def compare(base: dict, new: dict, threshold: float) -> list[str]:
+    """Print a per-benchmark comparison; return the names that regressed beyond `threshold`."""
+    regressions = []
+    print(f"{'benchmark':<36} {'base ms':>10} {'new ms':>10} {'change':>8}")
+    for name, result in new["benchmarks"].items():
+        if name not in base["benchmarks"]:
+            print(f"{name:<36} {'-':>10} {result['median_seconds'] * 1000:>10.1f} {'new':>8}")
+            continue
+        before = base["benchmarks"][name]["median_seconds"]
+        change = result["median_seconds"] / before - 1 if before else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<36} {before * 1000:>10.1f} {result['median_seconds'] * 1000:>10.1f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite with regression tracking.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Run the benchmarks and write their results as JSON.")
+    run.add_argument("--output", default=None, help="Results file. Default: benchmarks/results/<commit>.json")
+    run.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark. Default: %(default)s")
+    run.add_argument("--filter", default=None, help="Only benchmarks whose name contains this.")
+    cmp = sub.add_parser("compare", help="Compare two results files.")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.10, help="Slowdown counted as a regression. Default: %(default)s")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "compare":
+        base, new = (json.loads(Path(path).read_text()) for path in (args.base, args.new))
+        regressions = compare(base, new, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        return
+
+    logging.getLogger().setLevel(logging.WARNING)  # the scrapers log every page
+    names = [name for name in BENCHMARKS if args.filter is None or args.filter in name]
+    with PARSE_POOLS:
+        results = run_suite(names, args.repeat)
+    output = Path(args.output or f"benchmarks/results/{results['commit'] or 'local'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Synthetic batdongsan.com.vn listing pages for the offline benchmarks.
+
+Pages follow the markup the sale/rent scrapers parse (listing cards, the pagination
+bar, window.pageTrackingData) with deterministic content, so a benchmark needs neither
+the network nor a recorded archive. build_archive() writes them into a page archive
+(src/utils/page_archive.py) for ReplaySession to serve.
+"""
+import json
+from types import SimpleNamespace
+
+from src.utils.page_archive import PageArchive
+
+PRODUCT_ID_BASE = 40000000
+
+
+def listing_card(i: int) -> str:
+    pid = PRODUCT_ID_BASE + i
+    bedroom = (
+        f'<span class="re__card-config-bedroom" aria-label="{i % 4 + 1} PN"><span>{i % 4 + 1}</span>'
+        f'<i class="re__icon-bedroom--sm"></i></span>' if i % 5 else ""
+    )
+    phone = (
+        f'<span class="re__btn js__card-phone-btn"><i></i><span>0909 {i % 1000:03d} ***</span>'
+        f'<span> Hiện số</span></span>' if i % 3 else ""
+    )
+    return f'''<div class="js__card js__card-full-web pr-container re__card-full{' re__vip-diamond' if i % 7 == 0 else ''}">
+  <a class="js__product-link-for-product-id" data-product-id="{pid}" href="/ban-can-ho-chung-cu-duong-{i}-pr{pid}" title="t">
+    <div class="re__card-image {'re__card-image-verified' if i % 2 else ''}"><span class="re__card-image-verified">V</span></div>
+    <div class="re__card-info"><div class="re__card-info-content">
+      <h3 class="re__card-title"><span class="pr-title js__card-title"> Căn hộ &amp; view sông {i} quận 1 </span></h3>
+      <div class="re__card-config js__card-config">
+        <span class="re__card-config-price js__card-config-item">{i % 9 + 1},{i % 10} tỷ</span><span class="re__card-config-dot">·</span>
+        <span class="re__card-config-area js__card-config-item">{50 + i % 80},5 m²</span>
+        <span class="re__card-config-price_per_m2 js__card-config-item">{60 + i % 40},1 tr/m²</span>
+        {bedroom}
+        <span class="re__card-config-toilet" aria-label="2 WC"><span>2</span></span>
+      </div>
+      <div class="re__card-location"><i></i><span>Quận {i % 12 + 1}, Hồ Chí Minh</span></div>
+      <div class="re__card-description js__card-description">Mô tả căn hộ {i}: sổ hồng riêng.</div>
+    </div></div>
+  </a>
+  <div class="re__card-contact"><div class="re__card-published-info"><div class="agent-name">Môi giới {i}</div></div>{phone}</div>
+</div>'''
+
+
+def listing_page(page_num: int, total_pages: int, cards: int = 20) -> bytes:
+    first = page_num * 1000
+    products = [
+        {
+            "productId": PRODUCT_ID_BASE + first + i, "vipType": i % 5, "cityCode": "SG", "districtId": 50 + i % 10,
+            "wardId": 9000 + i, "projectId": None if i % 3 else 3000 + i, "verified": bool(i % 2),
+            "expired": False, "cateId": 324, "intent": 1, "pageType": 1, "streetId": 100 + i,
+            "pageId": page_num, "productType": 0, "IsDisplayNewAddress": False,
+        }
+        for i in range(cards)
+    ]
+    tracking = json.dumps({"products": products, "pageNum": page_num}, ensure_ascii=False)
+    pagination = "".join(
+        f'<a class="re__pagination-number" href="/p{k}">{k}</a>' for k in [*range(1, min(total_pages, 5) + 1), total_pages]
+    )
+    html = f'''<!DOCTYPE html><html><head><meta charset="utf-8"><title>Listing</title></head><body>
+<div class="re__srp-list">{"".join(listing_card(first + i) for i in range(cards))}</div>
+<div class="re__pagination-group">{pagination}</div>
+<script type="text/javascript">
+  window.pageTrackingData = JSON.parse('{tracking}');
+</script>
+</body></html>'''
+    return html.encode("utf-8")
+
+
+def build_archive(archive_dir, listing_url: str, pages: int, cards: int = 20) -> PageArchive:
+    """Record `pages` synthetic pages of listing_url (page 1 at the bare URL, like the site)."""
+    archive = PageArchive(archive_dir)
+    for page_num in range(1, pages + 1):
+        url = listing_url if page_num == 1 else f"{listing_url}/p{page_num}"
+        response = SimpleNamespace(
+            url=url, status_code=200, content=listing_page(page_num, pages, cards),
+            headers={"content-type": "text/html; charset=utf-8"}, encoding="utf-8",
+        )
+        archive.put(url, response)
+    archive.close()
+    return archive
@@ -0,0 +1,105 @@
+"""
+Local stand-in for batdongsan.com.vn's rate limiting, for the crawl benchmarks.
+
+Serves JSON "listing pages" at /<listing>/p<N> ({"rows": [...], "pages": page count})
+and answers 429 to anything beyond `rate_limit` requests per second (sliding 1s
+window). Latency grows with requests in flight past `capacity`, like a server
+queueing work, so pushing harder than the site can take shows up as slow responses
+before it shows up as 429s. A `render(page_num, pages)` callable serves other bodies,
+e.g. synthetic HTML listing pages (benchmarks/synthetic_pages.py).
+
+    python -m benchmarks.throttling_stub --port 8790 --rate-limit 20
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ThrottlingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, rate_limit: float = 20, capacity: int = 8, base_latency: float = 0.2,
+                 pages: int = 50, rows_per_page: int = 20, render=None):
+        super().__init__(address, ThrottlingHandler)
+        self.rate_limit = rate_limit
+        self.capacity = capacity
+        self.base_latency = base_latency
+        self.pages = pages
+        self.rows_per_page = rows_per_page
+        self.render = render
+        self.lock = threading.Lock()
+        self.accepted = deque()  # monotonic times of requests served in the last second
+        self.in_flight = 0
+        self.counts = {"served": 0, "throttled": 0}
+
+    def admit(self) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            while self.accepted and now - self.accepted[0] >= 1:
+                self.accepted.popleft()
+            if len(self.accepted) >= self.rate_limit:
+                self.counts["throttled"] += 1
+                return False
+            self.accepted.append(now)
+            self.counts["served"] += 1
+            self.in_flight += 1
+            return True
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        if not server.admit():
+            self.send_body(429, b'{"error": "too many requests"}')
+            return
+        try:
+            overload = max(0, server.in_flight - server.capacity) / server.capacity
+            time.sleep(server.base_latency * (1 + overload))
+            listing, _, page = self.path.rpartition("/p")
+            page_num = int(page) if page.isdigit() else 1
+            if server.render is not None:
+                self.send_body(200, server.render(page_num, server.pages), "text/html; charset=utf-8")
+                return
+            rows = [
+                {"product_id": f"{listing}-{page_num}-{i}", "price": 1000 + i}
+                for i in range(server.rows_per_page)
+            ] if page_num <= server.pages else []
+            self.send_body(200, json.dumps({"rows": rows, "pages": server.pages}).encode())
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def send_body(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port: int = 0, **kwargs) -> ThrottlingServer:
+    """Start a ThrottlingServer on a background thread; its URL is http://127.0.0.1:<server.server_port>."""
+    server = ThrottlingServer(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve throttled JSON listing pages for crawl benchmarks.")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--rate-limit", type=float, default=20, help="Requests per second served before 429s.")
+    parser.add_argument("--capacity", type=int, default=8, help="Requests in flight before latency grows.")
+    parser.add_argument("--base-latency", type=float, default=0.2, help="Seconds per response when not overloaded.")
+    parser.add_argument("--pages", type=int, default=50, help="Pages per listing.")
+    args = parser.parse_args()
+    server = ThrottlingServer(("127.0.0.1", args.port), args.rate_limit, args.capacity, args.base_latency, args.pages)
+    print(f"Serving on http://127.0.0.1:{args.port} (429 above {args.rate_limit} req/s)")
+    server.serve_forever()
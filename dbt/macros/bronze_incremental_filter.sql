@@ -0,0 +1,16 @@
+{#
+    WHERE clause restricting a bronze source to the partitions an incremental run still
+    has to process: date_scraped from the newest one already in {{ this }}, minus
+    `bronze_lookback_days` (rows streamed or re-run into an earlier day). The cutoff is
+    read at compile time and rendered as a literal date -- BigQuery only prunes
+    partitions on constant filters, not on a `(select max(...) from this)` subquery.
+    Renders nothing on full refreshes and first builds.
+#}
+{% macro bronze_incremental_filter(column='date_scraped', lookback_days=var('bronze_lookback_days', 1)) %}
+    {%- if is_incremental() and execute -%}
+        {%- set max_date = run_query("select max(" ~ column ~ ") from " ~ this).columns[0].values()[0] -%}
+        {%- if max_date is not none %}
+    where {{ column }} >= date_sub(date '{{ max_date }}', interval {{ lookback_days }} day)
+        {%- endif -%}
+    {%- endif -%}
+{% endmacro %}
@@ -10,8 +10,22 @@
 --      reachable in the legacy code (some whitelist entries were dead due to substring
 --      shadowing by an earlier, broader token in the same priority list).
 
+-- Incremental: a run only reads the bronze partitions from the newest date_scraped
+-- already in this table on (bronze_incremental_filter), dedups those rows the same way
+-- as below and merges them by product_id -- a listing's newest row is always in the new
+-- partitions if it has one there. `dbt run --full-refresh` rebuilds from all of bronze.
+
+{{ config(
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key='product_id',
+    cluster_by=['product_id'],
+    on_schema_change='append_new_columns',
+) }}
+
 with source as (
     select * from {{ source('bronze', 'real_estate') }}
+    {{ bronze_incremental_filter() }}
 ),
 
 cleaned_link as (
@@ -5,8 +5,22 @@
 -- so it is not comparable to stg_real_estate.price_num/price_1m2 and must not share
 -- their bounds/bins downstream (see mart_real_estate_rent.sql).
 
+-- Incremental: a run only reads the bronze partitions from the newest date_scraped
+-- already in this table on (bronze_incremental_filter), dedups those rows the same way
+-- as below and merges them by product_id -- a listing's newest row is always in the new
+-- partitions if it has one there. `dbt run --full-refresh` rebuilds from all of bronze.
+
+{{ config(
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key='product_id',
+    cluster_by=['product_id'],
+    on_schema_change='append_new_columns',
+) }}
+
 with source as (
     select * from {{ source('bronze', 'real_estate_rent') }}
+    {{ bronze_incremental_filter() }}
 ),
 
 cleaned_link as (
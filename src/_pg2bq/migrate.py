@@ -1,14 +1,69 @@
 import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from decimal import Context, Decimal
+from pathlib import Path
 
+import pyarrow as pa
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
 from sqlalchemy import inspect
 
+from src.utils.bronze_schemas import bronze_partitioning
 from src.utils.sqlalchemy_conn import dbConnector as db
-from src.utils.gcp_conn import get_bigquery_client, upload_df_to_bigquery
+from src.utils.gcp_conn import execute_query, get_bigquery_client, load_arrow_to_bigquery
 from src.utils.common_tools import setup_logging
 
 logger = setup_logging()
 
 SCHEMAS = ["re_bronze", "re_silver"]
+# Rows fetched from the server-side cursor, converted and loaded at a time.
+MIGRATE_CHUNK_ROWS = int(os.getenv("PG2BQ_CHUNK_ROWS", 100_000))
+# Tables migrated side by side.
+MIGRATE_WORKERS = int(os.getenv("PG2BQ_WORKERS", 4))
+STAGING_SUFFIX = "__staging"
+# Per-table watermarks for --incremental: the Postgres snapshot each table was last synced as of.
+WATERMARK_STATE_PATH = os.getenv("PG2BQ_STATE_PATH", "data/state/pg2bq-watermarks.json")
+
+# Rows written by a transaction the watermark snapshot couldn't see yet. xmin is a 32-bit
+# xid; it's widened to the 64-bit txid snapshots use, in the current epoch -- or the one
+# before, for an xid above the current snapshot's xmax.
+NEW_ROWS_FILTER = """
+    NOT txid_visible_in_snapshot(
+        {epoch_base} + xmin::text::bigint - CASE WHEN {epoch_base} + xmin::text::bigint > {xmax} THEN 4294967296 ELSE 0 END,
+        %(since)s::txid_snapshot
+    )
+"""
+
+_PYTHON_TO_ARROW = {
+    int: pa.int64(), float: pa.float64(), bool: pa.bool_(), str: pa.string(), date: pa.date32(),
+}
+
+
+class WatermarkState:
+    """Per-table sync watermarks, keyed by BigQuery table id, in a local JSON file shared by the workers."""
+
+    def __init__(self, path=WATERMARK_STATE_PATH):
+        self.path = Path(path)
+        self.entries = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self._lock = threading.Lock()
+
+    def get(self, table_id: str) -> dict | None:
+        return self.entries.get(table_id)
+
+    def set(self, table_id: str, snapshot: str, rows: int):
+        with self._lock:
+            self.entries[table_id] = {
+                "snapshot": snapshot, "rows": rows, "synced_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self.entries, indent=2))
+            os.replace(tmp_path, self.path)
 
 
 def ensure_dataset(bq_client, dataset_id):
@@ -19,38 +74,246 @@ def get_tables(pg_engine, schema):
     return sorted(inspect(pg_engine).get_table_names(schema=schema))
 
 
-def migrate_table(pg_conn, bq_client, schema, table):
-    df = db.fetch_to_dataframe(pg_conn, f'SELECT * FROM "{schema}"."{table}"')
-    if df.empty:
-        logger.info(f"Skipping {schema}.{table}: table is empty")
+def primary_key(pg_engine, schema, table) -> list[str]:
+    return inspect(pg_engine).get_pk_constraint(table, schema=schema)["constrained_columns"]
+
+
+def decimal_type(precision: int | None, scale: int | None) -> pa.DataType:
+    """
+    Arrow decimal for Postgres numeric(precision, scale), so BigQuery keeps it exact:
+    NUMERIC, or BIGNUMERIC past NUMERIC's range. Unconstrained numeric becomes
+    decimal128(38, 9) -- NUMERIC's own precision and scale. Wider than BIGNUMERIC: string.
+    """
+    if precision is None:
+        return pa.decimal128(38, 9)
+    scale = scale or 0
+    if precision <= 38:
+        return pa.decimal128(precision, scale)
+    if precision <= 76 and scale <= 38:
+        return pa.decimal256(precision, scale)
+    return pa.string()
+
+
+def arrow_field(column: dict) -> pa.Field:
+    """Arrow type for a SQLAlchemy-inspected column; types with no Arrow counterpart (json, uuid...) become strings."""
+    try:
+        python_type = column["type"].python_type
+    except NotImplementedError:
+        python_type = None
+    if python_type is datetime:
+        return pa.field(column["name"], pa.timestamp("us", tz="UTC" if getattr(column["type"], "timezone", False) else None))
+    if python_type is Decimal:
+        return pa.field(column["name"], decimal_type(column["type"].precision, column["type"].scale))
+    return pa.field(column["name"], _PYTHON_TO_ARROW.get(python_type, pa.string()))
+
+
+def _coerce(value, arrow_type):
+    if value is None:
+        return None
+    if pa.types.is_decimal(arrow_type):
+        # Unconstrained numeric with more decimals than the column's scale: round half-even,
+        # as BigQuery does storing NUMERIC. Raises if the integer part doesn't fit.
+        return Decimal(value).quantize(Decimal(1).scaleb(-arrow_type.scale), context=Context(prec=arrow_type.precision))
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+def rows_to_arrow(rows, schema: pa.Schema) -> pa.Table:
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        try:
+            arrays.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # numeric with extra decimals, json -> dict, uuid -> UUID...
+            arrays.append(pa.array([_coerce(value, field.type) for value in values], type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def iter_arrow_chunks(pg_engine, schema, table, chunk_rows=MIGRATE_CHUNK_ROWS, since: str | None = None, snapshot: dict | None = None):
+    """
+    Stream "schema"."table" through a server-side cursor as Arrow tables of up to
+    chunk_rows rows, typed from the Postgres column types so every chunk has the same
+    schema. Only one chunk is in memory at a time.
+
+    The read runs in one REPEATABLE READ transaction: snapshot["snapshot"], if given, is
+    set to the snapshot the rows were read as of. since: only the rows inserted or
+    updated by transactions that earlier snapshot couldn't see.
+    """
+    fields = {column["name"]: arrow_field(column) for column in inspect(pg_engine).get_columns(table, schema=schema)}
+    with pg_engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ", stream_results=True, max_row_buffer=chunk_rows)
+        sql, params = f'SELECT * FROM "{schema}"."{table}"', None
+        if snapshot is not None or since is not None:
+            current = conn.exec_driver_sql("SELECT txid_current_snapshot()::text").scalar()
+            if snapshot is not None:
+                snapshot["snapshot"] = current
+            if since is not None:
+                xmax = int(current.split(":")[1])
+                sql += " WHERE " + NEW_ROWS_FILTER.format(epoch_base=xmax >> 32 << 32, xmax=xmax)
+                params = {"since": since}
+        result = conn.exec_driver_sql(sql, params)
+        arrow_schema = pa.schema([fields[name] for name in result.keys()])
+        for rows in result.partitions(chunk_rows):
+            yield rows_to_arrow(rows, arrow_schema)
+
+
+def get_target(bq_client, table_id):
+    try:
+        return bq_client.get_table(table_id)
+    except NotFound:
+        return None
+
+
+def staging_layout(target, table_id) -> dict:
+    """Partitioning/clustering for the staging table, so it can be copied over table_id as is."""
+    if target is None:
+        partitioning = bronze_partitioning(table_id)
+        if partitioning is None:
+            return {}
+        field, clustering = partitioning
+        return {
+            "time_partitioning": bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field=field),
+            "clustering_fields": clustering,
+        }
+    return {"time_partitioning": target.time_partitioning, "clustering_fields": target.clustering_fields}
+
+
+def load_staging(pg_conn, bq_client, schema, table, staging_id, layout, chunk_rows, since=None) -> tuple[int, list[str], str | None]:
+    """
+    Stream the table (or only its rows changed since `since`) into staging_id; returns
+    rows, columns and the read's snapshot. Columns keep the types iter_arrow_chunks gave
+    them from Postgres -- the scrapers' declared bronze schemas don't apply here.
+    """
+    snapshot = {}
+    rows, columns = 0, []
+    for seq, chunk in enumerate(iter_arrow_chunks(pg_conn, schema, table, chunk_rows, since=since, snapshot=snapshot)):
+        rows += load_arrow_to_bigquery(
+            bq_client, chunk, staging_id,
+            write_disposition="WRITE_TRUNCATE" if seq == 0 else "WRITE_APPEND",
+            **layout,
+        )
+        columns = chunk.column_names
+    return rows, columns, snapshot.get("snapshot")
+
+
+def migrate_table(pg_conn, bq_client, schema, table, chunk_rows=MIGRATE_CHUNK_ROWS, state: WatermarkState | None = None):
+    """
+    Load the table chunk by chunk into <table>__staging, then copy that over the target
+    with WRITE_TRUNCATE -- a single atomic replace, so a migration that fails midway
+    leaves the target as it was. The staging table is always dropped. With `state`, the
+    snapshot the table was read as of becomes its watermark.
+    """
+    table_id = f"{bq_client.project}.{schema}.{table}"
+    staging_id = f"{table_id}{STAGING_SUFFIX}"
+    layout = staging_layout(get_target(bq_client, table_id), table_id)
+    start = time.perf_counter()
+    try:
+        rows, _, snapshot = load_staging(pg_conn, bq_client, schema, table, staging_id, layout, chunk_rows)
+        if rows:
+            copy_config = bigquery.CopyJobConfig(write_disposition="WRITE_TRUNCATE")
+            bq_client.copy_table(staging_id, table_id, job_config=copy_config).result()
+    finally:
+        bq_client.delete_table(staging_id, not_found_ok=True)
+    if state is not None:
+        # Empty tables get a watermark too, so the next --incremental run only reads rows added since.
+        state.set(table_id, snapshot, rows)
+    if rows == 0:
+        logger.info("Skipping %s.%s: table is empty", schema, table)
         return 0
+    logger.info("Migrated %d rows: %s.%s -> %s in %.1fs", rows, schema, table, table_id, time.perf_counter() - start)
+    return rows
+
+
+def merge_sql(target_id, staging_id, columns: list[str], key: list[str]) -> str:
+    """Upsert staging into target by `key`; with no key (append-only tables), plain INSERT."""
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    if not key:
+        return f"INSERT INTO `{target_id}` ({column_list}) SELECT {column_list} FROM `{staging_id}`"
+    on = " AND ".join(f"T.`{column}` = S.`{column}`" for column in key)
+    updates = ", ".join(f"`{column}` = S.`{column}`" for column in columns if column not in key)
+    when_matched = f"WHEN MATCHED THEN UPDATE SET {updates}" if updates else ""
+    return f"""
+        MERGE `{target_id}` T
+        USING `{staging_id}` S
+        ON {on}
+        {when_matched}
+        WHEN NOT MATCHED THEN INSERT ({column_list}) VALUES ({", ".join(f"S.`{column}`" for column in columns)})
+    """
 
+
+def sync_table(pg_conn, bq_client, schema, table, state: WatermarkState, chunk_rows=MIGRATE_CHUNK_ROWS):
+    """
+    Copy only the rows inserted or updated since the table's watermark into staging and
+    merge them into the target by its Postgres primary key -- or append them, for tables
+    without one. Deleted rows aren't propagated. Tables with no watermark or no target
+    yet, and tables that gained columns, are migrated in full instead.
+    """
     table_id = f"{bq_client.project}.{schema}.{table}"
-    rows = upload_df_to_bigquery(
-        bq_client, df, table_id,
-        write_disposition="WRITE_TRUNCATE",
-        allow_field_addition=True,
+    watermark, target = state.get(table_id), get_target(bq_client, table_id)
+    if watermark is None or target is None:
+        logger.info("No watermark or target for %s yet, migrating it in full", table_id)
+        return migrate_table(pg_conn, bq_client, schema, table, chunk_rows, state=state)
+
+    staging_id = f"{table_id}{STAGING_SUFFIX}"
+    key = primary_key(pg_conn, schema, table)
+    start = time.perf_counter()
+    new_columns = set()
+    try:
+        rows, columns, snapshot = load_staging(
+            pg_conn, bq_client, schema, table, staging_id, staging_layout(target, table_id), chunk_rows,
+            since=watermark["snapshot"],
+        )
+        new_columns = set(columns) - {field.name for field in target.schema}
+        if rows and not new_columns:
+            execute_query(bq_client, merge_sql(table_id, staging_id, columns, key))
+    finally:
+        bq_client.delete_table(staging_id, not_found_ok=True)
+    if new_columns:
+        logger.info("%s has new columns (%s), migrating it in full", table_id, ", ".join(sorted(new_columns)))
+        return migrate_table(pg_conn, bq_client, schema, table, chunk_rows, state=state)
+    state.set(table_id, snapshot, rows)
+    logger.info(
+        "Synced %d changed rows: %s.%s -> %s (%s) in %.1fs", rows, schema, table, table_id,
+        f"merged on {', '.join(key)}" if key else "appended", time.perf_counter() - start,
     )
-    logger.info(f"Migrated {rows} rows: {schema}.{table} -> {table_id}")
     return rows
 
 
-def main(schemas: list[str], tables: list[str] | None = None):
+def migrate_one(pg_conn, bq_client, schema, table, chunk_rows, state=None, incremental=False):
+    try:
+        if incremental:
+            return schema, table, sync_table(pg_conn, bq_client, schema, table, state, chunk_rows), None
+        return schema, table, migrate_table(pg_conn, bq_client, schema, table, chunk_rows, state=state), None
+    except Exception as e:
+        logger.error(f"Failed to migrate {schema}.{table}: {e}")
+        return schema, table, None, str(e)
+
+
+def migrate_tables(pg_conn, bq_client, pending: list[tuple[str, str]], workers=MIGRATE_WORKERS, chunk_rows=MIGRATE_CHUNK_ROWS,
+                   state: WatermarkState | None = None, incremental=False):
+    """Migrate (schema, table) pairs, `workers` at a time; the summary keeps their order."""
+    # Each worker holds its own pooled Postgres connection and at most one chunk.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(migrate_one, pg_conn, bq_client, schema, table, chunk_rows, state, incremental)
+            for schema, table in pending
+        ]
+        return [future.result() for future in futures]
+
+
+def main(schemas: list[str], tables: list[str] | None = None, workers: int = MIGRATE_WORKERS, chunk_rows: int = MIGRATE_CHUNK_ROWS,
+         incremental: bool = False):
     pg_conn = db.spyno_sb_conn()
     bq_client = get_bigquery_client()
 
-    summary = []
+    pending = []
     for schema in schemas:
         ensure_dataset(bq_client, schema)
-        for table in get_tables(pg_conn, schema):
-            if tables and table not in tables:
-                continue
-            try:
-                rows = migrate_table(pg_conn, bq_client, schema, table)
-                summary.append((schema, table, rows, None))
-            except Exception as e:
-                logger.error(f"Failed to migrate {schema}.{table}: {e}")
-                summary.append((schema, table, None, str(e)))
+        pending += [(schema, table) for table in get_tables(pg_conn, schema) if not tables or table in tables]
+    # Full migrations record watermarks too, so --incremental can pick up after them.
+    state = WatermarkState()
+    summary = migrate_tables(pg_conn, bq_client, pending, workers=workers, chunk_rows=chunk_rows, state=state, incremental=incremental)
 
     logger.info("=== Migration summary ===")
     for schema, table, rows, error in summary:
@@ -63,9 +326,14 @@ def parse_args():
     parser = argparse.ArgumentParser(description="Migrate Supabase (Postgres) re_bronze/re_silver schemas to BigQuery datasets of the same name.")
     parser.add_argument("--schemas", nargs="+", default=SCHEMAS, help="Schemas to migrate. Default: %(default)s")
     parser.add_argument("--tables", nargs="+", default=None, help="Only migrate these table names (applies across all --schemas). Default: all tables.")
+    parser.add_argument("--workers", type=int, default=MIGRATE_WORKERS, help="Tables migrated at once. Default: %(default)s (env PG2BQ_WORKERS)")
+    parser.add_argument("--chunk-rows", type=int, default=MIGRATE_CHUNK_ROWS, help="Rows per streamed chunk / load job. Default: %(default)s (env PG2BQ_CHUNK_ROWS)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only copy rows inserted/updated since each table's last migration (watermarks in PG2BQ_STATE_PATH) "
+                             "and merge them into the target. Deletes aren't propagated; run without it to resync in full.")
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    main(schemas=args.schemas, tables=args.tables)
+    main(schemas=args.schemas, tables=args.tables, workers=args.workers, chunk_rows=args.chunk_rows, incremental=args.incremental)
@@ -1,21 +1,47 @@
-import time
+import asyncio
+import os
+import random
 
 import pandas as pd
-from curl_cffi import requests
 from src.utils.gcp_conn import get_bigquery_client, upload_df_to_bigquery
 from src.utils.common_tools import setup_logging
+from src.utils.crawl_engine import AIMDController, new_rate_limiter, run_work_queue
+from src.utils.http_session import blocking_get, new_session
+from src.utils.stage_metrics import METRICS, write_run_metrics
+from src.utils.http_cache import DAY_SECONDS, HTTP_CACHE_PATH, CachedSession, HttpCache
 logger = setup_logging()
 
 MAX_ATTEMPTS = 3
 RETRY_BACKOFF_SECONDS = 2
+MAX_CONCURRENCY = int(os.getenv("METADATA_CONCURRENCY", 8))
+# main() lets an AIMDController move the in-flight limit between 1 and this, starting
+# at MAX_CONCURRENCY.
+ADAPTIVE_MAX_CONCURRENCY = int(os.getenv("METADATA_ADAPTIVE_MAX_CONCURRENCY", 16))
+# Under the pipeline, REQUESTS_PER_SECOND is the batdongsan.com.vn budget this step
+# shares with the other scrapes through RATE_LIMIT_FILE (run_pipeline.step_env) and wins. Run standalone, the small JSON lookups get
+# their own METADATA_REQUESTS_PER_SECOND: walking every ward of every city is ~2
+# requests per ward.
+REQUESTS_PER_SECOND = float(os.getenv("REQUESTS_PER_SECOND") or os.getenv("METADATA_REQUESTS_PER_SECOND", 8))
+BASE_URL = os.getenv("METADATA_BASE_URL", "https://batdongsan.com.vn")
+HTTP_CACHE = os.getenv("HTTP_CACHE_PATH", HTTP_CACHE_PATH)
+
+V2_ENDPOINTS = {
+    "GetCities": "/Product/ProductSearch/GetCitiesV2",
+    "GetWardsByCityCode": "/Product/ProductSearch/GetWardsByCityCodeV2?cityCode={}",
+    "GetStreetsByWardIdV2": "/Product/ProductSearch/GetStreetsByWardIdV2?wardId={}",
+    "GetProjectsByWardId": "/Product/ProductSearch/GetProjectsByWardIdV2?wardId={}",
+}
+# How long a cached lookup is trusted without even a conditional request. Cities and
+# wards only change with administrative reforms; projects get added now and then.
+CACHE_TTLS = {
+    "/Product/ProductSearch/GetCitiesV2": 30 * DAY_SECONDS,
+    "/Product/ProductSearch/GetWardsByCityCodeV2": 30 * DAY_SECONDS,
+    "/Product/ProductSearch/GetStreetsByWardIdV2": 7 * DAY_SECONDS,
+    "/Product/ProductSearch/GetProjectsByWardIdV2": 1 * DAY_SECONDS,
+}
 
 def custom_request(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-    }
-    response = requests.get(url, headers=headers, impersonate="chrome124")
+    response = blocking_get(url)
     return response
 
 def response_to_df(response):
@@ -23,32 +49,82 @@ def response_to_df(response):
     df = pd.DataFrame(json_data)
     return df
 
-def get_children_infos(parents_df: pd.DataFrame, key_column: str, url_template="https://batdongsan.com.vn/Product/ProductSearch/GetWardsByDistrictIds?districtIds={}"):
-    df_all = pd.DataFrame()
-    for parent in parents_df.itertuples():
-        parent_id = getattr(parent, key_column)
-        url = url_template.format(parent_id)
-
-        # A single bad request (timeout, transient rate-limit, malformed body) used to
-        # raise and crash the whole script, losing every row fetched so far (everything
-        # is only uploaded at the very end). Retry a few times, then skip just this one
-        # parent instead of aborting the run.
-        infos = None
-        for attempt in range(1, MAX_ATTEMPTS + 1):
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter, so retries of many parents don't fire in lockstep."""
+    return random.uniform(0, RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+async def fetch_json(session, url: str, label: str):
+    """
+    GET url and decode its JSON body, retrying with jittered backoff. A single bad
+    request (timeout, transient rate-limit, malformed body) used to raise and crash
+    the whole script, losing every row fetched so far -- after MAX_ATTEMPTS this one
+    lookup is skipped (None) instead. Through a CachedSession a body is only cached
+    once it decodes, and one that doesn't decode is evicted before the retry; an HTTP
+    error (429, 503...) leaves the cached copy alone, since a non-200 is never cached.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            response = await session.get(url)
+            response.raise_for_status()
+        except Exception as e:
+            error = e
+        else:
             try:
-                response = custom_request(url)
-                infos = response_to_df(response)
-                break
+                data = response.json()
             except Exception as e:
-                if attempt < MAX_ATTEMPTS:
-                    logger.warning(f"{key_column}={parent_id} attempt {attempt}/{MAX_ATTEMPTS} failed ({e}), retrying...")
-                    time.sleep(RETRY_BACKOFF_SECONDS)
-                else:
-                    logger.error(f"{key_column}={parent_id} failed after {MAX_ATTEMPTS} attempts ({e}), skipping.")
-
-        if infos is not None:
-            df_all = pd.concat([df_all, infos], ignore_index=True)
-    return df_all
+                error = e
+                if isinstance(session, CachedSession):
+                    # Don't let the retry be served this same body from the cache.
+                    session.evict(url)
+            else:
+                if isinstance(session, CachedSession):
+                    session.commit(url)
+                return data
+        if attempt < MAX_ATTEMPTS:
+            logger.warning("%s attempt %d/%d failed (%s), retrying...", label, attempt, MAX_ATTEMPTS, error)
+            await asyncio.sleep(retry_delay(attempt))
+        else:
+            logger.error("%s failed after %d attempts (%s), skipping.", label, MAX_ATTEMPTS, error)
+    return None
+
+async def get_children_infos_by_template(parents_df: pd.DataFrame, key_column: str, url_templates: dict, session=None,
+                                         concurrency: int = MAX_CONCURRENCY,
+                                         requests_per_second: float | None = REQUESTS_PER_SECOND) -> dict:
+    """
+    Fetch one lookup per (parent row, url template) on a shared session and work
+    queue -- e.g. streets and projects of the same ward side by side -- and return
+    {template name: DataFrame of every child record}. Records are collected as
+    plain lists and turned into one DataFrame per template at the end. Without a
+    `session` (e.g. a CachedSession) a plain one is opened for the call.
+    """
+    if session is None:
+        async with new_session(max_clients=concurrency) as session:
+            return await get_children_infos_by_template(
+                parents_df, key_column, url_templates, session, concurrency, requests_per_second,
+            )
+
+    items = [(name, parent_id) for parent_id in parents_df[key_column] for name in url_templates]
+
+    async def fetch(item):
+        name, parent_id = item
+        return await fetch_json(session, url_templates[name].format(parent_id), f"{name} {key_column}={parent_id}")
+
+    results = await run_work_queue(items, fetch, concurrency=concurrency, requests_per_second=requests_per_second)
+
+    records = {name: [] for name in url_templates}
+    for (name, _), infos in zip(items, results):
+        if infos:
+            records[name].extend(infos)
+    return {name: pd.DataFrame(rows) for name, rows in records.items()}
+
+async def get_children_infos(parents_df: pd.DataFrame, key_column: str, url_template=f"{BASE_URL}/Product/ProductSearch/GetWardsByDistrictIds?districtIds={{}}",
+                             session=None, concurrency: int = MAX_CONCURRENCY,
+                             requests_per_second: float | None = REQUESTS_PER_SECOND):
+    infos = await get_children_infos_by_template(
+        parents_df, key_column, {"infos": url_template}, session,
+        concurrency=concurrency, requests_per_second=requests_per_second,
+    )
+    return infos["infos"]
 
 
 # url = "https://batdongsan.com.vn/Product/ProductSearch/GetCities"
@@ -69,40 +145,48 @@ def get_children_infos(parents_df: pd.DataFrame, key_column: str, url_template="
 # projects_all = get_children_infos(districts, key_column="districtId", url_template="https://batdongsan.com.vn/Product/ProductSearch/GetProjectsByDistrictIds?districtIds={}")
 
 
-{
-    "GetCities": "/Product/ProductSearch/GetCitiesV2",
-    "GetWardsByCityCode": "/Product/ProductSearch/GetWardsByCityCodeV2",
-    "GetStreetsByWardIdV2": "/Product/ProductSearch/GetStreetsByWardIdV2",
-    "GetProjectsByWardId": "/Product/ProductSearch/GetProjectsByWardIdV2"
-}
-
-ward_sg = response_to_df(custom_request("https://batdongsan.com.vn/Product/ProductSearch/GetWardsByCityCodeV2?cityCode=SG"))
-
-response_to_df(custom_request("https://batdongsan.com.vn/Product/ProductSearch/GetProjectsByWardIdV2?wardId=1036"))
-
-
-
-
-cities_v2 = response_to_df(custom_request("https://batdongsan.com.vn/Product/ProductSearch/GetCitiesV2"))
-wards_v2 = get_children_infos(cities_v2, key_column="code", url_template="https://batdongsan.com.vn/Product/ProductSearch/GetWardsByCityCodeV2?cityCode={}")
-streets_v2 = get_children_infos(wards_v2, key_column="wardId", url_template="https://batdongsan.com.vn/Product/ProductSearch/GetStreetsByWardIdV2?wardId={}")
-projects_v2 = get_children_infos(wards_v2, key_column="wardId", url_template="https://batdongsan.com.vn/Product/ProductSearch/GetProjectsByWardIdV2?wardId={}")
-
-
-
-
-
-
-# write to BigQuery
-bq_client = get_bigquery_client()
-# upload_df_to_bigquery(bq_client, cities, f"{bq_client.project}.re_bronze.m_cities", write_disposition="WRITE_TRUNCATE")
-# upload_df_to_bigquery(bq_client, districts, f"{bq_client.project}.re_bronze.m_districts", write_disposition="WRITE_TRUNCATE")
-# upload_df_to_bigquery(bq_client, wards_all, f"{bq_client.project}.re_bronze.m_wards", write_disposition="WRITE_TRUNCATE")
-# upload_df_to_bigquery(bq_client, streets_all, f"{bq_client.project}.re_bronze.m_streets", write_disposition="WRITE_TRUNCATE")
-# upload_df_to_bigquery(bq_client, projects_all, f"{bq_client.project}.re_bronze.m_projects", write_disposition="WRITE_TRUNCATE")
-
-
-upload_df_to_bigquery(bq_client, cities_v2, f"{bq_client.project}.re_bronze.m_cities_v2", write_disposition="WRITE_TRUNCATE")
-upload_df_to_bigquery(bq_client, wards_v2, f"{bq_client.project}.re_bronze.m_wards_v2", write_disposition="WRITE_TRUNCATE")
-upload_df_to_bigquery(bq_client, streets_v2, f"{bq_client.project}.re_bronze.m_streets_v2", write_disposition="WRITE_TRUNCATE")
-upload_df_to_bigquery(bq_client, projects_v2, f"{bq_client.project}.re_bronze.m_projects_v2", write_disposition="WRITE_TRUNCATE")
\ No newline at end of file
+async def main(cache_path=HTTP_CACHE):
+    cache = HttpCache(cache_path)
+    controller = AIMDController(initial=MAX_CONCURRENCY, max_concurrency=ADAPTIVE_MAX_CONCURRENCY)
+    async with new_session(max_clients=MAX_CONCURRENCY, controller=controller) as raw_session:
+        # The cached session holds the requests/sec budget itself so lookups served
+        # from disk don't wait for tokens -- hence requests_per_second=None below.
+        session = CachedSession(raw_session, cache, ttls=CACHE_TTLS, rate_limiter=new_rate_limiter(REQUESTS_PER_SECOND))
+        cities = await fetch_json(session, f"{BASE_URL}{V2_ENDPOINTS['GetCities']}", "GetCities")
+        if cities is None:
+            raise RuntimeError("Could not fetch the city list.")
+        cities_v2 = pd.DataFrame(cities)
+        wards_v2 = await get_children_infos(cities_v2, key_column="code", url_template=f"{BASE_URL}{V2_ENDPOINTS['GetWardsByCityCode']}",
+                                            session=session, concurrency=ADAPTIVE_MAX_CONCURRENCY, requests_per_second=None)
+        logger.info("Fetched %d wards of %d cities", len(wards_v2), len(cities_v2))
+        ward_children = await get_children_infos_by_template(wards_v2, key_column="wardId", session=session,
+                                                             concurrency=ADAPTIVE_MAX_CONCURRENCY, requests_per_second=None, url_templates={
+            "streets": f"{BASE_URL}{V2_ENDPOINTS['GetStreetsByWardIdV2']}",
+            "projects": f"{BASE_URL}{V2_ENDPOINTS['GetProjectsByWardId']}",
+        })
+        logger.info("Fetched %d streets and %d projects", len(ward_children["streets"]), len(ward_children["projects"]))
+        session.log_stats("Metadata")
+        raw_session.stats.log("Metadata")
+        controller.log("Metadata")
+    cache.close()
+    return cities_v2, wards_v2, ward_children["streets"], ward_children["projects"]
+
+
+if __name__ == "__main__":
+    cities_v2, wards_v2, streets_v2, projects_v2 = asyncio.run(main())
+
+    # write to BigQuery
+    bq_client = get_bigquery_client()
+    # upload_df_to_bigquery(bq_client, cities, f"{bq_client.project}.re_bronze.m_cities", write_disposition="WRITE_TRUNCATE")
+    # upload_df_to_bigquery(bq_client, districts, f"{bq_client.project}.re_bronze.m_districts", write_disposition="WRITE_TRUNCATE")
+    # upload_df_to_bigquery(bq_client, wards_all, f"{bq_client.project}.re_bronze.m_wards", write_disposition="WRITE_TRUNCATE")
+    # upload_df_to_bigquery(bq_client, streets_all, f"{bq_client.project}.re_bronze.m_streets", write_disposition="WRITE_TRUNCATE")
+    # upload_df_to_bigquery(bq_client, projects_all, f"{bq_client.project}.re_bronze.m_projects", write_disposition="WRITE_TRUNCATE")
+
+    with METRICS.timer("upload"):
+        upload_df_to_bigquery(bq_client, cities_v2, f"{bq_client.project}.re_bronze.m_cities_v2", write_disposition="WRITE_TRUNCATE")
+        upload_df_to_bigquery(bq_client, wards_v2, f"{bq_client.project}.re_bronze.m_wards_v2", write_disposition="WRITE_TRUNCATE")
+        upload_df_to_bigquery(bq_client, streets_v2, f"{bq_client.project}.re_bronze.m_streets_v2", write_disposition="WRITE_TRUNCATE")
+        upload_df_to_bigquery(bq_client, projects_v2, f"{bq_client.project}.re_bronze.m_projects_v2", write_disposition="WRITE_TRUNCATE")
+    METRICS.count("rows_uploaded", len(cities_v2) + len(wards_v2) + len(streets_v2) + len(projects_v2))
+    write_run_metrics("metadata", logger)
@@ -1,21 +1,35 @@
 import argparse
 import asyncio
 import json
-from curl_cffi.requests import AsyncSession
-from curl_cffi import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import os
 
-from src.utils.gcp_conn import get_bigquery_client, upload_df_to_bigquery
-from src.utils.common_tools import setup_logging
+from src.utils.gcp_conn import get_bigquery_client, load_arrow_to_bigquery
+from src.utils.common_tools import peak_rss_mb, setup_logging
+from src.utils.crawl_engine import AIMDController, ListingCrawler
+from src.utils.http_session import new_session
+from src.utils.html_backend import PARSER_BACKENDS, find_all_by_class, find_first_by_class, parse_html, text_of
+from src.utils.parse_executor import PARSE_EXECUTORS, parse_executor, run_parse
+from src.utils.crawl_checkpoint import open_checkpointed_spool
+from src.utils.bronze_stream import open_bronze_stream
+from src.utils.stage_metrics import METRICS, write_run_metrics
+from src.utils.page_archive import ARCHIVE_DIR, PageArchive
 logger = setup_logging()
 
 
+# Requests in flight to start from; an AIMDController moves it between 1 and
+# ADAPTIVE_MAX_CONCURRENCY with how the site answers (429/403/5xx halve it).
 MAX_CONCURRENCY = 5
-BATCH_SIZE = 100
-BATCH_DELAY_SECONDS = 0
+ADAPTIVE_MAX_CONCURRENCY = int(os.getenv("ADAPTIVE_MAX_CONCURRENCY", 16))
+# No pause between batches before either, so concurrency is the only bound unless a
+# budget is passed in (run_pipeline splits the host's budget between parallel steps).
+REQUESTS_PER_SECOND = float(os.environ["REQUESTS_PER_SECOND"]) if os.getenv("REQUESTS_PER_SECOND") else None
 URL = os.getenv("URL", "https://batdongsan.com.vn/du-an-bat-dong-san-tp-hcm")
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "process")  # "process" | "thread" | "inline"
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "bs4")  # "bs4" | "lxml"
+SPOOL_DIR = os.getenv("SPOOL_DIR", "data/spool")
+ARCHIVE = os.getenv("ARCHIVE_DIR", ARCHIVE_DIR)  # raw pages, with --archive
+BRONZE_TABLE = "projects"
 # URL = os.getenv("URL", "")
 
 
@@ -58,102 +72,218 @@ def soup_to_df(html_soup):
             "id"                : prj_id,
         })
 
-    logger.info(f"Extracted {len(results)} listings from the page")
+    logger.info("Extracted %d listings from the page", len(results))
     return pd.DataFrame(results)
 
 
+PROJECT_CARD = ("div", "js__project-card js__card-project-web re__prj-card-full")
+# (key, tag, class_) of every element soup_to_df looks up in a project card,
+# collected by lxml_to_df in a single pass. The link (href + id) is looked up once.
+PROJECT_CARD_FIELDS = [
+    ("title", "h3", "re__prj-card-title"),
+    ("location", "div", "re__prj-card-location"),
+    ("description", "div", "re__prj-card-summary"),
+    ("link", "a", "re__clearfix"),
+    ("config", "div", "re__prj-card-config re__clearfix"),
+]
 
-def get_urls_list(html_content, base_url):
-    """Extract total number of pages from HTML content."""
-    page_num_list = html_content.find_all("a", class_="re__pagination-number")
-    page_num = max([int(i.text.strip()) for i in page_num_list]) if page_num_list else 1
-    urls = [f"{base_url}/p{i}" for i in range(1, page_num + 1)]
-    logger.info(f"Total pages to fetch: {page_num}")
-    return urls
-
-
-
-async def fetch_and_parse(url, session, semaphore):
-    """Fetch HTML content from URL and parse it into a DataFrame."""
-    async with semaphore:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-        }
-
-        try:
-            # The 'impersonate' argument is the magic part—it mimics Chrome's TLS fingerprint
-            response = await session.get(url, headers=headers, impersonate="chrome124")
-
-            if response.status_code == 200:
-                logger.info(f"Success! Data received from {url}")
-                html_content = BeautifulSoup(response.text, 'html.parser')
+def lxml_to_df(html_tree):
+    """
+    lxml fast path for soup_to_df (parser backend "lxml"): produces the same rows,
+    but walks each card once instead of calling find() per field.
+    """
+    def extract_card_configs(card_config_all):
+        """Extract card configurations from a project card's config block."""
+        configs = []
+        for card_config in find_all_by_class(card_config_all, "span", "re__prj-card-config-value"):
+            if card_config.get('aria-label'):
+                config = card_config.get('aria-label').strip()
             else:
-                logger.error(f"Failed with status code: {response.status_code} for {url}")
-                return None, None
-                
-            df = soup_to_df(html_content)
-            return df, html_content
-        except Exception as e:
-            logger.error(f"Error fetching {url}: {e}")
+                config = text_of(card_config).strip()
+            configs.append(config)
+        return configs
+
+    prj_cards = find_all_by_class(html_tree, *PROJECT_CARD)
+
+    results = []
+    for prj in prj_cards:
+        tags = find_first_by_class(prj, PROJECT_CARD_FIELDS, skip=PROJECT_CARD)
+        results.append({
+            "title"             : text_of(tags["title"]).strip(),
+            "additional_info"   : json.dumps(extract_card_configs(tags["config"]), ensure_ascii=False),
+            "location"          : text_of(tags["location"]).strip(),
+            "description"       : text_of(tags["description"]).strip(),
+            "link"              : tags["link"].attrib['href'],
+            "id"                : tags["link"].attrib['tracking-label'],
+        })
+
+    logger.info("Extracted %d listings from the page", len(results))
+    return pd.DataFrame(results)
+
+
+
+def get_page_count(html_content):
+    """Extract total number of pages from HTML content."""
+    page_num_list = find_all_by_class(html_content, "a", "re__pagination-number")
+    return max([int(text_of(i).strip()) for i in page_num_list]) if page_num_list else 1
+
+def parse_page(content: bytes, encoding: str = "utf-8", backend: str = "bs4"):
+    """
+    Parse one raw project listing page into (row records, total page count).
+    Module-level so it can run on a process-pool parse worker (see
+    src/utils/parse_executor.py).
+    """
+    with METRICS.timer("html_parse"):
+        html_content = parse_html(content, encoding, backend)
+        df = soup_to_df(html_content) if backend == "bs4" else lxml_to_df(html_content)
+    return df.to_dict("records"), get_page_count(html_content)
+
+
+
+async def fetch_and_parse(url, session, executor=None, backend=PARSER_BACKEND):
+    """Fetch HTML content from URL and parse it (on `executor`, if given) into (row records, page count)."""
+    try:
+        # Headers and the chrome124 impersonation are session defaults (src/utils/http_session.py)
+        response = await session.get(url)
+
+        if response.status_code == 200:
+            logger.info("Success! Data received from %s", url, extra={"url": url, "status": response.status_code})
+        else:
+            logger.error("Failed with status code: %s for %s", response.status_code, url, extra={"url": url, "status": response.status_code})
             return None, None
 
-async def fetch_all_pages(urls: list, batch_size: int = BATCH_SIZE, batch_delay_seconds: int = BATCH_DELAY_SECONDS):
-    """Fetch pages in bounded batches with a pause between batches."""
-    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
-    all_results = []
-    
-    async with AsyncSession() as session:
-        for start_index in range(0, len(urls), batch_size):
-            batch_number = (start_index // batch_size) + 1
-            batch_urls = urls[start_index:start_index + batch_size]
-            tasks = [fetch_and_parse(page_url, session, semaphore) for page_url in batch_urls]
-            batch_results = await asyncio.gather(*tasks)
-            all_results.extend(batch_results)
-
-            has_more_batches = start_index + batch_size < len(urls)
-            if has_more_batches:
-                logger.info(
-                    f"Completed batch {batch_number} ({len(batch_urls)} pages). "
-                    f"Sleeping {batch_delay_seconds}s before the next batch."
-                )
-                await asyncio.sleep(batch_delay_seconds)
-    
-    return all_results
-
-async def main(url=URL):
-    # Fetch first page to get total pages
-    semaphore = asyncio.Semaphore(1)
-    async with AsyncSession() as session:
-        df, html_content = await fetch_and_parse(url, session, semaphore)
-    if df is None or len(df) == 0:
-        logger.error(f"No listings found on the first page. HTML content:\n{html_content}")
+        records, page_count = await run_parse(executor, parse_page, response.content, response.encoding, backend)
+        return records, page_count
+    except Exception as e:
+        logger.error("Error fetching %s: %s", url, e, extra={"url": url})
+        return None, None
+
+def new_controller() -> AIMDController:
+    """Adaptive in-flight limit for one run's session, starting at MAX_CONCURRENCY."""
+    return AIMDController(initial=MAX_CONCURRENCY, max_concurrency=ADAPTIVE_MAX_CONCURRENCY)
+
+def log_failed_pages(crawler):
+    for page_url in crawler.failed_pages:
+        logger.error("Page still failing after retries, its rows are missing from this run: %s", page_url, extra={"url": page_url})
+
+def new_crawler(session, spool, executor=None, backend=PARSER_BACKEND, checkpoint=None):
+    """ListingCrawler fetching and parsing project pages over one shared session."""
+    return ListingCrawler(
+        lambda page_url: fetch_and_parse(page_url, session, executor, backend),
+        spool, checkpoint=checkpoint,
+        concurrency=ADAPTIVE_MAX_CONCURRENCY, requests_per_second=REQUESTS_PER_SECOND,
+    )
+
+async def main(spool, url=URL, executor=None, backend=PARSER_BACKEND, checkpoint=None, archive=None, replay=None):
+    """
+    Crawl every page of one project listing URL into `spool`. Returns the number of
+    rows spooled. With a `checkpoint`, pages already done in a previous (crashed) run
+    are skipped.
+    """
+    rows_before = spool.rows_spooled
+    controller = new_controller()
+    async with new_session(max_clients=MAX_CONCURRENCY, controller=controller, archive=archive, replay=replay) as session:
+        crawler = new_crawler(session, spool, executor, backend, checkpoint)
+        crawler.add_listing(url)
+        await crawler.run()
+        session.stats.log(url)
+        controller.log(url)
+        log_failed_pages(crawler)
+    if crawler.empty_listings:
         raise AssertionError("No listings found on the first page. Check if the page structure has changed or if the URL is correct.")
-    
-    logger.info(f"Initial page fetched. Extracted {len(df)} listings from the first page.")
-    urls = get_urls_list(html_content, url)
-    
-    # Fetch all pages concurrently
-    results = await fetch_all_pages(urls)
-    
-    # Combine all dataframes
-    df_total = df.copy()
-    for result_df, _ in results[1:]:
-        if result_df is not None:
-            df_total = pd.concat([df_total, result_df], ignore_index=True)
-    
-    return df_total
+    return spool.rows_spooled - rows_before
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Crawl batdongsan.com.vn project listings.")
     parser.add_argument("--url", default=URL, help="Project listing URL to crawl. Default: %(default)s")
-    return parser.parse_args()
+    parser.add_argument(
+        "--parse-executor", choices=PARSE_EXECUTORS, default=PARSE_EXECUTOR,
+        help="Where HTML parsing runs: 'process' (pool sized to the cores), 'thread', "
+             "or 'inline' on the event loop. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Resume a crashed run of the same job from its checkpoint under SPOOL_DIR, "
+             "refetching only the pages whose rows weren't spooled yet.",
+    )
+    parser.add_argument(
+        "--parser-backend", choices=PARSER_BACKENDS, default=PARSER_BACKEND,
+        help="HTML parser: 'bs4' (BeautifulSoup + html.parser) or 'lxml' (same rows, "
+             "several times faster). Default: %(default)s",
+    )
+    parser.add_argument(
+        "--archive", action="store_true",
+        help="Also keep every fetched page, zstd-compressed, in the page archive under "
+             "ARCHIVE_DIR/<table> for offline re-parsing (src/_web2br/reparse_archive.py).",
+    )
+    parser.add_argument(
+        "--output", default=None, metavar="CSV",
+        help="Also write the scraped rows to this CSV. Default: none (a --replay run keeps "
+             "its spool instead and logs where it is).",
+    )
+    parser.add_argument(
+        "--replay", default=None, metavar="DIR",
+        help="Serve every request from the page archive at DIR instead of the network "
+             "(REPLAY_* env vars add latency, jitter and errors; src/utils/replay_session.py). "
+             "Rows go to the spool/--output only, nothing is uploaded.",
+    )
+    parser.add_argument(
+        "--stream", choices=["bigquery", "local"], default=None,
+        help="Stream rows to bronze in micro-batches while crawling (STREAM_FLUSH_ROWS / "
+             "STREAM_FLUSH_SECONDS; src/utils/bronze_stream.py) instead of one upload at the end. "
+             "'local' writes the stream under STREAM_LOCAL_DIR instead of BigQuery.",
+    )
+    args = parser.parse_args()
+    if args.stream == "bigquery" and args.replay is not None:
+        parser.error("--replay uploads nothing; use --stream local to try streaming offline")
+    return args
 
 if __name__ == "__main__":
     args = parse_args()
-    bq_client = get_bigquery_client()
-    df_final = asyncio.run(main(url=args.url))
-    upload_df_to_bigquery(bq_client, df_final, f"{bq_client.project}.re_bronze.projects", write_disposition="WRITE_APPEND")
+    bq_client = get_bigquery_client() if args.replay is None else None
+    # One spool/checkpoint directory per job (not per run) so --resume can find it.
+    job = f"{BRONZE_TABLE}-{args.url.rstrip('/').rsplit('/', 1)[-1]}"
+    spool, checkpoint = open_checkpointed_spool(os.path.join(SPOOL_DIR, job), resume=args.resume)
+    archive = PageArchive(os.path.join(ARCHIVE, BRONZE_TABLE)) if args.archive else None
+    stream = None
+    if args.stream:
+        project = bq_client.project if bq_client is not None else "local"
+        stream = open_bronze_stream(args.stream, f"{project}.re_bronze.{BRONZE_TABLE}", spool, client=bq_client)
+    with parse_executor(args.parse_executor) as executor:
+        asyncio.run(main(url=args.url, spool=spool, executor=executor, backend=args.parser_backend, checkpoint=checkpoint, archive=archive, replay=args.replay))
+    # Part by part, so only one spool part is in memory at a time. Each load is recorded
+    # in the checkpoint: --resume after a failed upload doesn't load a part twice.
+    upload = stream is None and args.replay is None
+    table_id = f"{bq_client.project}.re_bronze.{BRONZE_TABLE}" if upload else None
+    rows_scraped = 0
+    for seq, (path, part) in enumerate(spool.iter_parts()):
+        rows_scraped += part.num_rows
+        if args.output:
+            part.to_pandas().to_csv(args.output, index=False, mode="w" if seq == 0 else "a", header=seq == 0)
+        if upload:
+            if table_id in checkpoint.uploaded_targets(path.name):
+                logger.info("%s was uploaded before the run was resumed, skipped", path.name)
+                continue
+            with METRICS.timer("upload"):
+                load_arrow_to_bigquery(bq_client, part, table_id, write_disposition="WRITE_APPEND")
+            checkpoint.record_upload(path.name, table_id)
+            METRICS.count("rows_uploaded", part.num_rows)
+    logger.info("Spooled %d rows. Peak memory: %.0f MB", rows_scraped, peak_rss_mb())
+    if stream is not None:
+        # Every row is already in bronze or sent now; no end-of-run upload.
+        stream.close(spool)
+        if args.replay is None:
+            METRICS.count("rows_uploaded", stream.rows_streamed)
+    elif args.replay is not None:
+        logger.info("Replay run: nothing uploaded.")
+    if archive is not None:
+        logger.info("Archived %d pages (%.1f MB compressed)", archive.pages_written, archive.bytes_written / 1e6)
+        archive.close()
+    write_run_metrics(job, logger)
+    checkpoint.close()
+    if args.replay is not None and not args.output:
+        logger.info("Replay rows kept in %s (%d Parquet parts)", spool.spool_dir, len(spool.part_paths()))
+    else:
+        spool.cleanup()
 
 
@@ -1,22 +1,36 @@
 import argparse
 import asyncio
-from curl_cffi import requests
-from curl_cffi.requests import AsyncSession
-from bs4 import BeautifulSoup
+from collections import Counter
 import pandas as pd
 import os
 import re
-import json
 import unicodedata
-
-from src.utils.gcp_conn import get_bigquery_client, query_to_df, upload_df_to_bigquery
-from src.utils.common_tools import setup_logging
+from functools import partial
+
+from src.utils.gcp_conn import get_bigquery_client, load_arrow_to_bigquery, query_to_df
+from src.utils.common_tools import peak_rss_mb, setup_logging
+from src.utils.crawl_engine import AIMDController, ListingCrawler
+from src.utils.http_session import blocking_get, new_session
+from src.utils.html_backend import PARSER_BACKENDS, find_all_by_class, find_first_by_class, parse_html, text_of
+from src.utils.parse_executor import PARSE_EXECUTORS, parse_executor, run_parse
+from src.utils.crawl_checkpoint import open_checkpointed_spool
+from src.utils.bronze_stream import open_bronze_stream
+from src.utils.page_archive import ARCHIVE_DIR, PageArchive
+from src.utils.district_slugs import DISTRICT_SLUGS_PATH, DistrictSlugTable
+from src.utils.stage_metrics import METRICS, write_run_metrics
+from src.utils.seen_index import CONTENT_FIELDS, SEEN_FIELDS, SeenIndex, fingerprint
+from src.utils.tracking_data import iter_tracking_records
 logger = setup_logging()
 
 
+# Requests in flight to start from; an AIMDController moves it between 1 and
+# ADAPTIVE_MAX_CONCURRENCY with how the site answers (429/403/5xx halve it).
 MAX_CONCURRENCY = 5
-BATCH_SIZE = 100
-BATCH_DELAY_SECONDS = 10
+ADAPTIVE_MAX_CONCURRENCY = int(os.getenv("ADAPTIVE_MAX_CONCURRENCY", 16))
+# Politeness budget, formerly "100 pages then sleep 10s": with 5 workers at ~1s per
+# page a 100-page batch took ~20s, i.e. ~100 pages / 30s -- kept as a steady rate so
+# the crawl no longer idles between batches.
+REQUESTS_PER_SECOND = float(os.getenv("REQUESTS_PER_SECOND", 3))
 CATEGORY_URL = os.getenv("CATEGORY_URL", "https://batdongsan.com.vn/ban-can-ho-chung-cu")
 # URL = os.getenv("URL", "https://batdongsan.com.vn/ban-can-ho-chung-cu-trellia-cove")
 # URL = os.getenv("URL", "https://batdongsan.com.vn/ban-can-ho-chung-cu-mizuki-park")
@@ -24,37 +38,31 @@ CATEGORY_URL = os.getenv("CATEGORY_URL", "https://batdongsan.com.vn/ban-can-ho-c
 URL = os.getenv("URL", f"{CATEGORY_URL}-tp-ho-chi-minh")
 # URL = os.getenv("URL", "")
 # URL = os.getenv("URL", f"{CATEGORY_URL}-ha-noi")
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "process")  # "process" | "thread" | "inline"
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "bs4")  # "bs4" | "lxml"
+SPOOL_DIR = os.getenv("SPOOL_DIR", "data/spool")
+ARCHIVE = os.getenv("ARCHIVE_DIR", ARCHIVE_DIR)  # raw pages, with --archive
+STATE_DIR = os.getenv("STATE_DIR", "data/state")  # state kept across runs (seen-listing index)
+DISTRICT_SLUGS = os.getenv("DISTRICT_SLUGS_PATH", DISTRICT_SLUGS_PATH)
 CRAWL_MODE = os.getenv("CRAWL_MODE", "city")  # "city" | "district"
 CITY_CODE = os.getenv("CITY_CODE", "SG")
+BRONZE_TABLE = "real_estate"
 
 
 def custom_request(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-    }
-    response = requests.get(url, headers=headers, impersonate="chrome124")
+    response = blocking_get(url)
     return response
 
-def extract_page_tracking_data(html_content):
-    for script in html_content.find_all('script'):
-        if script.string and 'window.pageTrackingData' in script.string:
-            script_content = script.string
-            
-            # Extract JSON from JSON.parse() call
-            pattern = r"JSON\.parse\('({.*?})'\)"
-            match = re.search(pattern, script_content, re.DOTALL)
-            
-            if match:
-                json_str = match.group(1)
-                # Handle escaped quotes and special characters
-                json_str = json_str.replace("\\'", "'").replace('\\"', '"')
-                data = json.loads(json_str)
-                data = pd.json_normalize(data['products'])
-                return data
-    logger.warning("No tracking data found in the page.")
-    return None
+def extract_page_tracking_data(content: bytes, encoding: str = "utf-8"):
+    """
+    Flat tracking records (one per product) from the page's window.pageTrackingData,
+    read straight from the raw response bytes -- no DOM needed (see
+    src/utils/tracking_data.py).
+    """
+    records = list(iter_tracking_records(content, encoding))
+    if not records:
+        logger.warning("No tracking data found in the page.")
+    return records
 
 def soup_to_df(html_soup):
     # Find all listing cards
@@ -122,29 +130,117 @@ def soup_to_df(html_soup):
             # "images": images
         })
 
-    logger.info(f"Extracted {len(results)} listings from the page")
+    logger.info("Extracted %d listings from the page", len(results))
     return pd.DataFrame(results)
 
-def merge_listing_with_tracking_data(df, tracking_data):
-    """Merge listing cards with tracking metadata by product id."""
-    if df is None or df.empty:
-        return pd.DataFrame()
+# (key, tag, class_) of every field soup_to_df looks up in a card, collected by
+# lxml_to_df in a single pass. The product link (id + href) is looked up once.
+CARD_FIELDS = [
+    ("link", "a", "js__product-link-for-product-id"),
+    ("title", "span", "pr-title js__card-title"),
+    ("verify", "span", "re__card-image-verified"),
+    ("price", "span", "re__card-config-price"),
+    ("area", "span", "re__card-config-area"),
+    ("price_per_m2", "span", "re__card-config-price_per_m2"),
+    ("bedroom", "span", "re__card-config-bedroom"),
+    ("toilet", "span", "re__card-config-toilet"),
+    ("location", "div", "re__card-location"),
+    ("description", "div", "re__card-description"),
+    ("agent_name", "div", "agent-name"),
+    ("phone", "span", "js__card-phone-btn"),
+]
+
+def lxml_to_df(html_tree):
+    """
+    lxml fast path for soup_to_df (parser backend "lxml"): produces the same rows,
+    but walks each card once instead of calling find() per field.
+    """
+    def text(tag):
+        return text_of(tag).strip() if tag is not None else None
+
+    def inner_span_text(tag):
+        span = tag.find(".//span") if tag is not None else None
+        return text(span)
 
-    if tracking_data is None or tracking_data.empty:
-        logger.warning("Tracking data is empty for this page. Returning listing data only.")
-        return df.copy()
+    results = []
+    for card in find_all_by_class(html_tree, "div", "js__card-full-web"):
+        tags = find_first_by_class(card, CARD_FIELDS, skip=("div", "js__card-full-web"))
+        link_tag = tags.get("link")
+        phone_tag = tags.get("phone")
+        results.append({
+            "product_id": link_tag.attrib['data-product-id'],
+            "title": text(tags.get("title")),
+            "verify": "verify" in tags,
+            "link": link_tag.get("href"),
+            "price": text(tags.get("price")),
+            "area": text(tags.get("area")),
+            "price_per_m2": text(tags.get("price_per_m2")),
+            "bedrooms": inner_span_text(tags.get("bedroom")),
+            "toilets": inner_span_text(tags.get("toilet")),
+            "location": inner_span_text(tags.get("location")),
+            "description": text(tags.get("description")),
+            "agent_name": text(tags.get("agent_name")),
+            "phone": text(phone_tag.findall(".//span")[-1]) if phone_tag is not None else None,
+        })
+
+    logger.info("Extracted %d listings from the page", len(results))
+    return pd.DataFrame(results)
 
-    tracking_data = tracking_data.copy()
-    tracking_data['productId'] = tracking_data['productId'].astype(str)
-    return pd.merge(df, tracking_data, how='left', left_on='product_id', right_on='productId')
+def merge_listing_with_tracking_data(rows, tracking_records):
+    """
+    Merge listing card rows with tracking metadata by product id. Row-record
+    equivalent of pd.merge(how='left', left_on='product_id', right_on='productId'):
+    every listing row is kept (tracking columns None when unmatched), clashing column
+    names get pandas' _x/_y suffixes.
+    """
+    if not rows:
+        return []
 
-def get_urls_list(html_content, base_url):
+    if not tracking_records:
+        logger.warning("Tracking data is empty for this page. Returning listing data only.")
+        return list(rows)
+
+    tracking_columns = {}
+    tracking_by_id = {}
+    for record in tracking_records:
+        record = {**record, "productId": str(record.get("productId"))}
+        tracking_columns.update(dict.fromkeys(record))
+        tracking_by_id.setdefault(record["productId"], []).append(record)
+
+    overlap = set(rows[0]) & set(tracking_columns)
+    left_names = {col: f"{col}_x" if col in overlap else col for col in rows[0]}
+    right_names = {col: f"{col}_y" if col in overlap else col for col in tracking_columns}
+    empty_match = [dict.fromkeys(tracking_columns)]
+
+    merged = []
+    for row in rows:
+        left = {left_names[col]: value for col, value in row.items()}
+        for match in tracking_by_id.get(str(row["product_id"]), empty_match):
+            merged.append({**left, **{right_names[col]: match.get(col) for col in tracking_columns}})
+    return merged
+
+def get_page_count(html_content):
     """Extract total number of pages from HTML content."""
-    page_num_list = html_content.find_all("a", class_="re__pagination-number")
-    page_num = max([int(i.text.strip()) for i in page_num_list]) if page_num_list else 1
-    urls = [f"{base_url}/p{i}" for i in range(1, page_num + 1)]
-    logger.info(f"Total pages to fetch: {page_num}")
-    return urls
+    page_num_list = find_all_by_class(html_content, "a", "re__pagination-number")
+    return max([int(text_of(i).strip()) for i in page_num_list]) if page_num_list else 1
+
+def parse_page(content: bytes, encoding: str = "utf-8", backend: str = "bs4"):
+    """
+    Parse one raw listing page into (row records, total page count). Bytes in,
+    plain records out, and module-level so it can run on a process-pool parse
+    worker (see src/utils/parse_executor.py). Every record gets its row_hash
+    content fingerprint here, while values still have their scraped types.
+    """
+    with METRICS.timer("html_parse"):
+        html_content = parse_html(content, encoding, backend)
+        df = soup_to_df(html_content) if backend == "bs4" else lxml_to_df(html_content)
+    with METRICS.timer("tracking"):
+        tracking_records = extract_page_tracking_data(content, encoding)
+    with METRICS.timer("merge"):
+        records = merge_listing_with_tracking_data(df.to_dict("records"), tracking_records)
+    for record in records:
+        record["row_hash"] = fingerprint(record, CONTENT_FIELDS)
+    return records, get_page_count(html_content)
 
 def slugify_district(name: str) -> str:
     """
@@ -163,7 +259,11 @@ def slugify_district(name: str) -> str:
     ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
     return re.sub(r"[^a-zA-Z0-9]+", "-", ascii_name).strip("-").lower()
 
-async def resolve_district_url(session, district_row, category_url=CATEGORY_URL):
+def district_url(district_row, category_url=CATEGORY_URL) -> str:
+    """Listing URL of one district row, derived from its name (see slugify_district)."""
+    return f"{category_url}-{slugify_district(district_row['name'])}"
+
+async def resolve_district_url(session, district_row, slug_table=None, category_url=CATEGORY_URL):
     """
     Build and validate the listing URL for one district row (districtId, name,
     cityCode, prefix). Crawling at district-level URL (instead of city-level)
@@ -171,106 +271,99 @@ async def resolve_district_url(session, district_row, category_url=CATEGORY_URL)
     return real districtId/wardId values instead of a forced-new-address,
     districtId=0 response (only reproducible at city-level URLs).
 
-    Returns the validated URL, or None if the derived slug doesn't resolve
+    Returns the probe response, or None if the derived slug doesn't resolve
     cleanly (redirects to a generic catch-all page, e.g. /nha-dat-ban) so the
     caller can skip it instead of silently crawling the wrong data.
+
+    The probe is a full GET of the district's first listing page, so a clean
+    response doubles as page 1. Definite outcomes (200, 404) are recorded in
+    `slug_table`; transient failures are not, so they get probed again next run.
     """
     slug = slugify_district(district_row["name"])
-    url = f"{category_url}-{slug}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-    }
+    url = district_url(district_row, category_url)
     try:
-        response = await session.get(url, headers=headers, impersonate="chrome124")
+        response = await session.get(url)
     except Exception as e:
-        logger.warning(f"District '{district_row['name']}' (id={district_row['districtId']}) slug '{slug}' failed: {e}")
+        logger.warning("District '%s' (id=%s) slug '%s' failed: %s", district_row["name"], district_row["districtId"], slug, e)
         return None
 
-    if response.status_code != 200 or str(response.url) != url:
+    resolved = response.status_code == 200 and str(response.url) == url
+    if slug_table is not None and response.status_code in (200, 404):
+        slug_table.record(url, district_row["districtId"], str(response.url), response.status_code, resolved)
+    if not resolved:
         logger.warning(
-            f"District '{district_row['name']}' (id={district_row['districtId']}) slug '{slug}' "
-            f"did not resolve cleanly (status={response.status_code}, final_url={response.url}). Skipping."
+            "District '%s' (id=%s) slug '%s' did not resolve cleanly (status=%s, final_url=%s). Skipping.",
+            district_row["name"], district_row["districtId"], slug, response.status_code, response.url,
         )
         return None
-    return url
-
-async def fetch_and_parse(url, session, semaphore):
-    """Fetch HTML content from URL and parse it into a DataFrame."""
-    async with semaphore:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-        }
-
-        try:
-            # The 'impersonate' argument is the magic part—it mimics Chrome's TLS fingerprint
-            response = await session.get(url, headers=headers, impersonate="chrome124")
-
-            if response.status_code == 200:
-                logger.info(f"Success! Data received from {url}")
-                html_content = BeautifulSoup(response.text, 'html.parser')
-            else:
-                logger.error(f"Failed with status code: {response.status_code} for {url}")
-                return None, None
-                
-            df = soup_to_df(html_content)
-            tracking_data = extract_page_tracking_data(html_content)
-            df_combined = merge_listing_with_tracking_data(df, tracking_data)
-            return df_combined, html_content
-        except Exception as e:
-            logger.error(f"Error fetching {url}: {e}")
+    return response
+
+async def parse_response(url, response, executor=None, backend=PARSER_BACKEND):
+    """Parse a fetched listing page (on `executor`, if given) into (row records, page count)."""
+    try:
+        return await run_parse(executor, parse_page, response.content, response.encoding, backend)
+    except Exception as e:
+        logger.error("Error parsing %s: %s", url, e, extra={"url": url})
+        return None, None
+
+async def fetch_and_parse(url, session, executor=None, backend=PARSER_BACKEND):
+    """Fetch HTML content from URL and parse it (on `executor`, if given) into (row records, page count)."""
+    try:
+        # Headers and the chrome124 impersonation are session defaults (src/utils/http_session.py)
+        response = await session.get(url)
+
+        if response.status_code == 200:
+            logger.info("Success! Data received from %s", url, extra={"url": url, "status": response.status_code})
+        else:
+            logger.error("Failed with status code: %s for %s", response.status_code, url, extra={"url": url, "status": response.status_code})
             return None, None
 
-async def fetch_all_pages(urls: list, batch_size: int = BATCH_SIZE, batch_delay_seconds: int = BATCH_DELAY_SECONDS):
-    """Fetch pages in bounded batches with a pause between batches."""
-    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
-    all_results = []
-    
-    async with AsyncSession() as session:
-        for start_index in range(0, len(urls), batch_size):
-            batch_number = (start_index // batch_size) + 1
-            batch_urls = urls[start_index:start_index + batch_size]
-            tasks = [fetch_and_parse(page_url, session, semaphore) for page_url in batch_urls]
-            batch_results = await asyncio.gather(*tasks)
-            all_results.extend(batch_results)
-
-            has_more_batches = start_index + batch_size < len(urls)
-            if has_more_batches:
-                logger.info(
-                    f"Completed batch {batch_number} ({len(batch_urls)} pages). "
-                    f"Sleeping {batch_delay_seconds}s before the next batch."
-                )
-                await asyncio.sleep(batch_delay_seconds)
-    
-    return all_results
-
-async def main(url=URL):
-    # Fetch first page to get total pages
-    semaphore = asyncio.Semaphore(1)
-    async with AsyncSession() as session:
-        df_combined_first, html_content = await fetch_and_parse(url, session, semaphore)
-    if df_combined_first is None or len(df_combined_first) == 0:
-        logger.error(f"No listings found on the first page. HTML content:\n{html_content}")
+        return await parse_response(url, response, executor, backend)
+    except Exception as e:
+        logger.error("Error fetching %s: %s", url, e, extra={"url": url})
+        return None, None
+
+def new_controller() -> AIMDController:
+    """Adaptive in-flight limit for one run's session, starting at MAX_CONCURRENCY."""
+    return AIMDController(initial=MAX_CONCURRENCY, max_concurrency=ADAPTIVE_MAX_CONCURRENCY)
+
+def log_failed_pages(crawler):
+    for page_url in crawler.failed_pages:
+        logger.error("Page still failing after retries, its rows are missing from this run: %s", page_url, extra={"url": page_url})
+
+def new_crawler(session, spool, executor=None, backend=PARSER_BACKEND, checkpoint=None, seen_index=None):
+    """
+    ListingCrawler fetching and parsing this scraper's pages over one shared session.
+    With a `seen_index` (incremental mode) a listing stops paginating at its first
+    page of already-known listings.
+    """
+    return ListingCrawler(
+        lambda page_url: fetch_and_parse(page_url, session, executor, backend),
+        spool, checkpoint=checkpoint,
+        concurrency=ADAPTIVE_MAX_CONCURRENCY, requests_per_second=REQUESTS_PER_SECOND,
+        stop_page=seen_index.is_known_page if seen_index is not None else None,
+    )
+
+async def main(spool, url=URL, executor=None, backend=PARSER_BACKEND, checkpoint=None, seen_index=None, archive=None, replay=None):
+    """
+    Crawl every page of one listing URL into `spool`. Returns the number of rows
+    spooled. With a `checkpoint`, pages already done in a previous (crashed) run are
+    skipped; with a `seen_index`, pages past the first already-known one are.
+    """
+    rows_before = spool.rows_spooled
+    controller = new_controller()
+    async with new_session(max_clients=MAX_CONCURRENCY, controller=controller, archive=archive, replay=replay) as session:
+        crawler = new_crawler(session, spool, executor, backend, checkpoint, seen_index)
+        crawler.add_listing(url)
+        await crawler.run()
+        session.stats.log(url)
+        controller.log(url)
+        log_failed_pages(crawler)
+    if crawler.empty_listings:
         raise AssertionError("No listings found on the first page. Check if the page structure has changed or if the URL is correct.")
-    
-    logger.info(f"Initial page fetched. Extracted {len(df_combined_first)} listings from the first page.")
-    urls = get_urls_list(html_content, url)
-    
-     # Fetch all pages concurrently
-    results = await fetch_all_pages(urls)
-    
-    # Combine all dataframes (listing + tracking metadata)
-    df_total = df_combined_first.copy()
-    for result_df, _ in results[1:]:
-        if result_df is not None:
-            df_total = pd.concat([df_total, result_df], ignore_index=True)
-    
-    return df_total
-
-async def crawl_city_by_district(city_code: str, category_url: str = CATEGORY_URL) -> pd.DataFrame:
+    return spool.rows_spooled - rows_before
+
+async def crawl_city_by_district(city_code: str, spool, category_url: str = CATEGORY_URL, executor=None, backend=PARSER_BACKEND, checkpoint=None, seen_index=None, archive=None, replay=None) -> int:
     """
     Crawl every district of a city individually instead of the single
     city-level aggregate URL. batdongsan.com.vn forces IsDisplayNewAddress=true
@@ -280,35 +373,59 @@ async def crawl_city_by_district(city_code: str, category_url: str = CATEGORY_UR
 
     Districts come from re_bronze.m_districts, filtered by cityCode. Districts
     whose derived slug doesn't resolve to a clean district page are skipped
-    (logged as a warning) rather than silently mixing in wrong data.
+    (logged as a warning) rather than silently mixing in wrong data. Rows go to
+    `spool`, tagged with crawled_district_id; returns the number of rows spooled.
+
+    Districts are resolved and crawled concurrently on one ListingCrawler -- one
+    session, one concurrency/rate budget for the whole city -- so a small
+    district's last pages overlap the next district's first page. Slugs verified
+    recently (DistrictSlugTable) aren't probed again, and a probe's response is
+    used as the district's page 1.
     """
     bq_client = get_bigquery_client()
     districts = query_to_df(
         bq_client, "SELECT * FROM re_bronze.m_districts WHERE cityCode = @city_code",
         params={"city_code": city_code},
     )
-    logger.info(f"Found {len(districts)} districts for cityCode={city_code}")
-
-    all_dfs = []
-    async with AsyncSession() as session:
+    logger.info("Found %d districts for cityCode=%s", len(districts), city_code)
+
+    rows_before = spool.rows_spooled
+    slug_table = DistrictSlugTable(DISTRICT_SLUGS)
+    controller = new_controller()
+    async with new_session(max_clients=MAX_CONCURRENCY, controller=controller, archive=archive, replay=replay) as session:
+        crawler = new_crawler(session, spool, executor, backend, checkpoint, seen_index)
+
+        async def probe_district(district_row):
+            response = await resolve_district_url(session, district_row, slug_table, category_url=category_url)
+            if response is None:
+                return
+            url = str(response.url)
+            logger.info("Crawling district '%s' (id=%s) at %s", district_row["name"], district_row["districtId"], url)
+            first_page = await parse_response(url, response, executor, backend)
+            crawler.add_listing(url, columns={"crawled_district_id": district_row["districtId"]}, first_page=first_page)
+
+        probes = 0
         for _, district_row in districts.iterrows():
-            url = await resolve_district_url(session, district_row, category_url=category_url)
-            if url is None:
-                continue
-
-            logger.info(f"Crawling district '{district_row['name']}' (id={district_row['districtId']}) at {url}")
-            try:
-                df_district = await main(url=url)
-            except AssertionError as e:
-                logger.warning(f"Skipping district '{district_row['name']}': {e}")
-                continue
-
-            df_district["crawled_district_id"] = district_row["districtId"]
-            all_dfs.append(df_district)
-
-    if not all_dfs:
-        return pd.DataFrame()
-    return pd.concat(all_dfs, ignore_index=True)
+            url = district_url(district_row, category_url)
+            resolved = slug_table.lookup(url)
+            if resolved is None:
+                crawler.add_request(partial(probe_district, district_row))
+                probes += 1
+            elif resolved:
+                logger.info("Crawling district '%s' (id=%s) at %s (slug verified earlier)", district_row["name"], district_row["districtId"], url)
+                crawler.add_listing(url, columns={"crawled_district_id": district_row["districtId"]})
+            else:
+                logger.warning("District '%s' (id=%s) slug did not resolve cleanly when last verified. Skipping.", district_row["name"], district_row["districtId"])
+        logger.info("%d district slugs reused from the slug table, %d to probe", len(districts) - probes, probes)
+        await crawler.run()
+        session.stats.log(f"cityCode={city_code}")
+        controller.log(f"cityCode={city_code}")
+        log_failed_pages(crawler)
+    slug_table.close()
+
+    for url in crawler.empty_listings:
+        logger.warning("Skipped district at %s: no listings found on the first page.", url)
+    return spool.rows_spooled - rows_before
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Crawl batdongsan.com.vn real estate listings.")
@@ -327,23 +444,140 @@ def parse_args():
     parser.add_argument("--url", default=None, help="City-level URL to crawl (mode=city). Default: <category-url>-tp-ho-chi-minh")
     parser.add_argument("--city-code", default=CITY_CODE, help="City code, e.g. SG, HN (mode=district). Default: %(default)s")
     parser.add_argument("--output", default="data/real_estate_listings.csv", help="CSV output path. Default: %(default)s")
-    return parser.parse_args()
+    parser.add_argument(
+        "--parse-executor", choices=PARSE_EXECUTORS, default=PARSE_EXECUTOR,
+        help="Where HTML parsing runs: 'process' (pool sized to the cores), 'thread', "
+             "or 'inline' on the event loop. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Resume a crashed run of the same job from its checkpoint under SPOOL_DIR, "
+             "refetching only the pages whose rows weren't spooled yet.",
+    )
+    parser.add_argument(
+        "--parser-backend", choices=PARSER_BACKENDS, default=PARSER_BACKEND,
+        help="HTML parser: 'bs4' (BeautifulSoup + html.parser) or 'lxml' (same rows, "
+             "several times faster). Default: %(default)s",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Stop paginating a listing at its first page of mostly already-uploaded, "
+             "unchanged listings (pages are newest-first), using the seen-listing index "
+             "under STATE_DIR.",
+    )
+    parser.add_argument(
+        "--changed-only", action="store_true",
+        help="Append only new or changed rows (by row_hash, against the seen-listing index) "
+             "to bronze; every scraped product_id goes to the compact <table>_heartbeat table.",
+    )
+    parser.add_argument(
+        "--archive", action="store_true",
+        help="Also keep every fetched page, zstd-compressed, in the page archive under "
+             "ARCHIVE_DIR/<table> for offline re-parsing (src/_web2br/reparse_archive.py).",
+    )
+    parser.add_argument(
+        "--replay", default=None, metavar="DIR",
+        help="Serve every request from the page archive at DIR instead of the network "
+             "(REPLAY_* env vars add latency, jitter and errors; src/utils/replay_session.py). "
+             "Rows go to the spool/--output only, nothing is uploaded.",
+    )
+    parser.add_argument(
+        "--stream", choices=["bigquery", "local"], default=None,
+        help="Stream rows to bronze in micro-batches while crawling (STREAM_FLUSH_ROWS / "
+             "STREAM_FLUSH_SECONDS; src/utils/bronze_stream.py) instead of one upload at the end. "
+             "Only the table's declared columns (src/utils/bronze_schemas.py) are streamed; undeclared "
+             "tracking fields are dropped and logged. "
+             "'local' writes the stream under STREAM_LOCAL_DIR instead of BigQuery.",
+    )
+    args = parser.parse_args()
+    if args.stream and args.changed_only:
+        parser.error("--stream appends every scraped row; it can't be combined with --changed-only")
+    if args.stream == "bigquery" and args.replay is not None:
+        parser.error("--replay uploads nothing; use --stream local to try streaming offline")
+    return args
 
 if __name__ == "__main__":
     args = parse_args()
     if args.url is None:
         args.url = f"{args.category_url}-tp-ho-chi-minh"
-    bq_client = get_bigquery_client()
+    bq_client = get_bigquery_client() if args.replay is None else None
+    # One spool/checkpoint directory per job (not per run) so --resume can find it.
     if args.mode == "district":
-        df_final = asyncio.run(crawl_city_by_district(args.city_code, category_url=args.category_url))
+        job = f"{BRONZE_TABLE}-{args.category_url.rstrip('/').rsplit('/', 1)[-1]}-{args.city_code}"
     else:
-        df_final = asyncio.run(main(url=args.url))
-    df_final.to_csv(args.output, index=False)
-    df_final["scraped_at"] = pd.Timestamp.now("UTC")
-    df_final["date_scraped"] = df_final["scraped_at"].dt.date
-    upload_df_to_bigquery(
-        bq_client, df_final, f"{bq_client.project}.re_bronze.real_estate",
-        write_disposition="WRITE_APPEND", allow_field_addition=True,
+        job = f"{BRONZE_TABLE}-{args.url.rstrip('/').rsplit('/', 1)[-1]}"
+    spool, checkpoint = open_checkpointed_spool(os.path.join(SPOOL_DIR, job), resume=args.resume)
+    # Shared by every job writing this bronze table; full runs keep it fresh too.
+    seen = SeenIndex(os.path.join(STATE_DIR, f"seen-{BRONZE_TABLE}.sqlite"))
+    seen_index = seen if args.incremental else None
+    archive = PageArchive(os.path.join(ARCHIVE, BRONZE_TABLE)) if args.archive else None
+    stream = None
+    if args.stream:
+        project = bq_client.project if bq_client is not None else "local"
+        stream = open_bronze_stream(args.stream, f"{project}.re_bronze.{BRONZE_TABLE}", spool, client=bq_client)
+    with parse_executor(args.parse_executor) as executor:
+        if args.mode == "district":
+            asyncio.run(crawl_city_by_district(args.city_code, spool, category_url=args.category_url, executor=executor, backend=args.parser_backend, checkpoint=checkpoint, seen_index=seen_index, archive=archive, replay=args.replay))
+        else:
+            asyncio.run(main(url=args.url, spool=spool, executor=executor, backend=args.parser_backend, checkpoint=checkpoint, seen_index=seen_index, archive=archive, replay=args.replay))
+    if stream is not None:
+        # Every row is in bronze once the stream is closed; no end-of-run upload.
+        stream.close(spool)
+        if args.replay is None:
+            METRICS.count("rows_uploaded", stream.rows_streamed)
+    # Part by part, so only one spool part is in memory at a time. A part's listings go
+    # into the seen index as soon as the part is in bronze, and each load is recorded in
+    # the checkpoint: --resume after a failed upload doesn't load a part twice.
+    upload = stream is None and args.replay is None
+    table_id = f"{bq_client.project}.re_bronze.{BRONZE_TABLE}" if upload else None
+    targets = {table_id, f"{table_id}_heartbeat"} if args.changed_only else {table_id}
+    scraped_at = pd.Timestamp.now("UTC")
+    row_counts, rows_scraped, rows_emitted = Counter(), 0, 0
+    for seq, (path, part) in enumerate(spool.iter_parts()):
+        df_part = part.to_pandas()
+        df_part.to_csv(args.output, index=False, mode="w" if seq == 0 else "a", header=seq == 0)
+        rows_scraped += len(df_part)
+        uploaded = checkpoint.uploaded_targets(path.name) if upload else set()
+        if upload and targets <= uploaded:
+            logger.info("%s was uploaded before the run was resumed, skipped", path.name)
+            continue
+        df_part["scraped_at"] = scraped_at
+        df_part["date_scraped"] = scraped_at.date()
+        part_seen = df_part[["product_id", "row_hash", *SEEN_FIELDS]].to_dict("records")
+        emit_mask, part_counts = seen.classify_rows(part_seen)
+        df_emit = df_part[emit_mask] if args.changed_only else df_part
+        row_counts += part_counts
+        rows_emitted += len(df_emit)
+        if upload:
+            with METRICS.timer("upload"):
+                if table_id not in uploaded:
+                    if not df_emit.empty:
+                        load_arrow_to_bigquery(bq_client, df_emit, table_id, write_disposition="WRITE_APPEND", allow_field_addition=True)
+                    checkpoint.record_upload(path.name, table_id)
+                if args.changed_only and f"{table_id}_heartbeat" not in uploaded:
+                    # Unchanged listings aren't re-appended; record that they're still listed.
+                    load_arrow_to_bigquery(
+                        bq_client, df_part[["product_id", "row_hash", "scraped_at", "date_scraped"]], f"{table_id}_heartbeat",
+                        write_disposition="WRITE_APPEND", allow_field_addition=True,
+                    )
+                    checkpoint.record_upload(path.name, f"{table_id}_heartbeat")
+            METRICS.count("rows_uploaded", len(df_emit))
+        if args.replay is None:
+            seen.update(part_seen)
+    if rows_scraped == 0:
+        pd.DataFrame().to_csv(args.output, index=False)
+    logger.info(
+        "Rows scraped: %d, emitted: %d (new %d, changed %d, unchanged %d). Peak memory: %.0f MB",
+        rows_scraped, rows_emitted, row_counts["new"], row_counts["changed"], row_counts["unchanged"], peak_rss_mb(),
     )
+    if args.replay is not None:
+        logger.info("Replay run: nothing uploaded, seen-listing index left as it was.")
+    seen.close()
+    if archive is not None:
+        logger.info("Archived %d pages (%.1f MB compressed)", archive.pages_written, archive.bytes_written / 1e6)
+        archive.close()
+    write_run_metrics(job, logger)
+    checkpoint.close()
+    spool.cleanup()
 
 
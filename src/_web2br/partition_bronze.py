@@ -0,0 +1,75 @@
+"""
+One-off migration of the append-only bronze tables to their partitioned + clustered
+layout (src/utils/bronze_schemas.py BRONZE_PARTITIONING).
+
+Tables created by the loader since then are partitioned from the start, but BigQuery
+can't add partitioning to an existing table. For each table that isn't partitioned yet
+this copies it into <table>__partitioned (CREATE TABLE ... PARTITION BY ... CLUSTER BY
+... AS SELECT *), then renames the original to <table>_unpartitioned and the copy into
+its place. Rows from before date_scraped existed land in the NULL partition. The old
+table is kept; drop it once the incremental dbt models have run against the new one.
+
+Don't run it while a scraper is uploading: the two renames aren't atomic.
+
+    python -m src._web2br.partition_bronze --dry-run
+    python -m src._web2br.partition_bronze --tables real_estate real_estate_rent
+"""
+import argparse
+
+from google.api_core.exceptions import NotFound
+
+from src.utils.bronze_schemas import BRONZE_DATASET, BRONZE_PARTITIONING
+from src.utils.common_tools import setup_logging
+from src.utils.gcp_conn import execute_query, get_bigquery_client
+
+logger = setup_logging()
+
+
+def migration_sql(project: str, table: str) -> str:
+    field, clustering = BRONZE_PARTITIONING[table]
+    dataset = f"`{project}.{BRONZE_DATASET}"
+    return f"""
+        CREATE TABLE {dataset}.{table}__partitioned`
+        PARTITION BY {field}
+        CLUSTER BY {", ".join(clustering)}
+        AS SELECT * FROM {dataset}.{table}`;
+        ALTER TABLE {dataset}.{table}` RENAME TO {table}_unpartitioned;
+        ALTER TABLE {dataset}.{table}__partitioned` RENAME TO {table};
+    """
+
+
+def partition_table(bq_client, table: str, dry_run: bool = False) -> bool:
+    """Migrate one table; False if there was nothing to do."""
+    table_id = f"{bq_client.project}.{BRONZE_DATASET}.{table}"
+    field, _ = BRONZE_PARTITIONING[table]
+    try:
+        current = bq_client.get_table(table_id)
+    except NotFound:
+        logger.info("Skipping %s: doesn't exist yet (the loader creates it partitioned)", table_id)
+        return False
+    if current.time_partitioning is not None and current.time_partitioning.field == field:
+        logger.info("Skipping %s: already partitioned by %s", table_id, field)
+        return False
+
+    sql = migration_sql(bq_client.project, table)
+    if dry_run:
+        logger.info("Would run for %s:%s", table_id, sql)
+        return True
+    execute_query(bq_client, sql)
+    logger.info("Partitioned %s by %s; the original is kept as %s_unpartitioned", table_id, field, table)
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migrate append-only bronze tables to their partitioned + clustered layout.")
+    parser.add_argument("--tables", nargs="+", choices=sorted(BRONZE_PARTITIONING), default=sorted(BRONZE_PARTITIONING),
+                        help="Tables to migrate. Default: all of them.")
+    parser.add_argument("--dry-run", action="store_true", help="Only log the SQL that would run.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    bq_client = get_bigquery_client()
+    for table in args.tables:
+        partition_table(bq_client, table, dry_run=args.dry_run)
@@ -0,0 +1,153 @@
+"""
+Rebuild bronze-shaped rows from the page archive, without the network.
+
+Scrapers run with --archive keep every fetched page (src/utils/page_archive.py). When
+the site's card markup changes or a field is added to a scraper's parse_page, this
+re-parses the archived pages instead of re-scraping: one archive segment per worker
+process, each writing its rows as one Parquet part under --output. Rows carry what the
+scraper's upload would have added -- scraped_at (from the page's fetch time),
+date_scraped and, for district-mode pages, crawled_district_id (from the district slug
+table) -- so the parts have the shape of re_bronze.<table>.
+
+    python -m src._web2br.reparse_archive --table real_estate --since 2026-10-01 --parser-backend lxml
+"""
+import argparse
+import importlib
+import os
+import re
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.utils.gcp_conn import get_bigquery_client, load_arrow_to_bigquery
+from src.utils.bronze_schemas import bronze_schema
+from src.utils.common_tools import setup_logging
+from src.utils.district_slugs import DISTRICT_SLUGS_PATH
+from src.utils.page_archive import ARCHIVE_DIR, PageArchive, iter_segment
+logger = setup_logging()
+
+# Bronze table -> scraper module whose parse_page produced its rows.
+SCRAPERS = {
+    "real_estate": "src._web2br.j_real_estate",
+    "real_estate_rent": "src._web2br.j_real_estate_rent",
+    "projects": "src._web2br.j_projects",
+}
+PAGE_SUFFIX = re.compile(r"/p\d+$")
+
+
+def district_ids_by_url(slug_path) -> dict:
+    """Listing URL (derived and final) -> district id, from the district slug table."""
+    if not Path(slug_path).exists():
+        return {}
+    conn = sqlite3.connect(slug_path)
+    ids = {}
+    for url, final_url, district_id in conn.execute(
+        "SELECT url, final_url, district_id FROM district_slugs WHERE resolved = 1"
+    ):
+        ids[url] = district_id
+        if final_url:
+            ids[final_url] = district_id
+    conn.close()
+    return ids
+
+
+def reparse_segment(segment_path, part_path, table: str, backend: str, since: float | None, district_ids: dict) -> dict:
+    """Parse every archived 200 page of one segment into a Parquet part. Runs on a worker process."""
+    parse_page = importlib.import_module(SCRAPERS[table]).parse_page
+    rows = []
+    stats = {"pages": 0, "skipped": 0, "failed": 0, "rows": 0}
+    for page in iter_segment(segment_path):
+        if page.status_code != 200 or (since is not None and page.fetched_at < since):
+            stats["skipped"] += 1
+            continue
+        try:
+            records, _ = parse_page(page.content, page.encoding or "utf-8", backend)
+        except Exception as e:
+            logger.error("Error parsing archived %s: %s", page.requested_url, e)
+            stats["failed"] += 1
+            continue
+        scraped_at = datetime.fromtimestamp(page.fetched_at, timezone.utc)
+        district_id = district_ids.get(PAGE_SUFFIX.sub("", page.requested_url))
+        for record in records:
+            record["scraped_at"] = scraped_at
+            if district_id is not None:
+                record["crawled_district_id"] = district_id
+        rows.extend(records)
+        stats["pages"] += 1
+    if rows:
+        df = pd.DataFrame(rows)
+        df["date_scraped"] = df["scraped_at"].dt.date
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), part_path, compression="zstd")
+        stats["rows"] = len(df)
+    return stats
+
+
+def reparse_archive(table: str, archive_dir, output_dir, backend: str = "lxml", since: float | None = None,
+                    slug_path=DISTRICT_SLUGS_PATH, max_workers: int | None = None) -> dict:
+    """Re-parse every segment of `archive_dir` in parallel into Parquet parts under `output_dir`."""
+    archive = PageArchive(archive_dir)
+    segments = archive.segment_paths()
+    archive.close()
+    output_dir = Path(output_dir)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    output_dir.mkdir(parents=True)
+    district_ids = district_ids_by_url(slug_path)
+
+    totals = {"pages": 0, "skipped": 0, "failed": 0, "rows": 0}
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        futures = [
+            pool.submit(reparse_segment, segment, output_dir / f"part-{i:05d}.parquet", table, backend, since, district_ids)
+            for i, segment in enumerate(segments)
+        ]
+        for future in as_completed(futures):
+            for key, value in future.result().items():
+                totals[key] += value
+    logger.info(
+        "Re-parsed %d archived pages from %d segments into %d rows (%d pages skipped, %d failed to parse)",
+        totals["pages"], len(segments), totals["rows"], totals["skipped"], totals["failed"],
+    )
+    return totals
+
+
+def read_parts(output_dir) -> pd.DataFrame:
+    tables = [pq.read_table(path) for path in sorted(Path(output_dir).glob("part-*.parquet"))]
+    return pa.concat_tables(tables, promote_options="permissive").to_pandas() if tables else pd.DataFrame()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Re-parse archived pages into bronze-shaped rows, offline.")
+    parser.add_argument("--table", choices=sorted(SCRAPERS), required=True, help="Bronze table whose scraper's parse_page to use.")
+    parser.add_argument("--archive-dir", default=None, help="Page archive to read. Default: ARCHIVE_DIR/<table>")
+    parser.add_argument("--output", default=None, help="Directory for the Parquet parts. Default: data/reparsed/<table>")
+    parser.add_argument("--since", default=None, help="Only pages fetched on or after this date (YYYY-MM-DD, UTC).")
+    parser.add_argument("--parser-backend", choices=["bs4", "lxml"], default="lxml", help="Default: %(default)s")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes. Default: one per core.")
+    parser.add_argument(
+        "--upload", action="store_true",
+        help="Upload the rows to re_bronze.<table>_reparsed (replacing it), next to -- not into -- the live table.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    archive_dir = args.archive_dir or os.path.join(os.getenv("ARCHIVE_DIR", ARCHIVE_DIR), args.table)
+    output_dir = args.output or os.path.join("data/reparsed", args.table)
+    since = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() if args.since else None
+    reparse_archive(
+        args.table, archive_dir, output_dir, backend=args.parser_backend, since=since,
+        slug_path=os.getenv("DISTRICT_SLUGS_PATH", DISTRICT_SLUGS_PATH), max_workers=args.workers,
+    )
+    if args.upload:
+        bq_client = get_bigquery_client()
+        # The spooled parts go up as they are, typed by the live table's declared schema.
+        load_arrow_to_bigquery(
+            bq_client, sorted(Path(output_dir).glob("part-*.parquet")), f"{bq_client.project}.re_bronze.{args.table}_reparsed",
+            schema=bronze_schema(args.table), write_disposition="WRITE_TRUNCATE",
+        )
@@ -6,8 +6,39 @@ the pipeline across two machines/schedulers).
 
     python -m src.orchestrator.run_pipeline
 
-Steps run strictly in order and the pipeline stops at the first failure -- dbt models
-depend on bronze data existing, and dbt test depends on dbt run having completed.
+Steps form a dependency graph rather than a fixed sequence: the scrapes are
+independent of each other and run in parallel (at most --max-parallel subprocesses at
+once), dbt run waits for every scrape -- dbt models depend on bronze data existing --
+and dbt test waits for dbt run.
+Steps hitting the same host share a concurrency group: at most HOST_GROUPS[group]
+steps of a group run at once, and they draw from one requests/sec budget for the host
+-- a token file per group (RATE_LIMIT_FILE, see SharedTokenBucket in
+src/utils/crawl_engine.py) -- so running scrapes side by side never hits
+batdongsan.com.vn harder than one scrape at a time used to, and a step left running
+alone gets the whole budget rather than a fixed share.
+
+Running the scrapes in parallel therefore doesn't make the batdongsan.com.vn part
+faster than the budget allows: when the shared limit binds (the usual case), the scrape
+phase takes about (total requests of every batdongsan.com.vn step) / budget, e.g.
+requests / 3 seconds, however many steps run at once. What parallelism saves is the
+time a step would otherwise leave the budget idle -- parsing, uploading, other hosts,
+a step starting while another finishes -- so the total is about that plus dbt, not the
+longest scrape plus dbt.
+
+The pipeline is still fail-fast: after the first failure no new step is started (steps
+already running are left to finish -- their bronze upload is independent and valid),
+everything downstream is skipped, and the exit code is 1. A per-step timing summary is
+logged at the end either way.
+
+Each scraper step writes a per-stage metrics summary (src/utils/stage_metrics.py) to
+data/metrics/pipeline-<time>/<step>.json; at the end they are merged into pipeline.json
+there (plus Prometheus text files with --metrics-prometheus) and logged.
+
+Every step gets the pipeline's correlation id (RUN_ID) and its own name
+(PIPELINE_STEP) in its environment, so with LOG_FORMAT=json (src/utils/log_setup.py)
+all log lines of one pipeline run carry the same run_id and their step. In that mode
+the steps write straight to the pipeline's stdout/stderr instead of being piped
+through and re-logged line by line here.
 
 dbt run/test are scoped to `stg_real_estate+`/`stg_real_estate_rent+` on purpose:
 stg_locations_v1/v2 and stg_projects are built from near-static reference data
@@ -25,11 +56,21 @@ re_bronze.real_estate_rent) and built through separate silver/gold models -- ren
 prices are monthly rates, not comparable to sale prices, so they never share a table or
 a price bound/bin with the sale lineage. See dbt/models/staging/stg_real_estate_rent.sql.
 """
+import argparse
+import json
+import os
 import subprocess
 import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
+from typing import NamedTuple
 
 from src.utils.common_tools import setup_logging
+from src.utils.log_setup import LOG_FORMAT, run_id
+from src.utils.stage_metrics import METRICS_DIR, log_summary, merge_summaries, write_summary
 
 logger = setup_logging()
 
@@ -47,27 +88,98 @@ HN_RENT_URL = "https://batdongsan.com.vn/cho-thue-can-ho-chung-cu-ha-noi"
 
 DBT_SELECT = ["stg_real_estate+", "stg_real_estate_rent+"]
 
+MAX_PARALLEL = int(os.getenv("PIPELINE_MAX_PARALLEL", 4))
+
+# Concurrency group -> (max steps of the group running at once, requests/sec budget
+# shared by them through the group's token file). The budget is the single-scraper
+# default (REQUESTS_PER_SECOND in j_real_estate.py), so the host sees the same total
+# rate however many steps run.
+HOST_GROUPS = {
+    "batdongsan.com.vn": (3, float(os.getenv("REQUESTS_PER_SECOND", 3))),
+}
+BATDONGSAN = "batdongsan.com.vn"
+
+
+class Step(NamedTuple):
+    name: str
+    cmd: list[str]
+    needs: tuple[str, ...] = ()
+    group: str | None = None
+
+
+SCRAPE_STEPS = [
+    Step("scrape_real_estate_hcm", [sys.executable, "-m", "src._web2br.j_real_estate", "--mode", "district"], group=BATDONGSAN),
+    Step("scrape_real_estate_hn", [sys.executable, "-m", "src._web2br.j_real_estate", "--url", HN_REAL_ESTATE_URL], group=BATDONGSAN),
+    Step("scrape_real_estate_rent_hcm", [sys.executable, "-m", "src._web2br.j_real_estate_rent", "--mode", "district"], group=BATDONGSAN),
+    Step("scrape_real_estate_rent_hn", [sys.executable, "-m", "src._web2br.j_real_estate_rent", "--url", HN_RENT_URL], group=BATDONGSAN),
+    Step("scrape_projects_hcm", [sys.executable, "-m", "src._web2br.j_projects"], group=BATDONGSAN),
+    Step("scrape_projects_hn", [sys.executable, "-m", "src._web2br.j_projects", "--url", HN_PROJECTS_URL], group=BATDONGSAN),
+    Step("scrape_metadata", [sys.executable, "-m", "src._web2br.j_metadata"], group=BATDONGSAN),
+]
 STEPS = [
-    ("scrape_real_estate_hcm", [sys.executable, "-m", "src._web2br.j_real_estate", "--mode", "district"]),
-    ("scrape_real_estate_hn", [sys.executable, "-m", "src._web2br.j_real_estate", "--url", HN_REAL_ESTATE_URL]),
-    ("scrape_real_estate_rent_hcm", [sys.executable, "-m", "src._web2br.j_real_estate_rent", "--mode", "district"]),
-    ("scrape_real_estate_rent_hn", [sys.executable, "-m", "src._web2br.j_real_estate_rent", "--url", HN_RENT_URL]),
-    ("scrape_projects_hcm", [sys.executable, "-m", "src._web2br.j_projects"]),
-    ("scrape_projects_hn", [sys.executable, "-m", "src._web2br.j_projects", "--url", HN_PROJECTS_URL]),
-    ("scrape_metadata", [sys.executable, "-m", "src._web2br.j_metadata"]),
-    ("dbt_run", ["dbt", "run", *DBT_FLAGS, "--select", *DBT_SELECT]),
-    ("dbt_test", ["dbt", "test", *DBT_FLAGS, "--select", *DBT_SELECT]),
+    *SCRAPE_STEPS,
+    Step("dbt_run", ["dbt", "run", *DBT_FLAGS, "--select", *DBT_SELECT], needs=tuple(step.name for step in SCRAPE_STEPS)),
+    Step("dbt_test", ["dbt", "test", *DBT_FLAGS, "--select", *DBT_SELECT], needs=("dbt_run",)),
 ]
 
 
-def run_step(name: str, cmd: list[str]) -> bool:
-    logger.info(f"=== Start: {name} ({' '.join(cmd)}) ===")
-    process = subprocess.Popen(
-        cmd, cwd=PROJECT_ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-        text=True, bufsize=1,
-    )
-    for line in process.stdout:
-        logger.info(f"[{name}] {line.rstrip()}")
+def validate_steps(steps: list[Step]):
+    """Raise ValueError on duplicate names, unknown dependencies, unknown groups or cycles."""
+    names = [step.name for step in steps]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Duplicate step names in {names}")
+    for step in steps:
+        unknown = set(step.needs) - set(names)
+        if unknown:
+            raise ValueError(f"Step {step.name} needs unknown steps {sorted(unknown)}")
+        if step.group is not None and step.group not in HOST_GROUPS:
+            raise ValueError(f"Step {step.name} has unknown concurrency group {step.group}")
+    # Kahn's algorithm: whatever can't be ordered sits on a cycle.
+    needs = {step.name: set(step.needs) for step in steps}
+    ordered = set()
+    while True:
+        ready = {name for name, deps in needs.items() if name not in ordered and deps <= ordered}
+        if not ready:
+            break
+        ordered |= ready
+    if len(ordered) != len(steps):
+        raise ValueError(f"Dependency cycle between steps {sorted(set(names) - ordered)}")
+
+
+def step_env(step: Step, metrics_dir: Path | None = None, prometheus: bool = False, rate_dir: Path | None = None) -> dict:
+    """
+    Child environment: the pipeline's correlation id and the step's name, its group's
+    requests/sec budget and the group's token file under `rate_dir`, if it has a group,
+    and where to write its metrics summary, if `metrics_dir` is given. Without a
+    `rate_dir` the step gets a fixed 1/max-running share of the budget instead.
+    """
+    env = {"RUN_ID": run_id(), "PIPELINE_STEP": step.name}
+    if step.group is not None:
+        max_running, requests_per_second = HOST_GROUPS[step.group]
+        if rate_dir is not None:
+            env["REQUESTS_PER_SECOND"] = str(requests_per_second)
+            env["RATE_LIMIT_FILE"] = str(rate_dir / f"{step.group}.json")
+        else:
+            env["REQUESTS_PER_SECOND"] = str(requests_per_second / max_running)
+    if metrics_dir is not None:
+        env["METRICS_FILE"] = str(metrics_dir / f"{step.name}.json")
+        if prometheus:
+            env["METRICS_PROMETHEUS_FILE"] = str(metrics_dir / f"{step.name}.prom")
+    return {**os.environ, **env}
+
+
+def run_step(name: str, cmd: list[str], env: dict | None = None) -> bool:
+    logger.info("=== Start: %s (%s) ===", name, " ".join(cmd))
+    if LOG_FORMAT == "json":
+        # Child lines are already JSON tagged with run_id/step: let them through untouched.
+        process = subprocess.Popen(cmd, cwd=PROJECT_ROOT, env=env)
+    else:
+        process = subprocess.Popen(
+            cmd, cwd=PROJECT_ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, bufsize=1, env=env,
+        )
+        for line in process.stdout:
+            logger.info("[%s] %s", name, line.rstrip())
     process.wait()
 
     if process.returncode != 0:
@@ -77,11 +189,120 @@ def run_step(name: str, cmd: list[str]) -> bool:
     return True
 
 
+def run_steps(steps: list[Step], max_parallel: int = MAX_PARALLEL, metrics_dir: Path | None = None,
+              prometheus: bool = False) -> dict[str, dict]:
+    """
+    Run steps as a dependency graph on up to max_parallel threads (one subprocess
+    each), honouring HOST_GROUPS limits. Returns {name: {"status", "started", "seconds"}}
+    with status "ok", "failed" or "skipped"; "started" is seconds since the pipeline
+    started. After the first failure nothing new is started.
+    """
+    validate_steps(steps)
+    pending = list(steps)
+    results = {}
+    running = {}  # future -> Step
+    pipeline_started = time.monotonic()
+    failed = False
+
+    def run_timed(step: Step) -> tuple[bool, float, float]:
+        started = time.monotonic()
+        ok = run_step(step.name, step.cmd, step_env(step, metrics_dir, prometheus, Path(rate_dir)))
+        return ok, started - pipeline_started, time.monotonic() - started
+
+    def can_start(step: Step) -> bool:
+        if any(results.get(dep, {}).get("status") != "ok" for dep in step.needs):
+            return False
+        if step.group is None:
+            return True
+        group_running = sum(1 for running_step in running.values() if running_step.group == step.group)
+        return group_running < HOST_GROUPS[step.group][0]
+
+    # The groups' shared token files live for this run only.
+    with tempfile.TemporaryDirectory(prefix="pipeline-rate-") as rate_dir, ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while pending or running:
+            # Start everything that's ready, in STEPS order, up to the parallelism cap.
+            for step in list(pending):
+                if failed or len(running) >= max_parallel:
+                    break
+                if can_start(step):
+                    pending.remove(step)
+                    running[executor.submit(run_timed, step)] = step
+            if not running:
+                break  # Nothing running and nothing startable: the rest is skipped.
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                ok, started, seconds = future.result()
+                results[step.name] = {"status": "ok" if ok else "failed", "started": started, "seconds": seconds}
+                if not ok and not failed:
+                    failed = True
+                    logger.error(f"Pipeline stopping after step: {step.name} (waiting for {len(running)} running step(s))")
+
+    for step in pending:
+        results[step.name] = {"status": "skipped", "started": None, "seconds": 0.0}
+    return results
+
+
+def log_timing_summary(steps: list[Step], results: dict[str, dict], total_seconds: float):
+    logger.info("=== Step timings ===")
+    for step in steps:
+        result = results[step.name]
+        started = f"+{result['started']:.0f}s" if result["started"] is not None else "-"
+        logger.info(f"{step.name:<30} {result['status']:<8} start {started:>7}  took {result['seconds']:>7.1f}s")
+    logger.info(f"Total pipeline time: {total_seconds:.1f}s")
+
+
+def aggregate_metrics(steps: list[Step], metrics_dir: Path, prometheus: bool = False) -> dict | None:
+    """Merge the metrics summaries the steps wrote into metrics_dir/pipeline.json, and log them."""
+    summaries = {}
+    for step in steps:
+        path = metrics_dir / f"{step.name}.json"
+        if path.exists():
+            summaries[step.name] = json.loads(path.read_text())
+    if not summaries:
+        return None
+    logger.info("=== Step metrics ===")
+    for name, summary in summaries.items():
+        counters = summary["counters"]
+        logger.info(
+            f"{name:<30} pages {counters.get('pages_fetched', 0):>6}  rows out {counters.get('rows_out', 0):>7}  "
+            f"{counters.get('bytes_in', 0) / 1e6:>7.1f} MB in  retries {counters.get('retries', 0):>4}"
+        )
+    pipeline = merge_summaries(list(summaries.values()), run="pipeline")
+    pipeline["steps"] = summaries
+    log_summary(logger, pipeline)
+    write_summary(pipeline, metrics_dir / "pipeline.json", metrics_dir / "pipeline.prom" if prometheus else None)
+    logger.info(f"Pipeline metrics written to {metrics_dir / 'pipeline.json'}")
+    return pipeline
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the scrape -> dbt pipeline.")
+    parser.add_argument(
+        "--max-parallel", type=int, default=MAX_PARALLEL,
+        help="Maximum number of steps (subprocesses) running at once. 1 runs steps one after another.",
+    )
+    parser.add_argument(
+        "--metrics-prometheus", action="store_true",
+        help="Also write the steps' and the pipeline's metrics in Prometheus text format (<name>.prom).",
+    )
+    return parser.parse_args()
+
+
 def main() -> int:
-    for name, cmd in STEPS:
-        if not run_step(name, cmd):
-            logger.error(f"Pipeline stopped at step: {name}")
-            return 1
+    args = parse_args()
+    started = time.monotonic()
+    logger.info("Pipeline run id: %s", run_id())
+    metrics_dir = PROJECT_ROOT / METRICS_DIR / f"pipeline-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}"
+    results = run_steps(STEPS, max_parallel=args.max_parallel, metrics_dir=metrics_dir, prometheus=args.metrics_prometheus)
+    log_timing_summary(STEPS, results, time.monotonic() - started)
+    aggregate_metrics(STEPS, metrics_dir, prometheus=args.metrics_prometheus)
+
+    failed = [name for name, result in results.items() if result["status"] == "failed"]
+    if failed:
+        logger.error(f"Pipeline failed at step(s): {', '.join(failed)}")
+        return 1
     logger.info("Pipeline completed successfully")
     return 0
 
@@ -0,0 +1,165 @@
+"""
+Declared Arrow schemas of the re_bronze tables, for the Parquet loader in gcp_conn.py.
+
+Uploads used to hand a DataFrame to load_table_from_dataframe and let pandas/BigQuery
+infer every column's type, so a column's type depended on the batch: an id that was
+None on every row of a run came out FLOAT or NULL, and a list column broke the Arrow
+conversion outright (see additional_info in j_projects.py). Declaring the columns we
+know fixes their types for every load, whatever the batch looks like.
+
+A schema only covers the known columns. Scraped tables also carry whatever tracking
+fields the site sends (pageTrackingData varies), and those keep their inferred types
+and are added to the table as they appear (ALLOW_FIELD_ADDITION). Declared columns a
+batch doesn't have are added as all-null, so every load of a table has the same shape.
+The declared types must match the live table's columns: a load whose Parquet type
+doesn't fit the existing column is rejected by BigQuery.
+"""
+import pyarrow as pa
+import pyarrow.compute as pc
+
+BRONZE_DATASET = "re_bronze"
+SCRAPED_AT = [
+    pa.field("scraped_at", pa.timestamp("us", tz="UTC")),
+    pa.field("date_scraped", pa.date32()),
+]
+
+# Listing card columns (soup_to_df/lxml_to_df), every pageTrackingData field the dbt
+# staging models read (tests/test_bronze_stream.py keeps this list complete; streaming
+# drops undeclared columns), and crawled_district_id (the district a row was crawled
+# under). Shared by sale and rental listings.
+LISTING_SCHEMA = pa.schema([
+    pa.field("product_id", pa.string()),
+    pa.field("title", pa.string()),
+    pa.field("verify", pa.bool_()),
+    pa.field("link", pa.string()),
+    pa.field("price", pa.string()),
+    pa.field("area", pa.string()),
+    pa.field("price_per_m2", pa.string()),
+    pa.field("bedrooms", pa.string()),
+    pa.field("toilets", pa.string()),
+    pa.field("location", pa.string()),
+    pa.field("description", pa.string()),
+    pa.field("agent_name", pa.string()),
+    pa.field("phone", pa.string()),
+    pa.field("productId", pa.int64()),
+    pa.field("projectId", pa.int64()),
+    pa.field("vipType", pa.int64()),
+    pa.field("verified", pa.bool_()),
+    pa.field("expired", pa.bool_()),
+    pa.field("cateId", pa.int64()),
+    pa.field("cityCode", pa.string()),
+    pa.field("districtId", pa.int64()),
+    pa.field("wardId", pa.int64()),
+    pa.field("streetId", pa.int64()),
+    pa.field("pageId", pa.int64()),
+    pa.field("intent", pa.int64()),
+    pa.field("pageType", pa.int64()),
+    pa.field("productType", pa.int64()),
+    pa.field("IsDisplayNewAddress", pa.bool_()),
+    pa.field("createByUser", pa.int64()),
+    pa.field("row_hash", pa.string()),
+    pa.field("crawled_district_id", pa.int64()),
+    *SCRAPED_AT,
+])
+
+HEARTBEAT_SCHEMA = pa.schema([
+    pa.field("product_id", pa.string()),
+    pa.field("row_hash", pa.string()),
+    *SCRAPED_AT,
+])
+
+PROJECTS_SCHEMA = pa.schema([
+    pa.field("title", pa.string()),
+    pa.field("additional_info", pa.string()),  # JSON-encoded list of card configs
+    pa.field("location", pa.string()),
+    pa.field("description", pa.string()),
+    pa.field("link", pa.string()),
+    pa.field("id", pa.string()),
+])
+
+BRONZE_SCHEMAS = {
+    "real_estate": LISTING_SCHEMA,
+    "real_estate_rent": LISTING_SCHEMA,
+    "real_estate_heartbeat": HEARTBEAT_SCHEMA,
+    "real_estate_rent_heartbeat": HEARTBEAT_SCHEMA,
+    "projects": PROJECTS_SCHEMA,
+    # Lookup tables from j_metadata.py: only the keys and names the staging models use.
+    "m_cities_v2": pa.schema([
+        pa.field("code", pa.string()),
+        pa.field("name", pa.string()),
+        pa.field("prefix", pa.string()),
+    ]),
+    "m_wards_v2": pa.schema([
+        pa.field("wardId", pa.int64()),
+        pa.field("name", pa.string()),
+        pa.field("prefix", pa.string()),
+        pa.field("cityCode", pa.string()),
+    ]),
+    "m_streets_v2": pa.schema([
+        pa.field("streetId", pa.int64()),
+        pa.field("name", pa.string()),
+        pa.field("wardId", pa.int64()),
+    ]),
+    "m_projects_v2": pa.schema([
+        pa.field("projectId", pa.int64()),
+        pa.field("name", pa.string()),
+        pa.field("wardId", pa.int64()),
+    ]),
+}
+
+# Append-only scraped tables: (DAY partition column, clustering columns). Weekly runs
+# only read the newest partitions (incremental stg models), and a listing's history sits
+# in a few clustered blocks per partition.
+BRONZE_PARTITIONING = {
+    "real_estate": ("date_scraped", ["cityCode", "product_id"]),
+    "real_estate_rent": ("date_scraped", ["cityCode", "product_id"]),
+    "real_estate_heartbeat": ("date_scraped", ["product_id"]),
+    "real_estate_rent_heartbeat": ("date_scraped", ["product_id"]),
+}
+
+
+def bronze_table_name(table_id: str) -> str | None:
+    """Table name of a re_bronze table id ("project.re_bronze.table", "re_bronze.table" or bare name); None for other datasets."""
+    parts = table_id.split(".")
+    if len(parts) > 1 and parts[-2] != BRONZE_DATASET:
+        return None
+    return parts[-1]
+
+
+def bronze_schema(table_id: str) -> pa.Schema | None:
+    """Declared schema for a re_bronze table id; None if undeclared."""
+    return BRONZE_SCHEMAS.get(bronze_table_name(table_id))
+
+
+def bronze_partitioning(table_id: str) -> tuple[str, list[str]] | None:
+    return BRONZE_PARTITIONING.get(bronze_table_name(table_id))
+
+
+def conform_table(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """
+    `table` with the declared columns first, cast to their declared types (missing ones
+    all-null), followed by its undeclared columns as they are. Raises ValueError naming
+    the column when a value doesn't fit its declared type.
+    """
+    columns, fields = [], []
+    for field in schema:
+        if field.name in table.column_names:
+            column = table.column(field.name)
+            if column.type != field.type:
+                try:
+                    # Timestamps may drop sub-microsecond digits; every other cast must be lossless.
+                    column = pc.cast(column, field.type, safe=not pa.types.is_timestamp(field.type))
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                    raise ValueError(f"Column {field.name!r} ({column.type}) doesn't fit its declared type {field.type}: {e}") from e
+        else:
+            column = pa.nulls(len(table), field.type)
+        columns.append(column)
+        fields.append(field)
+    for name in table.column_names:
+        if name not in schema.names:
+            column = table.column(name)
+            if pa.types.is_null(column.type):
+                column = column.cast(pa.string())  # all-null in this batch; Parquet/BigQuery need a real type
+            columns.append(column)
+            fields.append(pa.field(name, column.type))
+    return pa.Table.from_arrays(columns, schema=pa.schema(fields))
@@ -0,0 +1,342 @@
+"""
+Streaming micro-batch writes to bronze while a crawl runs.
+
+The scrapers upload once, at the end of __main__: a two-hour crawl shows no bronze
+rows until it finishes, and the final upload is the run's memory and latency peak. With
+--stream, a BronzeStreamWriter hangs off the crawl's RowSpool instead: the spool flushes
+every STREAM_FLUSH_ROWS rows or STREAM_FLUSH_SECONDS seconds, and each part file, once
+the crawl checkpoint has committed it, is appended to an append stream on the bronze
+table. Appends run on one background thread fed from a queue, so a slow RPC or a
+retry's backoff never blocks the crawl's event loop.
+
+Exactly once: the spool's committed parts are an ordered, append-only log, so a part's
+offset -- the rows of all parts before it -- never changes, not even across --resume.
+Every append carries that offset, and the sink refuses an offset that is already
+written (OffsetAlreadyWritten). A retried append whose first attempt did land, or a
+resumed run re-sending the parts after the last acknowledged one, is skipped there
+instead of duplicating rows. The stream name, the rows acknowledged so far and the
+run's scraped_at are kept in stream.json in the spool directory for that.
+
+Sinks:
+    BigQueryWriteSink  a COMMITTED-type stream of the BigQuery Storage Write API (rows
+                       are queryable as soon as they're acknowledged); needs
+                       google-cloud-bigquery-storage (requirements.txt) with Arrow
+                       appends, and says so when it isn't installed.
+    LocalStreamSink    one Parquet file per append under a directory, with the same
+                       offset checks -- for tests and benchmarks.
+
+Streamed rows carry only the table's declared columns (src/utils/bronze_schemas.py):
+an append stream can't add columns to the table the way a load job does. Every column
+the dbt staging models read is declared (tests/test_bronze_stream.py checks it); other
+undeclared columns -- tracking fields the site added that nobody declared yet -- are
+dropped from the stream, with a warning naming them the first time each shows up;
+declare a column in bronze_schemas.py to stream it.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.utils.bronze_schemas import bronze_schema, conform_table
+from src.utils.common_tools import setup_logging
+from src.utils.stage_metrics import METRICS, percentile
+logger = setup_logging()
+
+STREAM_FLUSH_ROWS = int(os.getenv("STREAM_FLUSH_ROWS", 2000))
+STREAM_FLUSH_SECONDS = float(os.getenv("STREAM_FLUSH_SECONDS", 30))
+STREAM_LOCAL_DIR = os.getenv("STREAM_LOCAL_DIR", "data/stream")
+STREAM_MAX_ATTEMPTS = 5
+STREAM_RETRY_BACKOFF = 1.0
+STREAM_STATE_FILE = "stream.json"
+
+
+class OffsetAlreadyWritten(Exception):
+    """The sink already holds rows at this offset: the append is a duplicate."""
+
+
+class OffsetOutOfRange(Exception):
+    """The offset is past the end of the stream: rows before it are missing."""
+
+
+class LocalStreamSink:
+    """Append stream as a directory of offset-named Parquet files."""
+
+    def __init__(self, root_dir, table_id: str):
+        self.table_dir = Path(root_dir) / table_id.rsplit(".", 1)[-1]
+        self.stream_dir = None
+
+    def open(self, stream: str | None = None) -> str:
+        """Reopen `stream`, or create a new one; returns its name."""
+        stream = stream or f"stream-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self.stream_dir = self.table_dir / stream
+        self.stream_dir.mkdir(parents=True, exist_ok=True)
+        return stream
+
+    def rows_written(self) -> int:
+        return sum(pq.ParquetFile(path).metadata.num_rows for path in self.stream_dir.glob("rows-*.parquet"))
+
+    def append(self, table: pa.Table, offset: int):
+        end = self.rows_written()
+        if offset < end:
+            raise OffsetAlreadyWritten(f"offset {offset} < {end} rows written")
+        if offset > end:
+            raise OffsetOutOfRange(f"offset {offset} > {end} rows written")
+        path = self.stream_dir / f"rows-{offset:012d}.parquet"
+        tmp_path = path.with_suffix(".parquet.tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        tmp_path.replace(path)
+
+    def finalize(self):
+        pass
+
+
+class BigQueryWriteSink:
+    """COMMITTED-type append stream of the BigQuery Storage Write API, appending Arrow record batches."""
+
+    def __init__(self, table_id: str, client=None, types=None):
+        if client is None or types is None:
+            try:
+                from google.cloud import bigquery_storage_v1
+                from google.cloud.bigquery_storage_v1 import types as storage_types
+            except ImportError as e:
+                raise RuntimeError(
+                    "--stream bigquery needs google-cloud-bigquery-storage: pip install -r requirements.txt"
+                ) from e
+            client = client or bigquery_storage_v1.BigQueryWriteClient()
+            types = types or storage_types
+        self.types = types
+        self.client = client
+        project, dataset, table = table_id.split(".")
+        self.parent = self.client.table_path(project, dataset, table)
+        self.stream = None
+
+    def open(self, stream: str | None = None) -> str:
+        if stream is None:
+            write_stream = self.types.WriteStream(type_=self.types.WriteStream.Type.COMMITTED)
+            stream = self.client.create_write_stream(parent=self.parent, write_stream=write_stream).name
+        self.stream = stream
+        return stream
+
+    def append(self, table: pa.Table, offset: int):
+        from google.api_core import exceptions
+        batch = table.combine_chunks().to_batches()[0]
+        request = self.types.AppendRowsRequest(
+            write_stream=self.stream, offset=offset,
+            arrow_rows=self.types.AppendRowsRequest.ArrowData(
+                writer_schema=self.types.ArrowSchema(serialized_schema=table.schema.serialize().to_pybytes()),
+                rows=self.types.ArrowRecordBatch(serialized_record_batch=batch.serialize().to_pybytes()),
+            ),
+        )
+        try:
+            for response in self.client.append_rows(iter([request])):
+                if response.error.code == 6:  # ALREADY_EXISTS
+                    raise OffsetAlreadyWritten(response.error.message)
+                if response.error.code == 11:  # OUT_OF_RANGE
+                    raise OffsetOutOfRange(response.error.message)
+                if response.error.code:
+                    raise RuntimeError(f"Append at offset {offset} failed: {response.error.message}")
+                break
+        except exceptions.AlreadyExists as e:
+            raise OffsetAlreadyWritten(str(e)) from e
+        except exceptions.OutOfRange as e:
+            raise OffsetOutOfRange(str(e)) from e
+
+    def finalize(self):
+        self.client.finalize_write_stream(name=self.stream)
+
+
+def open_stream_sink(kind: str, table_id: str):
+    return BigQueryWriteSink(table_id) if kind == "bigquery" else LocalStreamSink(STREAM_LOCAL_DIR, table_id)
+
+
+class BronzeStreamWriter:
+
+    def __init__(self, sink, table_id: str, state_dir, schema: pa.Schema | None = None,
+                 max_attempts: int = STREAM_MAX_ATTEMPTS, retry_backoff: float = STREAM_RETRY_BACKOFF):
+        self.sink = sink
+        self.table_id = table_id
+        self.schema = schema if schema is not None else bronze_schema(table_id)
+        if self.schema is None:
+            raise ValueError(f"No declared schema for {table_id}; streaming needs one")
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.state_path = Path(state_dir) / STREAM_STATE_FILE
+        state = json.loads(self.state_path.read_text()) if self.state_path.exists() else {}
+        self.stream = sink.open(state.get("stream"))
+        self.rows_acked = state.get("rows_acked", 0)
+        self.scraped_at = datetime.fromisoformat(state["scraped_at"]) if "scraped_at" in state else datetime.now(timezone.utc)
+        self._save_state()
+        self._part_rows = {}
+        self._flushed_at = {}  # part name -> time.monotonic() its oldest row entered the spool
+        self.rows_streamed = 0
+        self.duplicates = 0
+        self.dropped_columns = set()
+        self._parts = []  # part paths the checkpoint has committed, in spool order
+        self._pending = queue.Queue()
+        self._thread = None
+        self.freshness = []
+        self.started = time.monotonic()
+        self.streaming_seconds = 0.0
+
+    def _save_state(self):
+        self.state_path.write_text(json.dumps({
+            "stream": self.stream, "rows_acked": self.rows_acked, "scraped_at": self.scraped_at.isoformat(),
+        }))
+
+    def attach(self, spool, flush_rows: int = STREAM_FLUSH_ROWS, flush_seconds: float = STREAM_FLUSH_SECONDS):
+        """
+        Make `spool` flush in micro-batches and, after its existing on_flush hook (the
+        checkpoint's commit), hand each part to the background thread that streams it.
+        The spool's parts at this point must all be committed -- open_checkpointed_spool
+        discards the others.
+        """
+        spool.flush_rows = flush_rows
+        spool.flush_seconds = flush_seconds
+        self._parts = spool.part_paths()
+        previous = spool.on_flush
+
+        def on_flush(path, keys):
+            if previous is not None:
+                previous(path, keys)
+            if path is not None:
+                self._flushed_at[path.name] = spool.buffer_started
+                self._parts.append(path)
+                self._pending.put(path)
+
+        spool.on_flush = on_flush
+        self._thread = threading.Thread(target=self._stream_parts, args=(spool,), name="bronze-stream", daemon=True)
+        self._thread.start()
+
+    def _stream_parts(self, spool):
+        """Background thread: stream new parts as the spool flushes them, until close() queues None."""
+        while True:
+            paths = [self._pending.get()]
+            while not self._pending.empty():
+                paths.append(self._pending.get_nowait())  # one sync covers every part flushed meanwhile
+            if None in paths:
+                return  # close() streams whatever is left
+            try:
+                self.sync(self.committed_parts())
+            except Exception as e:
+                # The part stays on disk; the next flush or close() streams it.
+                logger.error("Streaming to %s failed, will retry with the next batch: %s", self.table_id, e)
+
+    def committed_parts(self) -> list[Path]:
+        """
+        Parts to stream: only those the checkpoint has committed. A part renamed into
+        place but not committed yet may be discarded by --resume and its pages
+        refetched into a different part at the same offset.
+        """
+        return list(self._parts)
+
+    def sync(self, part_paths: list[Path]):
+        """Append every part past the acknowledged rows, in order, each at its fixed offset."""
+        offset = 0
+        for path in part_paths:
+            rows = self._part_rows.get(path.name)
+            if rows is None:
+                rows = self._part_rows[path.name] = pq.ParquetFile(path).metadata.num_rows
+            if offset + rows > self.rows_acked:
+                if offset < self.rows_acked:
+                    raise OffsetOutOfRange(f"{path.name} straddles the acknowledged offset {self.rows_acked}")
+                self._append_part(path, offset, rows)
+            offset += rows
+
+    def _batch(self, path: Path) -> pa.Table:
+        table = pq.read_table(path)
+        dropped = set(table.column_names) - set(self.schema.names) - self.dropped_columns
+        if dropped:
+            self.dropped_columns |= dropped
+            logger.warning("Not streaming undeclared column(s) %s to %s: declare them in bronze_schemas.py", sorted(dropped), self.table_id)
+        table = conform_table(table, self.schema).select(self.schema.names)
+        for name, value in (("scraped_at", self.scraped_at), ("date_scraped", self.scraped_at.date())):
+            if name in self.schema.names:
+                index = table.schema.get_field_index(name)
+                table = table.set_column(index, self.schema.field(name), pa.array([value] * len(table), self.schema.field(name).type))
+        return table
+
+    def _append_part(self, path: Path, offset: int, rows: int):
+        batch = self._batch(path)
+        start = time.monotonic()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.sink.append(batch, offset)
+                self.rows_streamed += rows
+                break
+            except OffsetAlreadyWritten:
+                self.duplicates += rows
+                logger.info("Rows %d-%d of %s were already streamed, skipped", offset, offset + rows - 1, self.table_id)
+                break
+            except OffsetOutOfRange:
+                raise
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    raise
+                logger.warning("Append at offset %d failed (%s), retrying (%d/%d)", offset, e, attempt, self.max_attempts)
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+        acked = time.monotonic()
+        self.streaming_seconds += acked - start
+        METRICS.observe("stream_append", acked - start)
+        METRICS.count("rows_streamed", rows)
+        flushed_at = self._flushed_at.pop(path.name, None)
+        if flushed_at is not None:
+            # Oldest row of the batch: scraped -> queryable in bronze.
+            self.freshness.append(acked - flushed_at)
+            METRICS.observe("stream_freshness", acked - flushed_at)
+        self.rows_acked = offset + rows
+        self._save_state()
+
+    def close(self, spool):
+        """Flush the spool, stop the background thread, stream whatever is left (raising if that still fails), finalize and log a summary."""
+        spool.flush()
+        if self._thread is not None:
+            self._pending.put(None)
+            self._thread.join()
+            self._thread = None
+        self.sync(self.committed_parts())
+        self.sink.finalize()
+        self.log_summary()
+
+    def summary(self) -> dict:
+        freshness = sorted(self.freshness)
+        seconds = time.monotonic() - self.started
+        return {
+            "rows_streamed": self.rows_streamed, "rows_acked": self.rows_acked, "duplicates_skipped": self.duplicates,
+            "dropped_columns": sorted(self.dropped_columns),
+            "rows_per_second": self.rows_streamed / self.streaming_seconds if self.streaming_seconds else 0.0,
+            "freshness_p50_seconds": percentile(freshness, 0.50), "freshness_p95_seconds": percentile(freshness, 0.95),
+            "freshness_max_seconds": freshness[-1] if freshness else 0.0, "wall_seconds": seconds,
+        }
+
+    def log_summary(self):
+        s = self.summary()
+        logger.info(
+            "Streamed %d rows to %s (%d duplicate rows skipped), %.0f rows/s while appending; "
+            "freshness p50 %.1fs, p95 %.1fs, max %.1fs",
+            s["rows_streamed"], self.table_id, s["duplicates_skipped"], s["rows_per_second"],
+            s["freshness_p50_seconds"], s["freshness_p95_seconds"], s["freshness_max_seconds"],
+        )
+        if s["dropped_columns"]:
+            logger.warning("Undeclared column(s) left out of the stream to %s: %s", self.table_id, ", ".join(s["dropped_columns"]))
+
+
+def open_bronze_stream(kind: str, table_id: str, spool, client=None) -> BronzeStreamWriter:
+    """
+    Writer streaming `spool`'s parts to table_id, attached and caught up (a resumed
+    run's acknowledged parts are skipped). With a BigQuery `client` the table is created
+    first if missing -- an append stream can't create it.
+    """
+    if kind == "bigquery" and client is not None:
+        from src.utils.gcp_conn import ensure_bronze_table
+        ensure_bronze_table(client, table_id, bronze_schema(table_id))
+    writer = BronzeStreamWriter(open_stream_sink(kind, table_id), table_id, spool.spool_dir)
+    writer.attach(spool)
+    writer.sync(writer.committed_parts())
+    return writer
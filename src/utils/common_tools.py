@@ -9,14 +9,11 @@ from psycopg2.extras import execute_batch, execute_values
 from typing import List, Tuple, Optional
 import pandas as pd
 
+from src.utils.log_setup import configure_logging
 
 
 def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s %(levelname)s %(message)s',
-        handlers=[logging.StreamHandler()]
-    )
+    configure_logging()
     return logging.getLogger(__name__)
 logger = setup_logging()
 
@@ -49,6 +46,12 @@ def stop_sleep(proc):
     if proc:
         proc.terminate()
 
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system().lower() == "darwin" else peak / 1024
+
 def format_worksheet(worksheet):
     worksheet.spreadsheet.batch_update({
         "requests": [
@@ -0,0 +1,106 @@
+"""
+Crash-resumable crawl checkpoints.
+
+Nothing used to be written until the single upload at the end of a scraper's
+__main__, so a crawl that died at district 20 of 24 lost every page fetched so far.
+A CrawlCheckpoint is a small SQLite manifest kept next to the run's RowSpool
+recording, per listing URL (city or district), its page count and which pages are
+done -- and which spool part file holds their rows. A page only counts as done once
+the part holding its rows has been written, in the same transaction, so a re-run with
+--resume refetches exactly the pages whose rows never made it to disk. The end-of-run
+upload records each part it has loaded into a table, so a resumed run whose upload
+failed halfway loads only the parts that didn't make it.
+"""
+import shutil
+import sqlite3
+from pathlib import Path
+
+from src.utils.row_spool import RowSpool
+
+CHECKPOINT_FILE = "checkpoint.sqlite"
+
+
+class CrawlCheckpoint:
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS listings (
+                url TEXT PRIMARY KEY,
+                page_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                part TEXT
+            );
+            CREATE TABLE IF NOT EXISTS parts (
+                name TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS uploads (
+                part TEXT NOT NULL,
+                target TEXT NOT NULL,
+                PRIMARY KEY (part, target)
+            );
+        """)
+        self.conn.commit()
+
+    def record_listing(self, url: str, page_count: int):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO listings (url, page_count) VALUES (?, ?)", (url, page_count),
+            )
+
+    def listing_page_count(self, url: str) -> int | None:
+        row = self.conn.execute("SELECT page_count FROM listings WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def is_done(self, url: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM pages WHERE url = ?", (url,)).fetchone() is not None
+
+    def done_pages(self) -> set[str]:
+        return {url for (url,) in self.conn.execute("SELECT url FROM pages")}
+
+    def commit_part(self, part_path: Path | None, page_urls: list[str]):
+        """RowSpool on_flush hook: mark page_urls done, their rows being in part_path (None: pages had no rows)."""
+        part = part_path.name if part_path is not None else None
+        with self.conn:
+            if part is not None:
+                self.conn.execute("INSERT OR IGNORE INTO parts (name) VALUES (?)", (part,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pages (url, part) VALUES (?, ?)",
+                [(url, part) for url in page_urls],
+            )
+
+    def committed_parts(self) -> set[str]:
+        return {name for (name,) in self.conn.execute("SELECT name FROM parts")}
+
+    def record_upload(self, part: str, target: str):
+        """Mark spool part `part` as loaded into table `target`."""
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO uploads (part, target) VALUES (?, ?)", (part, target))
+
+    def uploaded_targets(self, part: str) -> set[str]:
+        """Tables spool part `part` has already been loaded into."""
+        return {target for (target,) in self.conn.execute("SELECT target FROM uploads WHERE part = ?", (part,))}
+
+    def close(self):
+        self.conn.close()
+
+
+def open_checkpointed_spool(spool_dir, resume: bool = False) -> tuple[RowSpool, CrawlCheckpoint]:
+    """
+    Open the spool + checkpoint pair for one crawl job. Without `resume` any state
+    left by a previous run of the same job is wiped; with it, completed pages are
+    kept and spool parts that were written but never committed (crash between the
+    two) are discarded, since their pages will be refetched.
+    """
+    spool_dir = Path(spool_dir)
+    if not resume:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    spool_dir.mkdir(parents=True, exist_ok=True)
+
+    checkpoint = CrawlCheckpoint(spool_dir / CHECKPOINT_FILE)
+    spool = RowSpool(spool_dir, on_flush=checkpoint.commit_part)
+    spool.discard_parts(keep=checkpoint.committed_parts())
+    return spool, checkpoint
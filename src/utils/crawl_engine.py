@@ -0,0 +1,427 @@
+"""
+Work-queue crawl engine shared by the src/_web2br scrapers.
+
+Replaces the old batch-then-sleep loop in fetch_all_pages (slice BATCH_SIZE urls,
+asyncio.gather the slice, sleep BATCH_DELAY_SECONDS): there, one slow page held up the
+other 99 finished ones and nothing overlapped the sleep. Here a fixed pool of workers
+pulls items from a queue continuously, and politeness is expressed as a requests/sec
+budget enforced by a token bucket instead of a pause -- so network, parsing and the
+rate budget overlap. ListingCrawler builds the scrapers' pagination on top of it.
+
+How many requests are in flight isn't a constant either: an AIMDController (hooked
+into the session, see src/utils/http_session.py) grows the limit while the site
+answers fast and cleanly and halves it on 429/403/5xx or a latency spike.
+
+Scrapers running side by side under the pipeline share one host budget: it sets
+RATE_LIMIT_FILE, and new_rate_limiter then hands out a SharedTokenBucket on that file
+instead of a per-process TokenBucket.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
+
+from src.utils.common_tools import setup_logging
+from src.utils.stage_metrics import METRICS
+logger = setup_logging()
+
+# Token file shared by every process hitting the same host (set per concurrency group by
+# src/orchestrator/run_pipeline.py); unset, each process has its own bucket.
+RATE_LIMIT_FILE = os.getenv("RATE_LIMIT_FILE")
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter: `rate` tokens per second, holding at most
+    `capacity` (defaults to one second's worth), so at most `capacity` requests can
+    go out back-to-back after an idle stretch and the long-run rate never exceeds
+    `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError(f"rate must be > 0, got {rate}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        # The lock makes waiters queue up FIFO instead of all waking at once and
+        # racing for the same token.
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class SharedTokenBucket:
+    """
+    TokenBucket whose tokens live in a file, so every process using the same path
+    draws from one budget of `rate` tokens per second: a process running alone gets all
+    of it, and processes running at once split it between them as they come and go.
+    Each token is a read-modify-write of the file under an exclusive flock, run on a
+    worker thread so a flock held by another process never blocks the event loop.
+    """
+
+    def __init__(self, path, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError(f"rate must be > 0, got {rate}")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._lock = asyncio.Lock()
+
+    def _take(self) -> float:
+        """Take a token if the bucket has one (returns 0), else the seconds until it will."""
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # released when the file closes
+            f.seek(0)
+            state = json.loads(f.read() or "null")
+            now = time.time()  # wall clock: comparable between processes
+            if state is None:
+                tokens = self.capacity
+            else:
+                tokens = min(self.capacity, state["tokens"] + max(0.0, now - state["updated_at"]) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            if not wait:
+                tokens -= 1
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({"tokens": tokens, "updated_at": now}))
+        return wait
+
+    async def acquire(self):
+        # One waiter per process at a time, as in TokenBucket; processes take turns through the file.
+        async with self._lock:
+            while wait := await asyncio.to_thread(self._take):
+                await asyncio.sleep(wait)
+
+
+def new_rate_limiter(requests_per_second: float | None) -> TokenBucket | SharedTokenBucket | None:
+    """Rate limiter for requests_per_second (None: no limit), shared through RATE_LIMIT_FILE when that is set."""
+    if not requests_per_second:
+        return None
+    if RATE_LIMIT_FILE:
+        return SharedTokenBucket(RATE_LIMIT_FILE, requests_per_second)
+    return TokenBucket(requests_per_second)
+
+
+class AIMDController:
+    """
+    Additive-increase/multiplicative-decrease limit on requests in flight, like TCP
+    congestion control. Every healthy response grows the limit by ~1 per limit's worth
+    of responses; a throttling status (THROTTLE_STATUSES, 5xx), a failed request or a
+    latency spike (above `spike_factor` x the running average) multiplies it by
+    `decrease`. Only one decrease happens per window -- responses to requests sent
+    before the last decrease don't count again -- so a burst of 429s for requests
+    that were all in flight at once halves the limit once, not to the floor.
+    """
+
+    THROTTLE_STATUSES = {403, 429}
+
+    def __init__(self, initial: int = 5, min_concurrency: int = 1, max_concurrency: int = 16,
+                 decrease: float = 0.5, spike_factor: float = 3.0, warmup: int = 10):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(max(initial, min_concurrency), max_concurrency))
+        self.decrease = decrease
+        self.spike_factor = spike_factor
+        self.warmup = warmup
+        self.in_flight = 0
+        self.decreases = 0
+        self._latency_avg = None
+        self._samples = 0
+        self._window = 0  # bumped on every decrease
+        self._cond = asyncio.Condition()
+
+    def is_healthy(self, status_code: int | None, latency: float | None) -> bool:
+        if status_code is None or status_code in self.THROTTLE_STATUSES or status_code >= 500:
+            return False
+        if latency is None:
+            return True
+        spike = (self._samples >= self.warmup and self._latency_avg is not None
+                 and latency > self.spike_factor * self._latency_avg)
+        if not spike:
+            # Spikes stay out of the average, or a slow stretch would become the norm.
+            self._latency_avg = latency if self._latency_avg is None else 0.9 * self._latency_avg + 0.1 * latency
+            self._samples += 1
+        return not spike
+
+    def record(self, window: int, status_code: int | None, latency: float | None = None):
+        """Feed back one response (status_code None: the request failed outright)."""
+        if self.is_healthy(status_code, latency):
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        elif window == self._window:
+            self.limit = max(self.min_concurrency, self.limit * self.decrease)
+            self._window += 1
+            self.decreases += 1
+            logger.warning("Backing off: status=%s, latency=%s; concurrency limit now %.1f", status_code, latency, self.limit)
+
+    def log(self, label: str):
+        logger.info("%s concurrency: limit ended at %.1f after %d back-off(s)", label, self.limit, self.decreases)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the `limit` in-flight slots; yields the current window for record()."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            yield self._window
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+
+class WorkQueue:
+    """
+    Fixed pool of `concurrency` async workers pulling items from one asyncio.Queue.
+    Every item costs one token from `rate_limiter` (if given) before `handler(item)`
+    runs, so one item should map to one HTTP request. Items `skip(item)` rejects when
+    a worker picks them up are dropped (result None) without spending a token.
+
+    Items can be added with put() while the queue is running (e.g. a page handler
+    enqueueing the rest of a district's pages); run() returns once every item,
+    including those added later, has been handled. put(item, delay) only enqueues the
+    item after `delay` seconds, on a timer -- no worker is tied up waiting for it.
+    Results are returned in the order items were put; a handler exception is logged
+    and recorded as None rather than killing its worker.
+    """
+
+    def __init__(self, handler, concurrency: int, rate_limiter: TokenBucket | SharedTokenBucket | None = None, skip=None):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter
+        self.skip = skip
+        self._queue = asyncio.Queue()
+        self._results = {}
+        self._next_seq = 0
+        self._delayed = 0  # items put with a delay that haven't entered the queue yet
+        self._released = asyncio.Event()
+
+    def put(self, item, delay: float = 0):
+        seq = self._next_seq
+        self._next_seq += 1
+        if delay > 0:
+            self._delayed += 1
+            asyncio.get_running_loop().call_later(delay, self._release, seq, item)
+        else:
+            self._queue.put_nowait((seq, item))
+
+    def _release(self, seq, item):
+        self._delayed -= 1
+        self._queue.put_nowait((seq, item))
+        self._released.set()
+
+    async def _worker(self):
+        while True:
+            seq, item = await self._queue.get()
+            try:
+                if self.skip is not None and self.skip(item):
+                    self._results[seq] = None
+                    continue
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire()
+                self._results[seq] = await self.handler(item)
+            except Exception as e:
+                logger.error("Work item %r failed: %s", item, e)
+                self._results[seq] = None
+            finally:
+                self._queue.task_done()
+
+    async def run(self) -> list:
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            while True:
+                await self._queue.join()
+                if not self._delayed:
+                    break
+                # Only delayed items are left: wait for one to enter the queue.
+                self._released.clear()
+                await self._released.wait()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return [self._results[seq] for seq in sorted(self._results)]
+
+
+async def run_work_queue(items, handler, concurrency: int, requests_per_second: float | None = None) -> list:
+    """Run handler over items on a WorkQueue; requests_per_second=None disables rate limiting."""
+    rate_limiter = new_rate_limiter(requests_per_second)
+    queue = WorkQueue(handler, concurrency=concurrency, rate_limiter=rate_limiter)
+    for item in items:
+        queue.put(item)
+    return await queue.run()
+
+
+class ListingCrawler:
+    """
+    Crawls paginated listing URLs (a listing URL is its own page 1, then /p2../pN)
+    into a RowSpool on one WorkQueue. Every listing added -- a city, or all districts
+    of a city -- shares the same workers and requests/sec budget, so one listing's
+    last pages overlap the next one's first page instead of crawling them back to
+    back. Every queued task must cost exactly one request.
+
+    fetch_page(url) -> (row records, page count), or (None, None) on failure.
+    With a CrawlCheckpoint, listings/pages already done are not queued again.
+
+    A failed page is requeued, to be fetched again after a jittered exponential
+    backoff (from `retry_backoff` seconds), up to `max_attempts` times, within a crawl-wide retry budget of `retry_ratio` of the
+    pages fetched so far (plus a small floor) -- when the site is down, retries can't
+    multiply the load. The backoff is a delayed put, not a sleep in the worker, so
+    other pages keep going meanwhile. Pages that still fail end up in `failed_pages`.
+
+    With a stop_page(records) -> bool hook (incremental crawls, see SeenIndex) a
+    listing's pages are not all queued up front: `lookahead` pages are in flight per
+    listing, each fetched page queues the one `lookahead` further on, and pagination
+    of the listing ends at the first page stop_page accepts -- at most lookahead - 1
+    pages past it are fetched for nothing. Queued pages of a stopped listing are
+    skipped before they take a token from the requests/sec budget.
+    """
+
+    RETRY_BUDGET_FLOOR = 10
+
+    def __init__(self, fetch_page, spool, checkpoint=None, concurrency: int = 5,
+                 requests_per_second: float | None = None, stop_page=None, lookahead: int = 2,
+                 max_attempts: int = 3, retry_ratio: float = 0.2, retry_backoff: float = 1.0):
+        self.fetch_page = fetch_page
+        self.spool = spool
+        self.checkpoint = checkpoint
+        self.stop_page = stop_page
+        self.lookahead = lookahead
+        rate_limiter = new_rate_limiter(requests_per_second)
+        # Items are (listing url or None, task), so pages of a stopped listing can be skipped unfetched.
+        self.queue = WorkQueue(
+            lambda item: item[1](), concurrency=concurrency, rate_limiter=rate_limiter,
+            skip=lambda item: item[0] in self.stopped_listings,
+        )
+        self.max_attempts = max_attempts
+        self.retry_ratio = retry_ratio
+        self.retry_backoff = retry_backoff
+        self.empty_listings = []
+        self.failed_pages = []
+        self.stopped_listings = {}  # listing url -> page number pagination stopped at
+        self.pages_fetched = 0
+        self.retries = 0
+        self._page_counts = {}
+        self._done_pages = checkpoint.done_pages() if checkpoint else set()
+
+    def add_request(self, task):
+        """Queue a zero-argument coroutine function making one request (e.g. a district slug probe)."""
+        self.queue.put((None, task))
+
+    def add_listing(self, url: str, columns: dict | None = None, first_page: tuple | None = None):
+        """
+        Queue a listing's first page, which queues the rest; rows are tagged with
+        constant `columns`. `first_page` is an already fetched and parsed
+        (records, page count) for url -- e.g. a probe response -- used instead of
+        fetching it again.
+        """
+        page_count = self.checkpoint.listing_page_count(url) if self.checkpoint else None
+        if page_count is not None and url in self._done_pages:
+            logger.info("Resuming %s: first page already done, %s pages in total.", url, page_count)
+            self._add_pages(url, page_count, columns)
+        elif first_page is not None:
+            self._add_first_page(url, columns, *first_page)
+        else:
+            self.queue.put((url, partial(self._fetch_first_page, url, columns)))
+
+    def _retry(self, url, page_url, attempt, task) -> bool:
+        """Requeue a failed fetch of listing url, after a backoff, if its attempts and the crawl's retry budget allow."""
+        budget = self.RETRY_BUDGET_FLOOR + self.retry_ratio * self.pages_fetched
+        if attempt < self.max_attempts and self.retries < budget:
+            self.retries += 1
+            METRICS.count("retries")
+            delay = random.uniform(0.5, 1) * self.retry_backoff * 2 ** (attempt - 1)
+            logger.warning("Requeueing %s in %.1fs (attempt %d/%d)", page_url, delay, attempt + 1, self.max_attempts, extra={"url": page_url})
+            self.queue.put((url, task), delay=delay)
+            return True
+        logger.error("Giving up on %s after %d attempt(s) (%d retries used in this crawl)", page_url, attempt, self.retries, extra={"url": page_url})
+        self.failed_pages.append(page_url)
+        METRICS.count("failed_pages")
+        return False
+
+    async def _fetch_first_page(self, url, columns, attempt=1):
+        records, page_count = await self.fetch_page(url)
+        self.pages_fetched += 1
+        METRICS.count("pages_fetched")
+        if records is None and self._retry(url, url, attempt, partial(self._fetch_first_page, url, columns, attempt + 1)):
+            return
+        self._add_first_page(url, columns, records, page_count)
+
+    def _add_first_page(self, url, columns, records, page_count):
+        if not records:
+            logger.error("No listings found on the first page of %s.", url)
+            self.empty_listings.append(url)
+            return
+        logger.info("Initial page fetched. Extracted %d listings from the first page of %s.", len(records), url)
+        self.spool.append(records, key=url, **(columns or {}))
+        if self.checkpoint:
+            self.checkpoint.record_listing(url, page_count)
+        if self.stop_page is not None and self.stop_page(records):
+            self._stop_listing(url, 1)
+            return
+        self._add_pages(url, page_count, columns)
+
+    def _add_pages(self, url, page_count, columns):
+        logger.info("Total pages to fetch for %s: %s", url, page_count)
+        if self.stop_page is None:
+            for page_num in range(2, page_count + 1):
+                self._queue_page(url, page_num, columns)
+            return
+        self._page_counts[url] = page_count
+        for page_num in range(2, 2 + self.lookahead):
+            self._queue_page(url, page_num, columns)
+
+    def _queue_page(self, url, page_num, columns):
+        """Queue page_num of listing url unless it's done already; incremental chains skip past done pages."""
+        page_count = self._page_counts.get(url, page_num)
+        while page_num <= page_count and url not in self.stopped_listings:
+            page_url = f"{url}/p{page_num}"
+            if page_url not in self._done_pages:
+                self.queue.put((url, partial(self._fetch_page, url, page_num, columns)))
+                return
+            page_num += self.lookahead
+
+    def _stop_listing(self, url, page_num):
+        if url not in self.stopped_listings:
+            logger.info("Stopping %s at page %d: already known.", url, page_num)
+            self.stopped_listings[url] = page_num
+
+    async def _fetch_page(self, url, page_num, columns, attempt=1):
+        page_url = f"{url}/p{page_num}"
+        if url in self.stopped_listings:  # stopped while this page waited for its token
+            return
+        records, _ = await self.fetch_page(page_url)
+        self.pages_fetched += 1
+        METRICS.count("pages_fetched")
+        if records is None and self._retry(url, page_url, attempt, partial(self._fetch_page, url, page_num, columns, attempt + 1)):
+            return
+        if records is not None:
+            self.spool.append(records, key=page_url, **(columns or {}))
+        if self.stop_page is None:
+            return
+        if records and self.stop_page(records):
+            self._stop_listing(url, page_num)
+        else:
+            self._queue_page(url, page_num + self.lookahead, columns)
+
+    async def run(self):
+        await self.queue.run()
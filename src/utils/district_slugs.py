@@ -0,0 +1,59 @@
+"""
+Persisted district slug resolutions for the district-mode scrapers.
+
+resolve_district_url used to GET every district's derived URL on every run just to
+confirm slugify_district(name) lands on a clean district page -- then the crawler
+fetched that same URL again as page 1. A DistrictSlugTable remembers each probe's
+outcome (derived URL -> district id, final redirect target, status, verified-at), so a
+district verified within REVALIDATE_AFTER_DAYS is crawled straight away, and a probe
+that does go out doubles as the district's first listing page.
+
+Failed resolutions are remembered too: a slug that redirects to a catch-all page is
+skipped without a request until it is due for revalidation.
+"""
+import sqlite3
+import time
+from pathlib import Path
+
+DISTRICT_SLUGS_PATH = "data/state/district_slugs.sqlite"
+REVALIDATE_AFTER_DAYS = 30
+
+
+class DistrictSlugTable:
+
+    def __init__(self, path=DISTRICT_SLUGS_PATH, revalidate_after_days: float = REVALIDATE_AFTER_DAYS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.revalidate_after_seconds = revalidate_after_days * 24 * 60 * 60
+        # Shared by the sale and rent scrapers, which run_pipeline may run side by side.
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS district_slugs (
+                url TEXT PRIMARY KEY,
+                district_id TEXT NOT NULL,
+                final_url TEXT,
+                status_code INTEGER,
+                resolved INTEGER NOT NULL,
+                verified_at REAL NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def lookup(self, url: str) -> bool | None:
+        """True/False if url's resolution was verified recently enough to reuse, None if it needs a probe."""
+        row = self.conn.execute(
+            "SELECT resolved, verified_at FROM district_slugs WHERE url = ?", (url,),
+        ).fetchone()
+        if row is None or time.time() - row[1] >= self.revalidate_after_seconds:
+            return None
+        return bool(row[0])
+
+    def record(self, url: str, district_id, final_url: str | None, status_code: int | None, resolved: bool):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO district_slugs VALUES (?, ?, ?, ?, ?, ?)",
+                (url, str(district_id), final_url, status_code, int(resolved), time.time()),
+            )
+
+    def close(self):
+        self.conn.close()
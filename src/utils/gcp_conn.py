@@ -3,8 +3,33 @@ import os
 import pandas as pd
 
 import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from google.oauth2 import service_account
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from google.api_core.exceptions import NotFound
+from src.utils.bronze_schemas import bronze_partitioning, bronze_schema, conform_table
+from src.utils.common_tools import setup_logging
+from src.utils.stage_metrics import METRICS
+logger = setup_logging()
+
+# Rows per Parquet file / load job; bigger loads are split into jobs run side by side.
+LOAD_CHUNK_ROWS = int(os.getenv("BQ_LOAD_CHUNK_ROWS", 250_000))
+LOAD_WORKERS = int(os.getenv("BQ_LOAD_WORKERS", 4))
+LOAD_COMPRESSION = "zstd"
+# A WRITE_TRUNCATE load of several chunks goes into <table>__load_staging first, then
+# one copy job replaces the table, so readers never see it partly replaced.
+LOAD_STAGING_SUFFIX = "__load_staging"
+_ARROW_TO_BQ_TYPES = {
+    pa.string(): "STRING", pa.large_string(): "STRING", pa.int64(): "INT64", pa.float64(): "FLOAT64",
+    pa.bool_(): "BOOL", pa.date32(): "DATE",
+}
+# get_table() can report the legacy names of the standard SQL types.
+_LEGACY_BQ_TYPES = {"INTEGER": "INT64", "FLOAT": "FLOAT64", "BOOLEAN": "BOOL", "DECIMAL": "NUMERIC", "BIGDECIMAL": "BIGNUMERIC"}
+_ensured_tables = set()
 
 def get_bigquery_client():
     credentials_json = os.environ.get("GCP_CREDENTIALS_JSON")
@@ -56,6 +81,175 @@ def execute_query(client, query):
     }
 
 
+def bq_type_from_arrow(field: pa.Field) -> str:
+    """BigQuery type a Parquet column of field's Arrow type loads as. Raises ValueError for types with none."""
+    arrow_type = field.type
+    if arrow_type in _ARROW_TO_BQ_TYPES:
+        return _ARROW_TO_BQ_TYPES[arrow_type]
+    if pa.types.is_integer(arrow_type):
+        return "INT64"
+    if pa.types.is_floating(arrow_type):
+        return "FLOAT64"
+    if pa.types.is_timestamp(arrow_type):
+        return "TIMESTAMP"
+    if pa.types.is_decimal(arrow_type):
+        fits_numeric = arrow_type.scale <= 9 and arrow_type.precision - arrow_type.scale <= 29
+        return "NUMERIC" if fits_numeric else "BIGNUMERIC"
+    if pa.types.is_date(arrow_type):
+        return "DATE"
+    if pa.types.is_time(arrow_type):
+        return "TIME"
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return "BYTES"
+    raise ValueError(f"Column {field.name!r} has Arrow type {arrow_type}, which has no BigQuery type to load into")
+
+
+def bq_schema_from_arrow(schema: pa.Schema) -> list:
+    return [bigquery.SchemaField(field.name, bq_type_from_arrow(field)) for field in schema]
+
+
+def check_load_schema(schema: pa.Schema, target, table_id):
+    """
+    Raise ValueError, before any job runs, if a column of `schema` has no BigQuery type
+    or a different one than the same column of the existing table `target` (None:
+    table doesn't exist yet). A timestamp without time zone may also go into DATETIME.
+    """
+    existing = {field.name: _LEGACY_BQ_TYPES.get(field.field_type, field.field_type) for field in target.schema} if target is not None else {}
+    mismatches = []
+    for field in schema:
+        bq_type = bq_type_from_arrow(field)
+        accepted = {bq_type, "DATETIME"} if pa.types.is_timestamp(field.type) and field.type.tz is None else {bq_type}
+        if field.name in existing and existing[field.name] not in accepted:
+            mismatches.append(f"{field.name} ({field.type} loads as {bq_type}, table has {existing[field.name]})")
+    if mismatches:
+        raise ValueError(f"Columns don't match {table_id}'s schema: {'; '.join(mismatches)}")
+
+
+def get_table_or_none(client, table_id):
+    try:
+        return client.get_table(table_id)
+    except NotFound:
+        return None
+
+
+def ensure_bronze_table(client, table_id, schema: pa.Schema):
+    """
+    Create a partitioned bronze table (src/utils/bronze_schemas.py BRONZE_PARTITIONING)
+    with `schema` if it doesn't exist yet, and keep its clustering up to date. A table
+    created before partitioning can't be partitioned in place: it's left as it is, with
+    a warning pointing to src/_web2br/partition_bronze.py. Other tables are left alone.
+    """
+    partitioning = bronze_partitioning(table_id)
+    if partitioning is None or table_id in _ensured_tables:
+        return
+    field, clustering = partitioning
+    try:
+        table = client.get_table(table_id)
+    except NotFound:
+        table = bigquery.Table(table_id, schema=bq_schema_from_arrow(schema))
+        table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field=field)
+        table.clustering_fields = clustering
+        client.create_table(table, exists_ok=True)
+        logger.info("Created %s, partitioned by %s, clustered by %s", table_id, field, ", ".join(clustering))
+    else:
+        if table.time_partitioning is None or table.time_partitioning.field != field:
+            logger.warning(
+                "%s isn't partitioned by %s, so every incremental read scans it whole; "
+                "migrate it with python -m src._web2br.partition_bronze", table_id, field,
+            )
+        elif table.clustering_fields != clustering:
+            table.clustering_fields = clustering
+            client.update_table(table, ["clustering_fields"])
+            logger.info("Re-clustered %s by %s (applies to newly written data)", table_id, ", ".join(clustering))
+    _ensured_tables.add(table_id)
+
+
+def to_arrow(source) -> pa.Table:
+    """A DataFrame, an Arrow table, or Parquet file path(s) (e.g. RowSpool parts) as one Arrow table."""
+    if isinstance(source, pa.Table):
+        return source
+    if isinstance(source, pd.DataFrame):
+        return pa.Table.from_pandas(source, preserve_index=False)
+    paths = [source] if isinstance(source, (str, Path)) else list(source)
+    tables = [pq.read_table(path) for path in paths]
+    if not tables:
+        raise ValueError("No Parquet files to load")
+    # Spool parts carry each page's own columns; unify them like RowSpool.to_arrow.
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def load_arrow_to_bigquery(
+    client,
+    source,
+    table_id,
+    schema=None,
+    write_disposition="WRITE_APPEND",
+    allow_field_addition=False,
+    chunk_rows=LOAD_CHUNK_ROWS,
+    max_workers=LOAD_WORKERS,
+    time_partitioning=None,
+    clustering_fields=None,
+):
+    """
+    Load `source` (see to_arrow) into table_id as zstd Parquet load jobs, no pandas
+    round trip and no autodetect. `schema` (default: the table's declared bronze schema,
+    src/utils/bronze_schemas.py) fixes the known columns' types first, and a missing
+    append-only bronze table is created partitioned and clustered. Every column is
+    checked against the existing table (check_load_schema) before anything is sent.
+    Loads over chunk_rows rows are split into that many rows per job, up to max_workers
+    at once. A WRITE_TRUNCATE of several chunks loads them into a staging table and
+    copies that over table_id in one job, so the table is replaced all at once or not
+    at all. time_partitioning and clustering_fields apply when the load creates the
+    table. Returns the rows loaded.
+    """
+    table = to_arrow(source)
+    schema = schema if schema is not None else bronze_schema(table_id)
+    if schema is not None:
+        table = conform_table(table, schema)
+        ensure_bronze_table(client, table_id, table.schema)
+    target = get_table_or_none(client, table_id)
+    check_load_schema(table.schema, target, table_id)
+    chunks = [table.slice(offset, chunk_rows) for offset in range(0, table.num_rows, chunk_rows)] or [table]
+    if write_disposition == "WRITE_TRUNCATE" and len(chunks) > 1:
+        staging_id = f"{table_id}{LOAD_STAGING_SUFFIX}"
+        if target is not None:
+            # The copy only replaces a partitioned/clustered table from one laid out the same way.
+            time_partitioning, clustering_fields = target.time_partitioning, target.clustering_fields
+        client.delete_table(staging_id, not_found_ok=True)  # left over by a load that died before its cleanup
+        try:
+            rows = load_arrow_to_bigquery(
+                client, table, staging_id, schema=schema, write_disposition="WRITE_APPEND", chunk_rows=chunk_rows,
+                max_workers=max_workers, time_partitioning=time_partitioning, clustering_fields=clustering_fields,
+            )
+            copy_config = bigquery.CopyJobConfig(write_disposition="WRITE_TRUNCATE")
+            client.copy_table(staging_id, table_id, job_config=copy_config).result()
+        finally:
+            client.delete_table(staging_id, not_found_ok=True)
+        logger.info("Replaced %s with %d rows through %s", table_id, rows, staging_id)
+        return rows
+
+    def load(chunk, disposition, tmp_dir, seq):
+        path = Path(tmp_dir) / f"chunk-{seq:05d}.parquet"
+        pq.write_table(chunk, path, compression=LOAD_COMPRESSION)
+        METRICS.count("bytes_uploaded", path.stat().st_size)
+        job_config = bigquery.LoadJobConfig(source_format=bigquery.SourceFormat.PARQUET, write_disposition=disposition)
+        if allow_field_addition and disposition != "WRITE_TRUNCATE":
+            job_config.schema_update_options = [bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION]
+        job_config.time_partitioning = time_partitioning
+        job_config.clustering_fields = clustering_fields
+        with open(path, "rb") as f:
+            job = client.load_table_from_file(f, table_id, job_config=job_config)
+        job.result()
+        return job.output_rows
+
+    with tempfile.TemporaryDirectory(prefix="bq-load-") as tmp_dir:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(load, chunk, write_disposition, tmp_dir, seq) for seq, chunk in enumerate(chunks)]
+            rows = sum(future.result() for future in futures)
+    logger.info("Loaded %d rows into %s in %d job(s)", rows, table_id, len(chunks))
+    return rows
+
+
 def upload_df_to_bigquery(
     client,
     df,
@@ -63,6 +257,14 @@ def upload_df_to_bigquery(
     write_disposition="WRITE_APPEND",
     allow_field_addition=False,
 ):
+    """
+    Tables with a declared bronze schema go through load_arrow_to_bigquery; anything
+    else (e.g. migrate.py's tables) is still loaded with load_table_from_dataframe.
+    """
+    if bronze_schema(table_id) is not None:
+        return load_arrow_to_bigquery(
+            client, df, table_id, write_disposition=write_disposition, allow_field_addition=allow_field_addition,
+        )
     from google.cloud.bigquery import LoadJobConfig
     job_config = LoadJobConfig(
         write_disposition=write_disposition,
@@ -0,0 +1,114 @@
+"""
+Pluggable HTML parser backends for the src/_web2br scrapers.
+
+"bs4" is the original BeautifulSoup + html.parser path. "lxml" is the fast path: the
+tree is built by libxml2 instead of pure Python, and card parsers collect every field
+of a card in one pass over its descendants (find_first_by_class) instead of a find()
+per field. Both must produce identical rows, so the helpers here reproduce
+BeautifulSoup's class_ matching rules exactly (see class_matches) and its .text
+(text_of: no script/style/template text, whitespace-only strings collapsed).
+tests/test_parser_backends.py checks both backends against saved pages.
+"""
+import lxml.html
+from bs4 import BeautifulSoup
+
+PARSER_BACKENDS = ["bs4", "lxml"]
+
+
+def parse_html(content: bytes, encoding: str = "utf-8", backend: str = "bs4"):
+    """Build a BeautifulSoup (backend="bs4") or lxml.html (backend="lxml") tree from raw page bytes."""
+    text = content.decode(encoding, errors="replace")
+    if backend == "bs4":
+        return BeautifulSoup(text, 'html.parser')
+    if backend == "lxml":
+        return lxml.html.document_fromstring(text)
+    raise ValueError(f"Unknown parser backend '{backend}', expected one of {PARSER_BACKENDS}")
+
+
+def class_matches(class_attr: str | None, class_: str) -> bool:
+    """
+    BeautifulSoup's class_= semantics: a single class name matches if it is any one
+    of the element's classes; a space-separated string only matches the element's
+    whole (whitespace-normalised) class attribute, in that exact order.
+    """
+    if class_attr is None:
+        return False
+    classes = class_attr.split()
+    if " " in class_:
+        return " ".join(classes) == class_
+    return class_ in classes
+
+
+def find_all_by_class(doc, tag: str, class_: str) -> list:
+    """doc.find_all(tag, class_=class_) for either backend."""
+    if isinstance(doc, lxml.html.HtmlElement):
+        return [el for el in doc.iterdescendants(tag) if class_matches(el.get("class"), class_)]
+    return doc.find_all(tag, class_=class_)
+
+
+def find_first_by_class(root, specs: list[tuple[str, str, str]], skip: tuple[str, str] | None = None) -> dict:
+    """
+    lxml only. One pass over root's descendants returning {key: first matching
+    element} for every (key, tag, class_) in specs -- the same element
+    root.find(tag, class_=class_) would return, for all specs at once. Keys with no
+    match are left out. Subtrees of descendants matching skip=(tag, class_) are not
+    searched: libxml2 repairs an unclosed tag by nesting the next card inside the
+    broken one, where html.parser closes it, and a card mustn't pick up the fields of
+    the card nested in it.
+    """
+    skipped = set()
+    if skip is not None:
+        for nested in find_all_by_class(root, *skip):
+            if nested not in skipped:
+                skipped.update(nested.iter())
+    found = {}
+    pending = list(specs)
+    for el in root.iterdescendants():
+        class_attr = el.get("class")
+        if class_attr is None or el in skipped:
+            continue
+        for spec in list(pending):
+            key, tag, class_ = spec
+            if el.tag == tag and class_matches(class_attr, class_):
+                found[key] = el
+                pending.remove(spec)
+        if not pending:
+            break
+    return found
+
+
+# BeautifulSoup's .text leaves out the text of these elements (Script, Stylesheet and
+# TemplateString strings); lxml's text_content() keeps it.
+NON_TEXT_TAGS = {"script", "style", "template"}
+# BeautifulSoup collapses a string of only these characters to "\n" (if it has one) or
+# " ", outside the whitespace-preserving tags.
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+
+
+def _bs4_string(text: str | None, preserve: bool) -> str:
+    if not text:
+        return ""
+    if preserve or text.strip(ASCII_SPACES):
+        return text
+    return "\n" if "\n" in text else " "
+
+
+def _lxml_text(el, preserve: bool = False) -> str:
+    preserve = preserve or el.tag in PRESERVE_WHITESPACE_TAGS
+    parts = [_bs4_string(el.text, preserve)]
+    for child in el:
+        # Comments and processing instructions have no string tag; only their tail is text.
+        if isinstance(child.tag, str) and child.tag not in NON_TEXT_TAGS:
+            parts.append(_lxml_text(child, preserve))
+        parts.append(_bs4_string(child.tail, preserve))
+    return "".join(parts)
+
+
+def text_of(el) -> str:
+    """el.text for either backend: BeautifulSoup's .text, reproduced on lxml elements."""
+    if isinstance(el, lxml.html.HtmlElement):
+        if len(el) == 0:
+            return _bs4_string(el.text, el.tag in PRESERVE_WHITESPACE_TAGS)
+        return _lxml_text(el)
+    return el.text
@@ -0,0 +1,189 @@
+"""
+On-disk HTTP response cache with conditional requests, for near-static endpoints.
+
+The city/ward/street/project lookups (j_metadata.py) only change after administrative
+reforms, yet were refetched in full on every run. (District slug probes have their own
+table instead, src/utils/district_slugs.py, since a probe response doubles as page 1.)
+CachedSession wraps any scraper's AsyncSession: responses are stored
+in one SQLite file keyed by URL (body, final URL, ETag/Last-Modified, fetch time).
+Within an endpoint family's TTL a cached response is served without touching the
+network; past it the request goes out conditionally (If-None-Match/If-Modified-Since)
+and a 304 is answered from disk -- only headers cross the wire.
+
+Only 200 responses are cached, and only once the caller has validated the body
+(commit): a truncated or malformed 200 would otherwise be served back as "fresh" to
+the very retry meant to replace it. A caller that finds a bad body evicts it. TTLs are looked up by URL path prefix, longest match
+wins, so a caller can give e.g. project lookups a shorter TTL than city lookups.
+"""
+import json
+import sqlite3
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from src.utils.common_tools import setup_logging
+logger = setup_logging()
+
+HTTP_CACHE_PATH = "data/state/http_cache.sqlite"
+DAY_SECONDS = 24 * 60 * 60
+
+
+class CachedResponse:
+    """The parts of a curl_cffi Response the scrapers use, rebuilt from a cache entry."""
+
+    def __init__(self, url: str, status_code: int, content: bytes, headers: dict, encoding: str, cache_status: str):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.encoding = encoding
+        self.cache_status = cache_status  # "fresh" (no request) | "revalidated" (304)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass  # only committed 200s are cached
+
+
+class HttpCache:
+
+    def __init__(self, path=HTTP_CACHE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Several scrapers can share the file (run_pipeline runs them in parallel).
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                final_url TEXT NOT NULL,
+                body BLOB NOT NULL,
+                encoding TEXT,
+                content_type TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def get(self, url: str) -> dict | None:
+        row = self.conn.execute(
+            "SELECT final_url, body, encoding, content_type, etag, last_modified, fetched_at FROM responses WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ["final_url", "body", "encoding", "content_type", "etag", "last_modified", "fetched_at"]
+        return dict(zip(keys, row))
+
+    def put(self, url: str, response):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url, str(response.url), response.content, response.encoding,
+                    response.headers.get("content-type"), response.headers.get("etag"),
+                    response.headers.get("last-modified"), time.time(),
+                ),
+            )
+
+    def delete(self, url: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+
+    def touch(self, url: str, response):
+        """Mark a revalidated entry fresh again, keeping any new validators the 304 carried."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE responses SET fetched_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (time.time(), response.headers.get("etag"), response.headers.get("last-modified"), url),
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+class CachedSession:
+    """
+    Wraps an AsyncSession's get() with an HttpCache. `ttls` maps URL path prefixes to
+    seconds a response is served without revalidating; `default_ttl` applies to
+    everything else (0: always revalidate). A `rate_limiter` (TokenBucket) is only
+    paid for requests that actually go out, so a warm cache isn't throttled.
+    Counts what it did in `stats`.
+
+    A fetched 200 is held back until the caller commit()s it after checking the body
+    (e.g. once .json() decoded); evict() drops a bad body, cached or pending.
+    """
+
+    def __init__(self, session, cache: HttpCache, ttls: dict[str, float] | None = None, default_ttl: float = 0,
+                 rate_limiter=None):
+        self.session = session
+        self.cache = cache
+        self.ttls = sorted((ttls or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.default_ttl = default_ttl
+        self.rate_limiter = rate_limiter
+        self.stats = {"fresh": 0, "revalidated": 0, "fetched": 0, "bytes_received": 0}
+        self._uncommitted = {}
+
+    def ttl_for(self, url: str) -> float:
+        path = urlparse(url).path
+        for prefix, ttl in self.ttls:
+            if path.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    async def get(self, url: str, headers: dict | None = None, **kwargs):
+        entry = self.cache.get(url)
+        if entry is not None and time.time() - entry["fetched_at"] < self.ttl_for(url):
+            self.stats["fresh"] += 1
+            return self._from_entry(entry, "fresh")
+
+        headers = dict(headers or {})
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        response = await self.session.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            self.stats["revalidated"] += 1
+            self.cache.touch(url, response)
+            return self._from_entry(entry, "revalidated")
+        self.stats["fetched"] += 1
+        self.stats["bytes_received"] += len(response.content)
+        if response.status_code == 200:
+            self._uncommitted[url] = response
+        else:
+            self._uncommitted.pop(url, None)
+        return response
+
+    def commit(self, url: str):
+        """Store url's last fetched 200, now that the caller has validated its body."""
+        response = self._uncommitted.pop(url, None)
+        if response is not None:
+            self.cache.put(url, response)
+
+    def evict(self, url: str):
+        """Forget url's body -- pending or cached -- so the next get() goes to the network."""
+        self._uncommitted.pop(url, None)
+        self.cache.delete(url)
+
+    @staticmethod
+    def _from_entry(entry: dict, cache_status: str) -> CachedResponse:
+        headers = {"content-type": entry["content_type"], "etag": entry["etag"], "last-modified": entry["last_modified"]}
+        return CachedResponse(entry["final_url"], 200, entry["body"], headers, entry["encoding"], cache_status)
+
+    def log_stats(self, label: str):
+        logger.info(
+            f"{label} HTTP cache: {self.stats['fresh']} served fresh, {self.stats['revalidated']} revalidated (304), "
+            f"{self.stats['fetched']} fetched ({self.stats['bytes_received'] / 1e6:.1f} MB)"
+        )
@@ -0,0 +1,122 @@
+"""
+Shared HTTP session factory for the src/_web2br scrapers.
+
+Each scraper used to build the same browser headers inline for every request and pass
+impersonate="chrome124" per call. new_session() returns one AsyncSession carrying both
+as session defaults, sized to the crawl's concurrency, so every page, district probe
+and metadata lookup of a run goes over the same pool of keep-alive connections -- with
+the chrome124 profile that is HTTP/2 (negotiated via ALPN) wherever the server offers
+it, multiplexing concurrent requests over one TLS connection.
+
+The session counts requests, new connections (each one a TCP + TLS handshake, from
+curl's CURLINFO_NUM_CONNECTS) and request latencies, so connection reuse is measurable:
+`session.stats.log("label")`.
+
+Given an AIMDController (src/utils/crawl_engine.py), the session also gates how many
+of its requests are in flight and feeds every status and latency back to it, so all
+coroutines sharing the session slow down together when the site pushes back. Given
+a PageArchive (src/utils/page_archive.py), every response is archived as it arrives.
+"""
+import time
+import statistics
+
+from curl_cffi import CurlInfo
+from curl_cffi import requests
+from curl_cffi.requests import AsyncSession
+
+from src.utils.common_tools import setup_logging
+from src.utils.stage_metrics import METRICS
+logger = setup_logging()
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+# Mimics Chrome 124's TLS/HTTP2 fingerprint -- what gets past batdongsan.com.vn's bot checks.
+IMPERSONATE = "chrome124"
+MAX_CLIENTS = 10
+
+
+class ConnectionStats:
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.latencies = []
+
+    def record(self, response):
+        self.requests += 1
+        self.connections += response.infos.get(CurlInfo.NUM_CONNECTS, 0)
+        self.latencies.append(response.elapsed.total_seconds())
+
+    @property
+    def p50_ms(self) -> float:
+        return statistics.median(self.latencies) * 1000 if self.latencies else 0.0
+
+    def log(self, label: str):
+        logger.info(
+            f"{label} session: {self.requests} requests over {self.connections} new connections "
+            f"(handshakes), p50 latency {self.p50_ms:.0f} ms"
+        )
+
+
+class CountingSession(AsyncSession):
+    """
+    AsyncSession keeping ConnectionStats of everything it sends, optionally under an
+    AIMDController and archiving every response to a PageArchive.
+    """
+
+    def __init__(self, controller=None, archive=None, **kwargs):
+        super().__init__(curl_infos=[CurlInfo.NUM_CONNECTS], **kwargs)
+        self.stats = ConnectionStats()
+        self.controller = controller
+        self.archive = archive
+
+    async def request(self, method, url, *args, **kwargs):
+        response = await self._send(method, url, *args, **kwargs)
+        self.stats.record(response)
+        METRICS.observe("fetch", response.elapsed.total_seconds())
+        METRICS.count("bytes_in", len(response.content))
+        if self.archive is not None:
+            self.archive.put(url, response)
+        return response
+
+    async def _send(self, method, url, *args, **kwargs):
+        if self.controller is None:
+            return await self._transport(method, url, *args, **kwargs)
+        async with self.controller.slot() as window:
+            start = time.monotonic()
+            try:
+                response = await self._transport(method, url, *args, **kwargs)
+            except Exception:
+                self.controller.record(window, None, time.monotonic() - start)
+                raise
+            self.controller.record(window, response.status_code, time.monotonic() - start)
+        return response
+
+    async def _transport(self, method, url, *args, **kwargs):
+        """Actually send the request (ReplaySession answers from recorded pages instead)."""
+        return await super().request(method, url, *args, **kwargs)
+
+
+def new_session(max_clients: int = MAX_CLIENTS, controller=None, archive=None, replay=None, **kwargs) -> CountingSession:
+    """
+    The scrapers' AsyncSession: browser headers and impersonation as defaults, up to
+    `max_clients` requests in flight on a shared connection pool (with a `controller`,
+    up to its current limit), archiving responses to `archive` if given. Keep one per run.
+    With `replay` (a page archive directory) nothing goes to the network: see
+    src/utils/replay_session.py.
+    """
+    if controller is not None:
+        max_clients = max(max_clients, controller.max_concurrency)
+    if replay is not None:
+        from src.utils.replay_session import ReplaySession
+        return ReplaySession(replay, max_clients=max_clients, controller=controller, archive=archive, **kwargs)
+    return CountingSession(headers=HEADERS, impersonate=IMPERSONATE, max_clients=max_clients,
+                           controller=controller, archive=archive, **kwargs)
+
+
+def blocking_get(url: str, **kwargs):
+    """One-off blocking GET with the scrapers' headers and impersonation."""
+    return requests.get(url, headers=HEADERS, impersonate=IMPERSONATE, **kwargs)
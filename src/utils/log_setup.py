@@ -0,0 +1,118 @@
+"""
+Logging configuration shared by every module (via setup_logging()).
+
+A crawl logs a line per page, and the plain StreamHandler formatted and wrote each one
+on the calling thread -- the event loop. Here the root logger gets a QueueHandler that
+only enqueues the record, unformatted; a QueueListener thread formats and writes it.
+Log calls on the hot paths pass their values as arguments (logger.info("... %s", url))
+so no message is even built there.
+
+LOG_FORMAT=json switches the output to JSON lines: time, level, logger, message,
+the run's correlation id, the pipeline step and any `extra={...}` fields. The
+correlation id is RUN_ID from the environment -- run_pipeline sets it, with
+PIPELINE_STEP, for every child process, so all lines of one pipeline run can be
+joined -- or a fresh one, exported for this process's own children.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import sys
+import uuid
+from datetime import datetime, timezone
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" | "json"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+# LogRecord attributes that aren't `extra` fields.
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+def run_id() -> str:
+    """This run's correlation id: RUN_ID if set, else a new one, exported for child processes."""
+    if not os.getenv("RUN_ID"):
+        os.environ["RUN_ID"] = uuid.uuid4().hex[:12]
+    return os.environ["RUN_ID"]
+
+
+class JsonFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__()
+        self.run_id = run_id()
+        self.step = os.getenv("PIPELINE_STEP")
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "run_id": self.run_id,
+            "pid": record.process,
+        }
+        if self.step:
+            entry["step"] = self.step
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener (the stock one formats on the caller)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def new_formatter() -> logging.Formatter:
+    return JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+
+
+def _log_directly():
+    """Replace the queue with a plain handler, e.g. in a forked worker where the listener thread doesn't exist."""
+    global _listener
+    _listener = None
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(new_formatter())
+    logging.getLogger().handlers = [handler]
+
+
+def configure_logging():
+    """Install the root handlers once per process; later calls do nothing."""
+    global _listener
+    root = logging.getLogger()
+    if getattr(root, "_configured_by_log_setup", False):
+        return
+    root._configured_by_log_setup = True
+    root.setLevel(LOG_LEVEL)
+    run_id()
+    if multiprocessing.parent_process() is not None:
+        # Pool workers exit without running atexit, which would drop queued records.
+        _log_directly()
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(new_formatter())
+    log_queue = queue.SimpleQueue()
+    root.handlers = [DeferredQueueHandler(log_queue)]
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    os.register_at_fork(after_in_child=_log_directly)
+
+
+def stop_logging():
+    """Flush whatever is queued (runs at exit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
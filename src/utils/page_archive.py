@@ -0,0 +1,158 @@
+"""
+Append-only archive of fetched pages, for re-parsing without the network.
+
+Raw pages used to be thrown away right after parsing, so a markup change on the site
+or a new field in soup_to_df meant re-scraping everything. With an archive attached
+to the session (new_session(archive=...)), every response is also appended to a
+rolling segment file, WARC-style: one self-describing record per page -- a JSON
+header line (URL, final URL, status, headers, fetch time, body sizes) followed by the
+zstd-compressed body. Segments roll over at SEGMENT_BYTES and are never rewritten;
+each process writes its own, so parallel scrapers can share an archive directory.
+
+An SQLite index (index.sqlite) maps every record to (segment, offset, length) for
+lookups by URL. It is a convenience: segments can be read front to back without it
+(iter_segment), which is what src/_web2br/reparse_archive.py does, one segment per core.
+
+zstd comes from pyarrow (already needed for the row spool), not an extra package.
+"""
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pyarrow as pa
+
+ARCHIVE_DIR = "data/archive"
+SEGMENT_BYTES = 256 * 1024 * 1024
+RECORD_MAGIC = b"ARCHIVE/1 "
+INDEX_FILE = "index.sqlite"
+
+
+def _compress(body: bytes) -> bytes:
+    return pa.compress(body, codec="zstd", asbytes=True)
+
+
+def _decompress(data: bytes, raw_length: int) -> bytes:
+    return pa.decompress(data, decompressed_size=raw_length, codec="zstd", asbytes=True)
+
+
+class ArchivedPage:
+    """One archived response; quacks like the parts of a curl_cffi Response the scrapers use."""
+
+    def __init__(self, header: dict, content: bytes):
+        self.url = header["final_url"]
+        self.requested_url = header["url"]
+        self.status_code = header["status"]
+        self.headers = header["headers"]
+        self.encoding = header.get("encoding")
+        self.fetched_at = header["fetched_at"]
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class PageArchive:
+
+    def __init__(self, archive_dir=ARCHIVE_DIR, segment_bytes: int = SEGMENT_BYTES):
+        self.archive_dir = Path(archive_dir)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        # Shared by every scraper process writing to this directory.
+        self.conn = sqlite3.connect(self.archive_dir / INDEX_FILE, timeout=30)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                status INTEGER,
+                fetched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_url ON pages (url, fetched_at);
+        """)
+        self.conn.commit()
+        run = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self._segment_prefix = f"segment-{run}-{os.getpid()}"
+        self._segment_seq = 0
+        self._segment = None
+        self.pages_written = 0
+        self.bytes_written = 0
+
+    def _segment_file(self):
+        if self._segment is not None and self._segment.tell() >= self.segment_bytes:
+            self._segment.close()
+            self._segment = None
+            self._segment_seq += 1
+        if self._segment is None:
+            path = self.archive_dir / f"{self._segment_prefix}-{self._segment_seq:05d}.arc"
+            self._segment = open(path, "ab")
+        return self._segment
+
+    def put(self, url: str, response):
+        """Append `response` (fetched for `url`) as one record and index it."""
+        body = _compress(response.content)
+        header = {
+            "url": url, "final_url": str(response.url), "status": response.status_code,
+            "headers": dict(response.headers), "encoding": response.encoding,
+            "fetched_at": time.time(), "length": len(body), "raw_length": len(response.content),
+        }
+        record = RECORD_MAGIC + json.dumps(header).encode("utf-8") + b"\n" + body + b"\n"
+        segment = self._segment_file()
+        offset = segment.tell()
+        segment.write(record)
+        segment.flush()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (url, Path(segment.name).name, offset, len(record), header["status"], header["fetched_at"]),
+            )
+        self.pages_written += 1
+        self.bytes_written += len(record)
+
+    def get(self, url: str) -> ArchivedPage | None:
+        """The latest archived response for `url`, or None."""
+        row = self.conn.execute(
+            "SELECT segment, offset, length FROM pages WHERE url = ? ORDER BY fetched_at DESC LIMIT 1", (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        segment, offset, length = row
+        with open(self.archive_dir / segment, "rb") as f:
+            f.seek(offset)
+            return _read_record(f)
+
+    def segment_paths(self) -> list[Path]:
+        return sorted(self.archive_dir.glob("segment-*.arc"))
+
+    def close(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        self.conn.close()
+
+
+def _read_record(f) -> ArchivedPage | None:
+    line = f.readline()
+    if not line:
+        return None
+    if not line.startswith(RECORD_MAGIC):
+        raise ValueError(f"Corrupt archive record at offset {f.tell() - len(line)} of {f.name}")
+    header = json.loads(line[len(RECORD_MAGIC):])
+    body = f.read(header["length"] + 1)[:-1]
+    if len(body) < header["length"]:
+        return None  # torn write at the end of a segment (crashed run)
+    return ArchivedPage(header, _decompress(body, header["raw_length"]))
+
+
+def iter_segment(path):
+    """Every record of one segment file, in write order."""
+    with open(path, "rb") as f:
+        while (page := _read_record(f)) is not None:
+            yield page
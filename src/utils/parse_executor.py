@@ -0,0 +1,63 @@
+"""
+Parse executors for the src/_web2br scrapers.
+
+BeautifulSoup parsing is pure-Python CPU work: run inline inside the fetch coroutine
+it serialises on one core and blocks every in-flight request while it runs. Scrapers
+instead ship the raw page bytes to a worker (process pool sized to the cores by
+default, thread pool as fallback where processes aren't available) and get compact
+row records back, so the event loop only ever waits on network I/O.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from src.utils.common_tools import setup_logging
+from src.utils.stage_metrics import METRICS, merge_collected, submit_collecting
+logger = setup_logging()
+
+PARSE_EXECUTORS = ["process", "thread", "inline"]
+
+
+@contextmanager
+def parse_executor(kind: str = "process", max_workers: int | None = None):
+    """
+    Yield an executor for run_parse(): "process" (default), "thread", or "inline"
+    (yields None -- parse directly on the event loop, the old behaviour). Falls back
+    from "process" to "thread" if a process pool can't be created (e.g. no
+    /dev/shm in a sandbox).
+    """
+    if kind not in PARSE_EXECUTORS:
+        raise ValueError(f"Unknown parse executor '{kind}', expected one of {PARSE_EXECUTORS}")
+    if kind == "inline":
+        yield None
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    executor = None
+    if kind == "process":
+        try:
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"Process pool unavailable ({e}), falling back to a thread pool for parsing.")
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    logger.info(f"Parsing on {type(executor).__name__} with {max_workers} workers")
+    try:
+        yield executor
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def run_parse(executor, fn, *args):
+    """
+    Run fn(*args) on executor (must be picklable for a process pool), or inline if None,
+    timed as the "parse" stage; stage metrics fn records on a worker process are merged back.
+    """
+    with METRICS.timer("parse"):
+        if executor is None:
+            return fn(*args)
+        call, call_args = submit_collecting(executor, fn, *args)
+        result = await asyncio.get_running_loop().run_in_executor(executor, call, *call_args)
+        return merge_collected(executor, result)
@@ -0,0 +1,100 @@
+"""
+Offline replay of recorded pages through the scrapers' session layer.
+
+There was no way to run a scraper without hitting batdongsan.com.vn, so a performance
+change could never be measured twice under the same conditions. A ReplaySession is a
+CountingSession whose transport answers from a page archive (src/utils/page_archive.py,
+recorded with a scraper's --archive) instead of the network: the whole fetch -> parse
+-> spool path runs as usual -- AIMD controller, stats and all -- without a socket.
+
+Recorded pages can be served with simulated network conditions, set by environment:
+    REPLAY_LATENCY_MS     base latency per response (default 0)
+    REPLAY_JITTER_MS      +/- uniform jitter around it (default 0)
+    REPLAY_ERROR_RATE     share of responses replaced by an error (default 0)
+    REPLAY_ERROR_STATUS   status of those errors (default 503)
+    REPLAY_SEED           seed (default 0)
+Jitter and errors are drawn per (URL, attempt), so a replay injects the same errors
+into the same requests however the crawl's scheduling interleaves them. A URL missing
+from the archive is answered 404.
+"""
+import asyncio
+import os
+import random
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+
+from src.utils.common_tools import setup_logging
+from src.utils.http_session import CountingSession
+from src.utils.page_archive import INDEX_FILE, ArchivedPage, PageArchive
+logger = setup_logging()
+
+REPLAY_LATENCY_MS = float(os.getenv("REPLAY_LATENCY_MS", 0))
+REPLAY_JITTER_MS = float(os.getenv("REPLAY_JITTER_MS", 0))
+REPLAY_ERROR_RATE = float(os.getenv("REPLAY_ERROR_RATE", 0))
+REPLAY_ERROR_STATUS = int(os.getenv("REPLAY_ERROR_STATUS", 503))
+REPLAY_SEED = int(os.getenv("REPLAY_SEED", 0))
+
+
+class ReplayResponse(ArchivedPage):
+    """An archived page (or a synthesized 404/error) as a replayed response."""
+
+    def __init__(self, header: dict, content: bytes, elapsed: float):
+        super().__init__(header, content)
+        self.elapsed = timedelta(seconds=elapsed)
+        self.infos = {}  # no connections were made
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code} for {self.url} (replayed)")
+
+
+class ReplaySession(CountingSession):
+
+    def __init__(self, archive_dir, latency_ms: float = REPLAY_LATENCY_MS, jitter_ms: float = REPLAY_JITTER_MS,
+                 error_rate: float = REPLAY_ERROR_RATE, error_status: int = REPLAY_ERROR_STATUS,
+                 seed: int = REPLAY_SEED, **kwargs):
+        if not (Path(archive_dir) / INDEX_FILE).exists():
+            raise FileNotFoundError(f"No page archive to replay at {archive_dir}")
+        super().__init__(**kwargs)
+        self.recorded = PageArchive(archive_dir)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.seed = seed
+        self.replay_stats = Counter()
+        self._attempts = Counter()
+
+    async def _transport(self, method, url, *args, **kwargs):
+        self._attempts[url] += 1
+        rng = random.Random(f"{self.seed}:{url}:{self._attempts[url]}")
+        delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        if rng.random() < self.error_rate:
+            self.replay_stats["injected_errors"] += 1
+            return self._synthesized(url, self.error_status, delay)
+        page = self.recorded.get(url)
+        if page is None:
+            self.replay_stats["missing"] += 1
+            return self._synthesized(url, 404, delay)
+        self.replay_stats["replayed"] += 1
+        header = {
+            "url": page.requested_url, "final_url": page.url, "status": page.status_code,
+            "headers": page.headers, "encoding": page.encoding, "fetched_at": page.fetched_at,
+        }
+        return ReplayResponse(header, page.content, delay)
+
+    @staticmethod
+    def _synthesized(url: str, status: int, elapsed: float) -> ReplayResponse:
+        header = {"url": url, "final_url": url, "status": status, "headers": {}, "encoding": "utf-8", "fetched_at": 0}
+        return ReplayResponse(header, b"", elapsed)
+
+    async def close(self):
+        logger.info(
+            f"Replay: {self.replay_stats['replayed']} pages served from the archive, "
+            f"{self.replay_stats['missing']} not recorded (404), {self.replay_stats['injected_errors']} injected errors"
+        )
+        self.recorded.close()
+        await super().close()
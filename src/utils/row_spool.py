@@ -0,0 +1,154 @@
+"""
+On-disk columnar spool for scraped rows.
+
+Scrapers used to grow one DataFrame with pd.concat per page (quadratic copying) and
+hold every district's frames in memory until a single upload at the end. A RowSpool
+instead takes each page's row records as it completes, buffers at most `flush_rows`
+of them, and writes each full buffer out as one Parquet part file -- memory stays
+bounded by the buffer, and the uploader reads the parts back at the end.
+
+Pages don't all carry the same columns (tracking fields vary), so parts are written
+with their own schema and unified on read (unified_schema): a column some parts
+typed differently -- a tracking field that's a number on one page and text on
+another -- is read back as string rather than failing the end-of-run load. Each
+append can carry a key (the page URL); `on_flush(part_path, keys)` is called after
+every flush with the keys whose rows just became durable -- the hook crawl
+checkpoints hang off (src/utils/crawl_checkpoint.py), and streaming bronze writes
+after them (src/utils/bronze_stream.py). With `flush_seconds` a buffer is also
+flushed once its oldest row has waited that long. Uploaders read the parts back one
+at a time with iter_parts/iter_tables.
+"""
+import shutil
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.utils.common_tools import setup_logging
+from src.utils.stage_metrics import METRICS
+logger = setup_logging()
+
+FLUSH_ROWS = 5000
+
+
+class RowSpool:
+
+    def __init__(self, spool_dir, flush_rows: int = FLUSH_ROWS, on_flush=None, flush_seconds: float | None = None):
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.on_flush = on_flush
+        self.rows_spooled = 0
+        self.buffer_started = None  # time.monotonic() of the oldest buffered row
+        self._buffer = []
+        self._pending_keys = []
+        self._part_seq = self._next_part_seq()
+
+    def _next_part_seq(self) -> int:
+        parts = self.part_paths()
+        return int(parts[-1].stem.split("-")[1]) + 1 if parts else 0
+
+    def append(self, rows: list[dict], key: str | None = None, **columns):
+        """
+        Buffer one batch of row records, adding `columns` as constant values to every
+        row. `key` (may have no rows) is handed to on_flush once the rows are on disk.
+        """
+        with METRICS.timer("spool"):
+            if columns:
+                rows = [{**row, **columns} for row in rows]
+            if rows and self.buffer_started is None:
+                self.buffer_started = time.monotonic()
+            self._buffer.extend(rows)
+            self.rows_spooled += len(rows)
+            METRICS.count("rows_out", len(rows))
+            if key is not None:
+                self._pending_keys.append(key)
+            if len(self._buffer) >= self.flush_rows or self._buffer_expired():
+                self.flush()
+
+    def _buffer_expired(self) -> bool:
+        return (
+            self.flush_seconds is not None and self.buffer_started is not None
+            and time.monotonic() - self.buffer_started >= self.flush_seconds
+        )
+
+    def flush(self):
+        """Write the buffered rows out as the next Parquet part file, then call on_flush."""
+        if not self._buffer and not self._pending_keys:
+            return None
+        path = None
+        if self._buffer:
+            table = pa.Table.from_pandas(pd.DataFrame(self._buffer), preserve_index=False)
+            path = self.spool_dir / f"part-{self._part_seq:05d}.parquet"
+            # Write-then-rename so a crash mid-write never leaves a truncated part behind.
+            tmp_path = path.with_suffix(".parquet.tmp")
+            pq.write_table(table, tmp_path, compression="zstd")
+            tmp_path.replace(path)
+            self._part_seq += 1
+        if self.on_flush is not None:
+            self.on_flush(path, self._pending_keys)
+        self._buffer = []
+        self._pending_keys = []
+        self.buffer_started = None
+        return path
+
+    def part_paths(self) -> list[Path]:
+        return sorted(self.spool_dir.glob("part-*.parquet"))
+
+    def discard_parts(self, keep: set[str]):
+        """Delete every part file whose name isn't in `keep` (e.g. parts a crashed run never committed)."""
+        for path in self.part_paths():
+            if path.name not in keep:
+                path.unlink()
+
+    def unified_schema(self) -> pa.Schema | None:
+        """Every part's columns in first-seen order; types parts disagree on become float64 (all numeric) or string."""
+        types = {}
+        for path in self.part_paths():
+            for field in pq.read_schema(path):
+                types.setdefault(field.name, set()).add(field.type)
+        fields = []
+        for name, seen in types.items():
+            seen.discard(pa.null())
+            if len(seen) <= 1:
+                field_type = seen.pop() if seen else pa.null()
+            elif all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in seen):
+                field_type = pa.float64()
+            else:
+                field_type = pa.string()
+            fields.append(pa.field(name, field_type))
+        return pa.schema(fields) if fields else None
+
+    def iter_parts(self):
+        """(part path, its rows as an Arrow table in unified_schema()) for each part, one at a time (flushes first)."""
+        self.flush()
+        schema = self.unified_schema()
+        for path in self.part_paths():
+            table = pq.read_table(path)
+            yield path, pa.table([
+                table.column(field.name).cast(field.type) if field.name in table.column_names
+                else pa.nulls(table.num_rows, field.type)
+                for field in schema
+            ], schema=schema)
+
+    def iter_tables(self):
+        """Each part as an Arrow table in unified_schema(), one at a time (flushes first)."""
+        for _, table in self.iter_parts():
+            yield table
+
+    def to_arrow(self) -> pa.Table | None:
+        """All spooled rows as one Arrow table (flushes first); None if nothing was spooled."""
+        tables = list(self.iter_tables())
+        if not tables:
+            return None
+        return pa.concat_tables(tables)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        table = self.to_arrow()
+        return table.to_pandas() if table is not None else pd.DataFrame()
+
+    def cleanup(self):
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
@@ -0,0 +1,113 @@
+"""
+Local index of already-scraped listings, for incremental re-crawls.
+
+Every weekly run used to refetch every /pN page of every district although most
+listings were appended to bronze the week before (and stg_real_estate dedups them by
+product_id anyway). A SeenIndex remembers, per product_id, a fingerprint of the fields
+whose change makes a listing worth re-scraping (price, area). Listing pages are sorted
+newest-first, so once a page is mostly listings we already have, unchanged, the rest
+of that district is too -- ListingCrawler's stop_page hook ends pagination there.
+
+The same index keeps each listing's last row_hash -- a content fingerprint computed at
+scrape time over CONTENT_FIELDS -- so a run can append only new or changed rows to
+bronze instead of the full inventory every week (see classify_rows).
+
+The index is only updated after a successful bronze upload, so a crashed or failed run
+never marks listings as seen that never reached BigQuery.
+"""
+import hashlib
+import sqlite3
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+SEEN_FIELDS = ["price", "area"]
+# Everything about a listing that a re-scrape should pick up as a change. Leaves out
+# per-scrape noise such as the tracking pageId.
+CONTENT_FIELDS = [
+    "title", "verify", "link", "price", "area", "price_per_m2", "bedrooms", "toilets",
+    "location", "description", "agent_name", "phone",
+    "verified", "vipType", "expired", "cateId", "projectId", "districtId", "wardId", "streetId",
+]
+# A page counts as "already known" from this share of known, unchanged rows up: the
+# odd new or re-priced listing (or a bumped VIP card) doesn't keep pagination going.
+KNOWN_PAGE_RATIO = 0.8
+
+
+def fingerprint(record: dict, fields: list[str] = SEEN_FIELDS) -> str:
+    """Short stable hash of record's `fields` (missing fields hash as None)."""
+    payload = "\x1f".join(str(record.get(field)) for field in fields)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class SeenIndex:
+
+    def __init__(self, path, fields: list[str] = SEEN_FIELDS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fields = fields
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS seen (
+                product_id TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                row_hash TEXT
+            );
+        """)
+        columns = {name for _, name, *_ in self.conn.execute("PRAGMA table_info(seen)")}
+        if "row_hash" not in columns:  # index created before row hashes were kept
+            self.conn.execute("ALTER TABLE seen ADD COLUMN row_hash TEXT")
+        self.conn.commit()
+        # Loaded once: lookups happen for every row of every page on the event loop.
+        self._fingerprints = {}
+        self._row_hashes = {}
+        for product_id, fp, row_hash in self.conn.execute("SELECT product_id, fingerprint, row_hash FROM seen"):
+            self._fingerprints[product_id] = fp
+            self._row_hashes[product_id] = row_hash
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def is_known(self, record: dict) -> bool:
+        """True if record's product_id is indexed with the same fingerprint."""
+        known = self._fingerprints.get(str(record.get("product_id")))
+        return known is not None and known == fingerprint(record, self.fields)
+
+    def is_known_page(self, records: list[dict], ratio: float = KNOWN_PAGE_RATIO) -> bool:
+        """ListingCrawler stop_page hook: True once at least `ratio` of a page's rows are known."""
+        if not records:
+            return False
+        known = sum(1 for record in records if self.is_known(record))
+        return known >= ratio * len(records)
+
+    def classify_rows(self, records: list[dict]) -> tuple[list[bool], Counter]:
+        """
+        Compare each record's row_hash with the indexed one. Returns (emit mask: True
+        for new/changed rows, Counter of "new"/"changed"/"unchanged").
+        """
+        mask, counts = [], Counter()
+        for record in records:
+            known = self._row_hashes.get(str(record.get("product_id")))
+            status = "new" if known is None else "unchanged" if known == record.get("row_hash") else "changed"
+            counts[status] += 1
+            mask.append(status != "unchanged")
+        return mask, counts
+
+    def update(self, records):
+        """Record (or refresh) the fingerprint and row_hash of every record, e.g. once its rows are uploaded."""
+        now = datetime.now(timezone.utc).isoformat()
+        rows = [
+            (str(record["product_id"]), fingerprint(record, self.fields), now, record.get("row_hash"))
+            for record in records if record.get("product_id") is not None
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO seen (product_id, fingerprint, last_seen, row_hash) VALUES (?, ?, ?, ?)", rows,
+            )
+        for product_id, fp, _, row_hash in rows:
+            self._fingerprints[product_id] = fp
+            self._row_hashes[product_id] = row_hash
+
+    def close(self):
+        self.conn.close()
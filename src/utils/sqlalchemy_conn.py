@@ -12,15 +12,14 @@ from sqlalchemy import literal_column
 from sqlalchemy import inspect
 import pandas as pd
 from dotenv import load_dotenv, find_dotenv
+
+from src.utils.log_setup import configure_logging
+
 load_dotenv(find_dotenv())
 print(f"DEBUG: Project Root .env found at: {find_dotenv()}")
 
 def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s %(levelname)s %(message)s',
-        handlers=[logging.StreamHandler()]
-    )
+    configure_logging()
     return logging.getLogger(__name__)
 logger = setup_logging()
 
@@ -0,0 +1,196 @@
+"""
+Per-stage timers and counters for the scrapers, summarized once per run.
+
+A slow run used to leave nothing but one "Success!" log line per page, so there was no
+telling whether the time went to the network, parsing, the tracking merge or the
+upload. The scrapers record into the process-wide METRICS as they go:
+
+    with METRICS.timer("merge"):
+        records = merge_listing_with_tracking_data(rows, tracking)
+    METRICS.count("bytes_in", len(response.content))
+
+Stages in use: fetch (per response, from the session), parse (per page, as the crawl
+waits for it, process-pool round trip included), html_parse / tracking / merge (inside
+parse_page), spool and upload. Counters: pages_fetched, bytes_in, rows_out, retries,
+failed_pages, rows_uploaded.
+
+At the end of a run write_run_metrics() writes the summary -- count, total and
+p50/p95/p99 per stage, plus a histogram so summaries of several runs can be merged
+(run_pipeline does that across its steps) -- as JSON, and optionally in Prometheus
+text exposition format. Where it goes is set by environment:
+    METRICS_FILE             JSON summary path (default data/metrics/<run>-<time>.json)
+    METRICS_PROMETHEUS_FILE  also write Prometheus text format there
+"""
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+METRICS_DIR = "data/metrics"
+# Upper bounds (seconds) of the histogram buckets kept per stage, Prometheus-style.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, float("inf"))
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def bucket_percentile(buckets: list[int], q: float) -> float:
+    """Upper bound of the bucket holding the q-th observation (for merged histograms)."""
+    total = buckets[-1] if buckets else 0
+    for bound, cumulative in zip(BUCKETS, buckets):
+        if total and cumulative >= q * total:
+            return bound if bound != float("inf") else BUCKETS[-2]
+    return 0.0
+
+
+class StageMetrics:
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.counters = Counter()
+        self.started = time.time()
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[stage].append(time.perf_counter() - start)
+
+    def observe(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def drain(self) -> dict:
+        """Everything recorded since the last drain, cleared (shipped back from parse workers)."""
+        observations = {"samples": dict(self.samples), "counters": dict(self.counters)}
+        self.samples = defaultdict(list)
+        self.counters = Counter()
+        return observations
+
+    def merge(self, observations: dict):
+        for stage, values in observations["samples"].items():
+            self.samples[stage].extend(values)
+        self.counters.update(observations["counters"])
+
+    def summary(self, run: str | None = None) -> dict:
+        stages = {}
+        for stage, values in self.samples.items():
+            ordered = sorted(values)
+            stages[stage] = {
+                "count": len(ordered), "total_seconds": sum(ordered),
+                "p50_ms": percentile(ordered, 0.50) * 1000, "p95_ms": percentile(ordered, 0.95) * 1000,
+                "p99_ms": percentile(ordered, 0.99) * 1000, "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+                "buckets": [sum(1 for v in ordered if v <= bound) for bound in BUCKETS],
+            }
+        return {
+            "run": run, "started_at": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            "wall_seconds": time.time() - self.started, "stages": stages, "counters": dict(self.counters),
+        }
+
+
+METRICS = StageMetrics()
+
+
+def call_collecting(fn, *args):
+    """Run fn(*args) on a worker process; return its result and the metrics it recorded there."""
+    METRICS.drain()
+    result = fn(*args)
+    return result, METRICS.drain()
+
+
+def submit_collecting(executor, fn, *args):
+    """
+    run_in_executor-ready callable for fn(*args): on a process pool its worker-side
+    metrics come back with the result (merge_collected), elsewhere they're recorded
+    directly into METRICS.
+    """
+    if isinstance(executor, ProcessPoolExecutor):
+        return call_collecting, (fn, *args)
+    return fn, args
+
+
+def merge_collected(executor, result):
+    if isinstance(executor, ProcessPoolExecutor):
+        result, observations = result
+        METRICS.merge(observations)
+    return result
+
+
+def merge_summaries(summaries: list[dict], run: str | None = None) -> dict:
+    """One summary for several runs: counts, totals, counters and histograms add up; percentiles come from the histograms."""
+    stages, counters = {}, Counter()
+    for summary in summaries:
+        counters.update(summary["counters"])
+        for stage, s in summary["stages"].items():
+            merged = stages.setdefault(stage, {"count": 0, "total_seconds": 0.0, "max_ms": 0.0, "buckets": [0] * len(BUCKETS)})
+            merged["count"] += s["count"]
+            merged["total_seconds"] += s["total_seconds"]
+            merged["max_ms"] = max(merged["max_ms"], s["max_ms"])
+            merged["buckets"] = [a + b for a, b in zip(merged["buckets"], s["buckets"])]
+    for merged in stages.values():
+        for q in (50, 95, 99):
+            merged[f"p{q}_ms"] = bucket_percentile(merged["buckets"], q / 100) * 1000
+    return {
+        "run": run, "wall_seconds": max((s["wall_seconds"] for s in summaries), default=0.0),
+        "stages": stages, "counters": dict(counters),
+    }
+
+
+def to_prometheus(summary: dict, prefix: str = "scraper") -> str:
+    """Summary as Prometheus text exposition: one histogram per stage, one gauge per counter."""
+    run = summary.get("run") or ""
+    lines = [f"# TYPE {prefix}_stage_seconds histogram"]
+    for stage, s in sorted(summary["stages"].items()):
+        labels = f'run="{run}",stage="{stage}"'
+        for bound, cumulative in zip(BUCKETS, s["buckets"]):
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{prefix}_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{prefix}_stage_seconds_sum{{{labels}}} {s['total_seconds']}")
+        lines.append(f"{prefix}_stage_seconds_count{{{labels}}} {s['count']}")
+    for name, value in sorted(summary["counters"].items()):
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f'{prefix}_{name}{{run="{run}"}} {value}')
+    lines.append(f"# TYPE {prefix}_wall_seconds gauge")
+    lines.append(f'{prefix}_wall_seconds{{run="{run}"}} {summary["wall_seconds"]}')
+    return "\n".join(lines) + "\n"
+
+
+def log_summary(logger, summary: dict):
+    for stage, s in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        logger.info(
+            f"stage {stage:<11} n={s['count']:<7} total {s['total_seconds']:>8.1f}s  "
+            f"p50 {s['p50_ms']:>7.1f} ms  p95 {s['p95_ms']:>7.1f} ms  p99 {s['p99_ms']:>7.1f} ms"
+        )
+    logger.info("counters: " + ", ".join(f"{name}={value}" for name, value in sorted(summary["counters"].items())))
+
+
+def write_summary(summary: dict, path, prometheus_path=None):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(summary, indent=2))
+    if prometheus_path:
+        Path(prometheus_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(prometheus_path).write_text(to_prometheus(summary))
+
+
+def write_run_metrics(run: str, logger=None) -> dict:
+    """Summarize METRICS for this run, log it and write it where METRICS_FILE / METRICS_PROMETHEUS_FILE say."""
+    summary = METRICS.summary(run)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.getenv("METRICS_FILE") or os.path.join(METRICS_DIR, f"{run}-{stamp}.json")
+    write_summary(summary, path, os.getenv("METRICS_PROMETHEUS_FILE"))
+    if logger is not None:
+        log_summary(logger, summary)
+        logger.info(f"Run metrics written to {path}")
+    return summary
@@ -0,0 +1,67 @@
+"""
+Extractor for batdongsan.com.vn's window.pageTrackingData, working on the raw response
+bytes.
+
+The payload is an inline `window.pageTrackingData = JSON.parse('{...}')` script. Instead
+of building a DOM and walking every <script> for it, find the marker with a plain byte
+search, cut out the JSON.parse('...') argument, decode it with orjson when installed
+(stdlib json otherwise) and yield one flat record per product -- nested objects
+flattened with "." the way pd.json_normalize did, without building a DataFrame per page.
+"""
+import json
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+TRACKING_MARKER = b"window.pageTrackingData"
+PAYLOAD_PREFIX = b"JSON.parse('"
+PAYLOAD_SUFFIX = b"')"
+
+
+def find_tracking_payload(content: bytes) -> bytes | None:
+    """
+    Raw `{...}` argument of the JSON.parse('...') call following the tracking marker,
+    or None if the page has none. Ends at the first "}')" -- same as the non-greedy
+    regex this replaces.
+    """
+    marker_at = content.find(TRACKING_MARKER)
+    if marker_at == -1:
+        return None
+    prefix_at = content.find(PAYLOAD_PREFIX, marker_at)
+    if prefix_at == -1:
+        return None
+    start = prefix_at + len(PAYLOAD_PREFIX)
+    if content[start:start + 1] != b"{":
+        return None
+    end = content.find(b"}" + PAYLOAD_SUFFIX, start)
+    if end == -1:
+        return None
+    return content[start:end + 1]
+
+
+def flatten_record(record: dict, prefix: str = "") -> dict:
+    """Flatten nested dicts into "parent.child" keys (pd.json_normalize's default)."""
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def iter_tracking_records(content: bytes, encoding: str = "utf-8"):
+    """Yield one flat record per entry of pageTrackingData.products in a raw page."""
+    payload = find_tracking_payload(content)
+    if payload is None:
+        return
+    if encoding.lower().replace("-", "") != "utf8":
+        payload = payload.decode(encoding).encode("utf-8")
+    # The payload sits inside a single-quoted JS string literal.
+    payload = payload.replace(b"\\'", b"'").replace(b'\\"', b'"')
+    for product in _json_loads(payload).get("products") or []:
+        yield flatten_record(product)
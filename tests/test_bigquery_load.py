@@ -0,0 +1,107 @@
+"""
+load_arrow_to_bigquery (src/utils/gcp_conn.py) against an in-memory stand-in for
+bigquery.Client: a WRITE_TRUNCATE of several chunks only touches the target through
+one copy job, and columns are checked against the live table before any job runs.
+"""
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from src.utils.gcp_conn import LOAD_STAGING_SUFFIX, load_arrow_to_bigquery
+
+WARDS_ID = "proj.re_bronze.m_wards_v2"
+
+
+class FakeJob:
+
+    def __init__(self, output_rows: int = 0):
+        self.output_rows = output_rows
+
+    def result(self):
+        return self
+
+
+class FakeClient:
+    """Records every job; load jobs whose table is in `fail_loads_into` raise."""
+
+    def __init__(self, tables: dict | None = None, fail_loads_into=()):
+        self.tables = dict(tables or {})
+        self.fail_loads_into = set(fail_loads_into)
+        self.jobs = []
+
+    def get_table(self, table_id):
+        if table_id not in self.tables:
+            raise NotFound(f"Table {table_id} not found")
+        return self.tables[table_id]
+
+    def create_table(self, table, exists_ok=False):
+        return self.tables.setdefault(str(table.reference), table)
+
+    def delete_table(self, table_id, not_found_ok=False):
+        self.jobs.append(("delete", table_id, None))
+        self.tables.pop(table_id, None)
+
+    def copy_table(self, source, destination, job_config=None):
+        self.jobs.append(("copy", destination, job_config.write_disposition))
+        return FakeJob()
+
+    def load_table_from_file(self, file_obj, table_id, job_config=None):
+        if table_id in self.fail_loads_into:
+            raise RuntimeError(f"load into {table_id} failed")
+        self.jobs.append(("load", table_id, job_config.write_disposition))
+        return FakeJob(pq.read_metadata(file_obj).num_rows)
+
+
+def wards(rows: int) -> pa.Table:
+    return pa.table({
+        "wardId": list(range(rows)), "name": [f"Phường {i}" for i in range(rows)],
+        "prefix": ["Phường"] * rows, "cityCode": ["SG"] * rows,
+    })
+
+
+def existing_wards(ward_id_type: str = "INTEGER") -> bigquery.Table:
+    return bigquery.Table(WARDS_ID, schema=[
+        bigquery.SchemaField("wardId", ward_id_type), bigquery.SchemaField("name", "STRING"),
+        bigquery.SchemaField("prefix", "STRING"), bigquery.SchemaField("cityCode", "STRING"),
+    ])
+
+
+def test_truncate_of_one_chunk_is_one_job():
+    client = FakeClient({WARDS_ID: existing_wards()})
+    assert load_arrow_to_bigquery(client, wards(10), WARDS_ID, write_disposition="WRITE_TRUNCATE", chunk_rows=100) == 10
+    assert client.jobs == [("load", WARDS_ID, "WRITE_TRUNCATE")]
+
+
+def test_truncate_of_several_chunks_replaces_through_staging():
+    client = FakeClient({WARDS_ID: existing_wards()})
+    staging_id = WARDS_ID + LOAD_STAGING_SUFFIX
+    assert load_arrow_to_bigquery(client, wards(10), WARDS_ID, write_disposition="WRITE_TRUNCATE", chunk_rows=3) == 10
+    loads = [job for job in client.jobs if job[0] == "load"]
+    assert loads == [("load", staging_id, "WRITE_APPEND")] * 4
+    assert [job for job in client.jobs if job[1] == WARDS_ID] == [("copy", WARDS_ID, "WRITE_TRUNCATE")]
+    assert client.jobs[-1] == ("delete", staging_id, None)
+
+
+def test_failed_truncate_leaves_the_table_alone():
+    client = FakeClient({WARDS_ID: existing_wards()}, fail_loads_into={WARDS_ID + LOAD_STAGING_SUFFIX})
+    with pytest.raises(RuntimeError):
+        load_arrow_to_bigquery(client, wards(10), WARDS_ID, write_disposition="WRITE_TRUNCATE", chunk_rows=3)
+    assert [job for job in client.jobs if job[1] == WARDS_ID] == []
+    assert client.jobs[-1] == ("delete", WARDS_ID + LOAD_STAGING_SUFFIX, None)
+
+
+def test_type_mismatch_with_live_table_fails_before_loading():
+    client = FakeClient({WARDS_ID: existing_wards("STRING")})
+    with pytest.raises(ValueError, match="wardId"):
+        load_arrow_to_bigquery(client, wards(10), WARDS_ID, write_disposition="WRITE_TRUNCATE")
+    assert client.jobs == []
+
+
+def test_column_without_bigquery_type_fails_before_loading():
+    client = FakeClient()
+    table = pa.table({"id": [1, 2], "tags": pa.array([[1], [2, 3]], type=pa.list_(pa.int64()))})
+    with pytest.raises(ValueError, match="tags"):
+        load_arrow_to_bigquery(client, table, "proj.other.lookup")
+    assert client.jobs == []
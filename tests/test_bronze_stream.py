@@ -0,0 +1,172 @@
+"""
+Offsets and exactly-once appends of BronzeStreamWriter (src/utils/bronze_stream.py)
+through BigQueryWriteSink, with a fake Storage Write API client that keeps the stream's
+rows in memory and answers appends the way the service does: ALREADY_EXISTS for an
+offset already written, OUT_OF_RANGE past the end. Also checks that every bronze
+column the dbt staging models read is declared, since streaming drops the others.
+"""
+import re
+from pathlib import Path
+from types import SimpleNamespace
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from google.api_core import exceptions
+
+from src.utils.bronze_schemas import LISTING_SCHEMA
+from src.utils.bronze_stream import BigQueryWriteSink, BronzeStreamWriter, OffsetOutOfRange
+from src.utils.crawl_checkpoint import open_checkpointed_spool
+
+TABLE_ID = "proj.re_bronze.real_estate"
+STAGING_MODELS = Path(__file__).parents[1] / "dbt" / "models" / "staging"
+
+
+class FakeTypes:
+    """The bigquery_storage_v1.types the sink builds requests from."""
+
+    class AppendRowsRequest(SimpleNamespace):
+        ArrowData = SimpleNamespace
+
+    ArrowSchema = SimpleNamespace
+    ArrowRecordBatch = SimpleNamespace
+
+    class WriteStream(SimpleNamespace):
+        Type = SimpleNamespace(COMMITTED="COMMITTED")
+
+
+class FakeWriteClient:
+    """
+    In-memory BigQueryWriteClient. `lose_acks` appends are written but their response
+    is lost (a transport error), as when the connection drops after the server commits.
+    """
+
+    def __init__(self, lose_acks: int = 0):
+        self.rows = []
+        self.offsets = []
+        self.lose_acks = lose_acks
+        self.finalized = False
+
+    def table_path(self, project, dataset, table):
+        return f"projects/{project}/datasets/{dataset}/tables/{table}"
+
+    def create_write_stream(self, parent, write_stream):
+        return SimpleNamespace(name=f"{parent}/streams/s1")
+
+    def append_rows(self, requests):
+        for request in requests:
+            schema = pa.ipc.read_schema(pa.py_buffer(request.arrow_rows.writer_schema.serialized_schema))
+            batch = pa.ipc.read_record_batch(pa.py_buffer(request.arrow_rows.rows.serialized_record_batch), schema)
+            if request.offset < len(self.rows):
+                yield SimpleNamespace(error=SimpleNamespace(code=6, message=f"offset {request.offset} already written"))
+                continue
+            if request.offset > len(self.rows):
+                yield SimpleNamespace(error=SimpleNamespace(code=11, message=f"offset {request.offset} past the end"))
+                continue
+            self.rows.extend(batch.to_pylist())
+            self.offsets.append(request.offset)
+            if self.lose_acks:
+                self.lose_acks -= 1
+                raise exceptions.ServiceUnavailable("connection reset")
+            yield SimpleNamespace(error=SimpleNamespace(code=0, message=""))
+
+    def finalize_write_stream(self, name):
+        self.finalized = True
+
+
+def listing_rows(start: int, count: int) -> list[dict]:
+    return [{"product_id": str(40000000 + i), "price": f"{i % 9 + 1} tỷ", "cityCode": "SG"} for i in range(start, start + count)]
+
+
+def new_writer(client, spool_dir) -> BronzeStreamWriter:
+    sink = BigQueryWriteSink(TABLE_ID, client=client, types=FakeTypes)
+    return BronzeStreamWriter(sink, TABLE_ID, spool_dir, retry_backoff=0)
+
+
+def spool_parts(spool, parts: int, rows_per_part: int = 4):
+    for seq in range(parts):
+        spool.append(listing_rows(seq * rows_per_part, rows_per_part), key=f"https://example.test/p{seq + 1}")
+        spool.flush()
+
+
+def product_ids(client) -> list[str]:
+    return [row["product_id"] for row in client.rows]
+
+
+def test_parts_are_appended_once_each_at_their_offsets(tmp_path):
+    client = FakeWriteClient()
+    spool, checkpoint = open_checkpointed_spool(tmp_path / "spool")
+    writer = new_writer(client, spool.spool_dir)
+    writer.attach(spool)
+    spool_parts(spool, 3)
+    writer.close(spool)
+    assert client.offsets == [0, 4, 8]
+    assert product_ids(client) == [row["product_id"] for row in listing_rows(0, 12)]
+    assert client.finalized
+    assert writer.rows_acked == writer.rows_streamed == 12
+    checkpoint.close()
+
+
+def test_lost_ack_is_skipped_on_retry_not_duplicated(tmp_path):
+    client = FakeWriteClient(lose_acks=1)
+    spool, checkpoint = open_checkpointed_spool(tmp_path / "spool")
+    spool_parts(spool, 2)
+    writer = new_writer(client, spool.spool_dir)
+    writer.sync(spool.part_paths())
+    assert product_ids(client) == [row["product_id"] for row in listing_rows(0, 8)]
+    assert writer.duplicates == 4
+    assert writer.rows_acked == 8
+    checkpoint.close()
+
+
+def test_resumed_writer_appends_only_past_the_acknowledged_rows(tmp_path):
+    client = FakeWriteClient()
+    spool, checkpoint = open_checkpointed_spool(tmp_path / "spool")
+    spool_parts(spool, 2)
+    new_writer(client, spool.spool_dir).sync(spool.part_paths())  # then the run dies
+    checkpoint.close()
+
+    spool, checkpoint = open_checkpointed_spool(tmp_path / "spool", resume=True)
+    spool.append(listing_rows(8, 4), key="https://example.test/p3")
+    spool.flush()
+    writer = new_writer(client, spool.spool_dir)
+    writer.sync(spool.part_paths())
+    assert client.offsets == [0, 4, 8]
+    assert writer.duplicates == 0
+    assert product_ids(client) == [row["product_id"] for row in listing_rows(0, 12)]
+    checkpoint.close()
+
+
+def test_part_straddling_the_acknowledged_offset_fails(tmp_path):
+    client = FakeWriteClient()
+    spool, checkpoint = open_checkpointed_spool(tmp_path / "spool")
+    spool_parts(spool, 2)
+    writer = new_writer(client, spool.spool_dir)
+    writer.rows_acked = 2
+    with pytest.raises(OffsetOutOfRange):
+        writer.sync(spool.part_paths())
+    checkpoint.close()
+
+
+def test_uncommitted_part_is_not_streamed(tmp_path):
+    client = FakeWriteClient()
+    spool, checkpoint = open_checkpointed_spool(tmp_path / "spool")
+    writer = new_writer(client, spool.spool_dir)
+    writer.attach(spool)
+    spool_parts(spool, 1)
+    # Renamed into place, the crawl died before the checkpoint committed it.
+    orphan = spool.spool_dir / "part-00001.parquet"
+    pq.write_table(pa.Table.from_pylist(listing_rows(100, 4)), orphan)
+    writer.close(spool)
+    assert product_ids(client) == [row["product_id"] for row in listing_rows(0, 4)]
+    assert orphan.name not in checkpoint.committed_parts()
+    checkpoint.close()
+
+
+def test_staging_models_only_read_declared_listing_columns():
+    # Columns the models select from bronze as p.<column>, minus those they derive themselves (`... as <column>`).
+    for model in ["stg_real_estate.sql", "stg_real_estate_rent.sql"]:
+        sql = (STAGING_MODELS / model).read_text(encoding="utf-8")
+        read = set(re.findall(r"\bp\.(\w+)", sql)) - set(re.findall(r"\bas\s+(\w+)", sql))
+        assert read, model
+        assert read <= set(LISTING_SCHEMA.names), f"{model} reads undeclared {sorted(read - set(LISTING_SCHEMA.names))}"
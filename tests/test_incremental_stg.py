@@ -0,0 +1,20 @@
+"""
+Small run of benchmarks/incremental_stg.py: over a few simulated weeks of bronze
+appends -- some with a second run on the same day, after that day's build -- the
+incremental stg_real_estate dedup + merge must give the same silver table as a full
+rebuild after every run (mismatched == 0), while scanning less of bronze.
+"""
+import pytest
+
+from benchmarks.incremental_stg import run_weeks
+
+
+@pytest.mark.parametrize("lookback_days, second_run_rate", [(1, 0.3), (0, 1.0), (1, 1.0)])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_incremental_silver_matches_full_rebuild(tmp_path, seed, lookback_days, second_run_rate):
+    runs = list(run_weeks(
+        tmp_path / "bronze", weeks=5, listings=200, lookback_days=lookback_days, seed=seed, second_run_rate=second_run_rate,
+    ))
+    assert [run["mismatched"] for run in runs] == [0] * len(runs)
+    # Week 2 re-reads week 1, silver's newest partition; from week 3 older partitions are pruned.
+    assert all(run["incremental_bytes"] < run["full_bytes"] for run in runs if run["week"] >= 3)
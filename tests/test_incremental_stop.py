@@ -0,0 +1,90 @@
+"""
+Where an incremental crawl stops paginating (ListingCrawler's stop_page hook with
+SeenIndex.is_known_page, src/utils/seen_index.py), simulated over fixed page sequences.
+
+A page is written as one letter per listing card: "k" known and unchanged, "r" known
+but re-priced, "n" new. Pagination must end at the first page with at least
+KNOWN_PAGE_RATIO (80%) of known, unchanged rows, and pages after it must not be fetched.
+"""
+import asyncio
+
+import pytest
+
+from src.utils.crawl_engine import ListingCrawler
+from src.utils.row_spool import RowSpool
+from src.utils.seen_index import KNOWN_PAGE_RATIO, SeenIndex
+
+URL = "https://example.test/ban-nha"
+KNOWN = "kkkkkkkkkk"
+NEW = "nnnnnnnnnn"
+
+
+def page_records(page_num: int, cards: str) -> list[dict]:
+    return [
+        {"product_id": f"{page_num}-{i}", "price": 900 if card == "r" else 1000, "area": 50}
+        for i, card in enumerate(cards)
+    ]
+
+
+def crawl(pages: list[str], tmp_path, concurrency: int = 1):
+    """Crawl `pages` against a seen index holding their k/r listings. Returns (crawler, page numbers fetched)."""
+    seen = SeenIndex(tmp_path / "seen.sqlite")
+    seen.update([
+        {"product_id": f"{page_num}-{i}", "price": 1000, "area": 50}
+        for page_num, cards in enumerate(pages, start=1) for i, card in enumerate(cards) if card != "n"
+    ])
+    fetched = []
+
+    async def fetch_page(url):
+        page_num = int(url.rpartition("/p")[2]) if url != URL else 1
+        fetched.append(page_num)
+        await asyncio.sleep(0)
+        return page_records(page_num, pages[page_num - 1]), len(pages)
+
+    crawler = ListingCrawler(fetch_page, RowSpool(tmp_path / "spool"), concurrency=concurrency, stop_page=seen.is_known_page)
+    crawler.add_listing(URL)
+    asyncio.run(crawler.run())
+    seen.close()
+    return crawler, sorted(fetched)
+
+
+@pytest.mark.parametrize("pages, stop_at", [
+    pytest.param([NEW, NEW, NEW, NEW], None, id="all-new-pages-crawl-to-the-end"),
+    pytest.param([KNOWN, KNOWN, KNOWN], 1, id="first-page-known"),
+    pytest.param([NEW, KNOWN, KNOWN, KNOWN], 2, id="all-new-page-then-known"),
+    pytest.param([NEW, "kkkkkkknnn", "kkkkkkkknn", KNOWN, KNOWN], 3, id="80-percent-boundary"),
+    pytest.param([NEW, "kkkkkkkkrn", KNOWN], 2, id="re-priced-and-new-within-ratio"),
+    pytest.param([NEW, "kkkkkkkrrr", KNOWN, KNOWN], 3, id="re-priced-rows-count-as-unknown"),
+    pytest.param([KNOWN, NEW, KNOWN], 1, id="stops-at-first-known-page-not-later-new-ones"),
+])
+def test_stop_page(pages, stop_at, tmp_path):
+    crawler, fetched = crawl(pages, tmp_path)
+    last_page = stop_at or len(pages)
+    assert crawler.stopped_listings.get(URL) == stop_at
+    assert fetched == list(range(1, last_page + 1))
+    assert crawler.spool.rows_spooled == sum(len(cards) for cards in pages[:last_page])
+
+
+@pytest.mark.parametrize("cards, known", [
+    ("kkkkkkkknn", True),
+    ("kkkkkkknnn", False),
+    ("kkkkn", True),
+    ("kkknn", False),
+    ("", False),
+])
+def test_known_page_ratio_boundary(cards, known, tmp_path):
+    assert KNOWN_PAGE_RATIO == 0.8
+    seen = SeenIndex(tmp_path / "seen.sqlite")
+    records = page_records(1, cards)
+    seen.update([record for record, card in zip(records, cards) if card == "k"])
+    assert seen.is_known_page(records) is known
+    seen.close()
+
+
+@pytest.mark.parametrize("concurrency", [2, 5])
+def test_lookahead_bounds_wasted_fetches(tmp_path, concurrency):
+    pages = [NEW, NEW, KNOWN, NEW, NEW, NEW, NEW, NEW]
+    crawler, fetched = crawl(pages, tmp_path, concurrency=concurrency)
+    assert crawler.stopped_listings[URL] == 3
+    # At most lookahead - 1 pages past the stop page are fetched for nothing.
+    assert set(range(1, 4)) <= set(fetched) <= set(range(1, 3 + crawler.lookahead))
@@ -0,0 +1,82 @@
+"""
+fetch_json (src/_web2br/j_metadata.py) over a CachedSession: a cached body that doesn't
+decode is evicted before the retry, while HTTP errors such as 429/503 leave the cached
+copy in place to revalidate against.
+"""
+import asyncio
+import json
+
+import pytest
+
+from src._web2br import j_metadata
+from src.utils.http_cache import CachedSession, HttpCache
+
+URL = "https://example.test/Product/ProductSearch/GetCitiesV2"
+CITIES = [{"code": "SG", "name": "Hồ Chí Minh"}]
+
+
+class FakeResponse:
+
+    def __init__(self, status_code: int, content: bytes = b"", etag: str | None = None):
+        self.url = URL
+        self.status_code = status_code
+        self.content = content
+        self.encoding = "utf-8"
+        self.headers = {"content-type": "application/json", "etag": etag, "last-modified": None}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class ScriptedSession:
+    """Answers each get() with the next response of `responses`."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = 0
+
+    async def get(self, url, headers=None, **kwargs):
+        self.requests += 1
+        return self.responses.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(j_metadata, "retry_delay", lambda attempt: 0)
+
+
+def cached_session(tmp_path, responses, cached: bytes | None, ttl: float = 0) -> CachedSession:
+    cache = HttpCache(tmp_path / "cache.sqlite")
+    if cached is not None:
+        cache.put(URL, FakeResponse(200, cached, etag='"v1"'))
+    return CachedSession(ScriptedSession(responses), cache, default_ttl=ttl)
+
+
+def test_http_errors_keep_the_cached_copy(tmp_path):
+    session = cached_session(tmp_path, [FakeResponse(429), FakeResponse(503), FakeResponse(304)], json.dumps(CITIES).encode())
+    assert asyncio.run(j_metadata.fetch_json(session, URL, "GetCities")) == CITIES
+    assert session.session.requests == 3
+    assert session.stats["revalidated"] == 1
+
+
+def test_http_errors_until_give_up_keep_the_cached_copy(tmp_path):
+    session = cached_session(tmp_path, [FakeResponse(429)] * j_metadata.MAX_ATTEMPTS, json.dumps(CITIES).encode())
+    assert asyncio.run(j_metadata.fetch_json(session, URL, "GetCities")) is None
+    assert session.cache.get(URL) is not None
+
+
+def test_undecodable_cached_body_is_evicted(tmp_path):
+    session = cached_session(tmp_path, [FakeResponse(200, json.dumps(CITIES).encode())], b"<html>truncated", ttl=3600)
+    assert asyncio.run(j_metadata.fetch_json(session, URL, "GetCities")) == CITIES
+    assert session.session.requests == 1
+    assert json.loads(session.cache.get(URL)["body"]) == CITIES
+
+
+def test_undecodable_fetched_body_is_not_cached(tmp_path):
+    session = cached_session(tmp_path, [FakeResponse(200, b"{")] * j_metadata.MAX_ATTEMPTS, None)
+    assert asyncio.run(j_metadata.fetch_json(session, URL, "GetCities")) is None
+    assert session.cache.get(URL) is None
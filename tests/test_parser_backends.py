@@ -0,0 +1,65 @@
+"""
+Golden-file check of the parser backends (src/utils/html_backend.py): for every saved
+page under fixtures/pages, the scraper's parse_page must return the same rows and page
+count with backend "bs4" and "lxml", and both must match the page's golden rows.
+
+Pages are named <scraper>__<name>.html (real_estate, real_estate_rent, projects) and
+keep the markup the backends treat differently: script/style/template text inside
+cards, whitespace-only strings between tags, entities, and unclosed tags that
+html.parser and libxml2 repair differently. After adding a page, write its golden rows
+(from the bs4 backend, the reference) and review them before committing:
+
+    python -m tests.test_parser_backends --update
+"""
+import json
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+from src._web2br import j_projects, j_real_estate, j_real_estate_rent
+
+PAGES_DIR = Path(__file__).parent / "fixtures" / "pages"
+SCRAPERS = {"real_estate": j_real_estate, "real_estate_rent": j_real_estate_rent, "projects": j_projects}
+PAGES = sorted(PAGES_DIR.glob("*.html"))
+
+
+def parse(page: Path, backend: str) -> dict:
+    """parse_page's result for `page` as plain JSON values (NaN -> None)."""
+    records, page_count = SCRAPERS[page.stem.split("__")[0]].parse_page(page.read_bytes(), backend=backend)
+    rows = [
+        {key: None if isinstance(value, float) and math.isnan(value) else value for key, value in record.items()}
+        for record in records
+    ]
+    return {"page_count": page_count, "rows": rows}
+
+
+def golden_path(page: Path) -> Path:
+    return page.with_suffix(".json")
+
+
+@pytest.mark.parametrize("page", PAGES, ids=[page.stem for page in PAGES])
+def test_backends_match_golden_rows(page):
+    golden = json.loads(golden_path(page).read_text(encoding="utf-8"))
+    bs4_result, lxml_result = parse(page, "bs4"), parse(page, "lxml")
+    assert lxml_result == bs4_result
+    assert bs4_result == golden
+
+
+def test_pages_have_listings():
+    assert PAGES
+    for page in PAGES:
+        assert parse(page, "lxml")["rows"], f"{page.name} has no cards"
+
+
+def update_golden():
+    for page in PAGES:
+        golden_path(page).write_text(json.dumps(parse(page, "bs4"), ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"Wrote {golden_path(page)}")
+
+
+if __name__ == "__main__":
+    if "--update" not in sys.argv[1:]:
+        sys.exit("usage: python -m tests.test_parser_backends --update")
+    update_golden()